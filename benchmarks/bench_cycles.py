@@ -0,0 +1,79 @@
+import argparse
+import json
+import random
+import time
+from modswap.app.swaps.cycles import CycleMatcher
+
+
+def synthetic_requests(n, modules, users, seed):
+    rng = random.Random(seed)
+    weights = [1.0 / (rank + 1) for rank in range(modules)]
+    ids = list(range(modules))
+    requests = []
+    for node in range(n):
+        picked = set()
+        while len(picked) < rng.randint(2, 5):
+            picked.add(rng.choices(ids, weights)[0])
+        picked = list(picked)
+        split = rng.randint(1, len(picked) - 1)
+        requests.append((node, rng.randrange(users), picked[:split], picked[split:]))
+    return requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the multi-party swap cycle matcher")
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--modules", type=int, default=400)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--max-length", type=int, default=4)
+    parser.add_argument("--max-expansions", type=int, default=200)
+    parser.add_argument("--budget", type=float, default=30.0)
+    parser.add_argument("--incremental", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json")
+    args = parser.parse_args()
+
+    requests = synthetic_requests(args.requests + args.incremental, args.modules, args.users, args.seed)
+    base, extra = requests[:args.requests], requests[args.requests:]
+    matcher = CycleMatcher(max_length=args.max_length, time_budget=args.budget, max_expansions=args.max_expansions)
+
+    started = time.perf_counter()
+    for node, owner, giving, wanting in base:
+        matcher._insert(node, owner, giving, wanting)
+    build = time.perf_counter() - started
+
+    started = time.perf_counter()
+    cycles = matcher.match_all()
+    full = time.perf_counter() - started
+
+    timings = []
+    for node, owner, giving, wanting in extra:
+        started = time.perf_counter()
+        matcher.add(node, owner, giving, wanting)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+
+    lengths = {}
+    for cycle in matcher.cycles:
+        lengths[len(cycle)] = lengths.get(len(cycle), 0) + 1
+    result = {
+        "requests": args.requests,
+        "modules": args.modules,
+        "max_length": args.max_length,
+        "build_s": round(build, 4),
+        "match_all_s": round(full, 4),
+        "cycles_initial": len(cycles),
+        "cycles_total": len(matcher.cycles),
+        "matched_requests": len(matcher.assigned),
+        "cycle_lengths": dict(sorted(lengths.items())),
+        "incremental_add_p50_ms": round(timings[len(timings) // 2] * 1000, 3) if timings else None,
+        "incremental_add_max_ms": round(timings[-1] * 1000, 3) if timings else None,
+    }
+    print(json.dumps(result, indent=2))
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(result, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Runs in a fresh interpreter per profile so each gets its own engine and database.
+CHILD = """
+import json, random, sys, threading, time
+settings = json.loads(sys.argv[1])
+from modswap.app import create_app
+from modswap.app.extensions import db
+from modswap.app.models import Module, User
+app = create_app()
+app.config["QUERY_BUDGET_ENFORCE"] = False
+rng = random.Random(settings["seed"])
+with app.app_context():
+    modules = [Module(code=f"BM{i:04d}", name=f"Module {i}", department=rng.choice(["CS", "Maths", "Physics"]), year=rng.randint(1, 3))
+               for i in range(settings["modules"])]
+    users = [User(email=f"load{i}@mail.bcu.ac.uk", role="student") for i in range(settings["threads"])]
+    db.session.add_all(modules + users)
+    db.session.commit()
+    module_ids = [m.id for m in modules]
+    user_ids = [u.id for u in users]
+
+results = []
+start = threading.Barrier(len(user_ids) + 1)
+deadline = [0.0]
+
+
+def client(user_id, seed):
+    local = random.Random(seed)
+    c = app.test_client()
+    with c.session_transaction() as sess:
+        sess["_user_id"] = str(user_id)
+        sess["_fresh"] = True
+    timings = {"create": [], "browse": []}
+    errors = 0
+    start.wait()
+    while time.perf_counter() < deadline[0]:
+        kind = "create" if local.random() < settings["write_ratio"] else "browse"
+        began = time.perf_counter()
+        try:
+            if kind == "create":
+                picked = local.sample(module_ids, 4)
+                r = c.post("/swaps/create", data={"give": [str(m) for m in picked[:2]], "want": [str(m) for m in picked[2:]]})
+            else:
+                r = c.get("/swaps/", query_string={"q": local.choice(["", "bm00", "module 1"])})
+            ok = r.status_code < 400
+        except Exception:
+            ok = False
+        if ok:
+            timings[kind].append(time.perf_counter() - began)
+        else:
+            errors += 1
+    results.append((timings, errors))
+
+
+threads = [threading.Thread(target=client, args=(uid, settings["seed"] + n)) for n, uid in enumerate(user_ids)]
+for t in threads:
+    t.start()
+deadline[0] = time.perf_counter() + settings["duration"]
+start.wait()
+for t in threads:
+    t.join()
+
+
+def summary(samples):
+    samples.sort()
+    if not samples:
+        return {"requests": 0, "per_s": 0.0, "p50_ms": None, "p95_ms": None}
+    return {
+        "requests": len(samples),
+        "per_s": len(samples) / settings["duration"],
+        "p50_ms": samples[len(samples) // 2] * 1000,
+        "p95_ms": samples[int(len(samples) * 0.95)] * 1000,
+    }
+
+
+out = {"errors": sum(e for _, e in results)}
+for kind in ("create", "browse"):
+    out[kind] = summary([x for timings, _ in results for x in timings[kind]])
+print(json.dumps(out))
+"""
+
+
+def run_profile(profile, database_url, settings):
+    env = dict(os.environ, DATABASE_URL=database_url, DB_PROFILE=profile)
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, json.dumps(settings)], env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare swap create/browse throughput under each DB_PROFILE")
+    parser.add_argument("--profiles", default="default,web,worker,serverless")
+    parser.add_argument("--database-url", help="Empty database to use instead of a temporary SQLite file")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--modules", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json")
+    args = parser.parse_args()
+
+    settings = {
+        "threads": args.threads,
+        "duration": args.duration,
+        "write_ratio": args.write_ratio,
+        "modules": args.modules,
+        "seed": args.seed,
+    }
+    result = {"settings": settings, "profiles": {}}
+    for profile in args.profiles.split(","):
+        if args.database_url:
+            result["profiles"][profile] = run_profile(profile, args.database_url, settings)
+            continue
+        with tempfile.TemporaryDirectory() as tmp:
+            url = f"sqlite:///{os.path.join(tmp, 'load.db')}"
+            result["profiles"][profile] = run_profile(profile, url, settings)
+    print(json.dumps(result, indent=2))
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(result, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000
+
+
+def run(app, accounts, student_id, threads, browsers, duration, flood):
+    # Login threads sign in with valid passwords (or, when flooding, hammer one account with
+    # wrong ones from one address) while browse threads measure how the rest of the site fares.
+    outcomes = {"ok": 0, "invalid": 0, "limited": 0, "busy": 0}
+    login_times, browse_times = [], []
+    lock = threading.Lock()
+    deadline = [0.0]
+    start = threading.Barrier(threads + browsers + 1)
+
+    def login(n):
+        client = app.test_client()
+        email = accounts[0] if flood else accounts[n % len(accounts)]
+        form = {"email": email, "password": "wrong" if flood else "Bench@123", "role": "teacher"}
+        environ = {"REMOTE_ADDR": "10.0.0.1" if flood else f"10.0.{n // 250}.{n % 250 + 1}"}
+        start.wait()
+        while time.perf_counter() < deadline[0]:
+            began = time.perf_counter()
+            response = client.post("/auth/login", data=form, environ_base=environ)
+            elapsed = time.perf_counter() - began
+            if response.status_code == 429:
+                kind = "limited"
+            elif response.status_code == 503:
+                kind = "busy"
+            elif response.headers.get("Location", "").endswith("/admin/swaps"):
+                kind = "ok"
+            else:
+                kind = "invalid"
+            with lock:
+                outcomes[kind] += 1
+                login_times.append(elapsed)
+
+    def browse():
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["_user_id"] = str(student_id)
+            sess["role"] = "student"
+        start.wait()
+        while time.perf_counter() < deadline[0]:
+            began = time.perf_counter()
+            client.get("/swaps/")
+            with lock:
+                browse_times.append(time.perf_counter() - began)
+
+    workers = [threading.Thread(target=login, args=(n,)) for n in range(threads)]
+    workers += [threading.Thread(target=browse) for _ in range(browsers)]
+    for t in workers:
+        t.start()
+    deadline[0] = time.perf_counter() + duration
+    start.wait()
+    for t in workers:
+        t.join()
+    return {
+        "logins": outcomes,
+        "logins_per_s": outcomes["ok"] / duration,
+        "attempts_per_s": sum(outcomes.values()) / duration,
+        "login_p50_ms": percentile(login_times, 0.5),
+        "login_p95_ms": percentile(login_times, 0.95),
+        "browse_per_s": len(browse_times) / duration,
+        "browse_p95_ms": percentile(browse_times, 0.95),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure login throughput and site latency during a login burst")
+    parser.add_argument("--threads", type=int, default=16, help="Concurrent login clients")
+    parser.add_argument("--browsers", type=int, default=2, help="Concurrent clients browsing while logins run")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--accounts", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt log rounds for the benchmark accounts")
+    parser.add_argument("--workers", type=int, default=4, help="BCRYPT_WORKERS for the pooled run")
+    parser.add_argument("--json")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'login.db')}"
+        from modswap.app import create_app
+        from modswap.app.extensions import bcrypt, db
+        from modswap.app.models import User
+
+        app = create_app()
+        app.config["BCRYPT_LOG_ROUNDS"] = args.rounds
+        with app.app_context():
+            password_hash = bcrypt.generate_password_hash("Bench@123", args.rounds).decode("utf-8")
+            accounts = [f"teacher{n}@bench.ac.uk" for n in range(args.accounts)]
+            db.session.add_all(User(email=email, role="teacher", password_hash=password_hash) for email in accounts)
+            db.session.commit()
+            student_id = db.session.execute(db.select(User.id).filter_by(role="student")).scalars().first()
+
+        runs = {
+            "inline": {"BCRYPT_WORKERS": 0, "LOGIN_RATE_LIMIT": False},
+            "pooled": {"BCRYPT_WORKERS": args.workers, "LOGIN_RATE_LIMIT": False},
+            "flood_unlimited": {"BCRYPT_WORKERS": args.workers, "LOGIN_RATE_LIMIT": False, "flood": True},
+            "flood_limited": {"BCRYPT_WORKERS": args.workers, "LOGIN_RATE_LIMIT": True, "flood": True},
+        }
+        result = {
+            "settings": {k: getattr(args, k) for k in ("threads", "browsers", "duration", "accounts", "rounds", "workers")},
+            "runs": {},
+        }
+        for name, overrides in runs.items():
+            flood = overrides.pop("flood", False)
+            app.config.update(overrides)
+            app.extensions.pop("password_verifier", None)
+            app.extensions.pop("cache:rate_limits", None)
+            result["runs"][name] = run(app, accounts, student_id, args.threads, args.browsers, args.duration, flood)
+
+    print(json.dumps(result, indent=2))
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(result, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import json
+import random
+import time
+from modswap.app.reputation import wilson_lower_bound
+from modswap.app.swaps.matching import MatchIndex
+
+
+def build_index(requests, modules, users, seed):
+    rng = random.Random(seed)
+    weights = [1.0 / (rank + 1) for rank in range(modules)]
+    ids = list(range(modules))
+    reputation = {}
+    owners = []
+    gives = []
+    wants = []
+    for swap_id in range(requests):
+        owners.append((swap_id, rng.randrange(users)))
+        picked = set()
+        while len(picked) < rng.randint(2, 5):
+            picked.add(rng.choices(ids, weights)[0])
+        picked = list(picked)
+        split = rng.randint(1, len(picked) - 1)
+        gives += [(swap_id, m) for m in picked[:split]]
+        wants += [(swap_id, m) for m in picked[split:]]
+    for user_id in range(users):
+        if rng.random() < 0.6:
+            reputation[user_id] = wilson_lower_bound(rng.randint(0, 40), rng.randint(0, 10))
+    return MatchIndex.from_rows(owners, gives, wants, reputation)
+
+
+def time_queries(index, queries, by_reputation, limit):
+    started = time.perf_counter()
+    for give, want, user_id in queries:
+        index.top_matches(give, want, exclude_user_id=user_id, limit=limit, by_reputation=by_reputation)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suggestion ranking with and without reputation")
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--modules", type=int, default=400)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json")
+    args = parser.parse_args()
+
+    index = build_index(args.requests, args.modules, args.users, args.seed)
+    rng = random.Random(args.seed + 1)
+    queries = []
+    for _ in range(args.queries):
+        picked = rng.sample(range(args.modules), 4)
+        queries.append((set(picked[:2]), set(picked[2:]), rng.randrange(args.users)))
+
+    # Best of several runs, alternating so both variants see the same cache state.
+    plain, weighted = [], []
+    for _ in range(args.repeat):
+        plain.append(time_queries(index, queries, False, args.limit))
+        weighted.append(time_queries(index, queries, True, args.limit))
+    changed = sum(
+        index.top_matches(g, w, exclude_user_id=u, limit=args.limit)
+        != index.top_matches(g, w, exclude_user_id=u, limit=args.limit, by_reputation=True)
+        for g, w, u in queries
+    )
+    result = {
+        "requests": args.requests,
+        "queries": args.queries,
+        "plain_ms_per_query": round(min(plain) / args.queries * 1000, 4),
+        "reputation_ms_per_query": round(min(weighted) / args.queries * 1000, 4),
+        "overhead_pct": round((min(weighted) / min(plain) - 1) * 100, 2),
+        "rankings_changed": changed,
+    }
+    print(json.dumps(result, indent=2))
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(result, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+
+SCENARIOS = ("swaps.suggest", "swaps.browse", "admin.swaps", "swaps.create_post", "profile.view_profile")
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+class Bench:
+    def __init__(self, app, ids, seed):
+        from modswap.app.extensions import db
+        from modswap.app.models import Module
+        self.app = app
+        self.rng = random.Random(seed)
+        self.client = app.test_client()
+        self.users = ids["users"]
+        self.teacher = ids["teacher"]
+        with app.app_context():
+            self.departments = {}
+            for module_id, department in db.session.execute(db.select(Module.id, Module.department).filter(Module.id.in_(ids["modules"]))):
+                self.departments.setdefault(department, []).append(module_id)
+            self.codes = db.session.execute(db.select(Module.code).filter(Module.id.in_(ids["modules"]))).scalars().all()
+
+    def login(self, user_id, role="student"):
+        with self.client.session_transaction() as sess:
+            sess["_user_id"] = str(user_id)
+            sess["_fresh"] = True
+            sess["role"] = role
+
+    def modules(self):
+        pool = self.departments[self.rng.choice(list(self.departments))]
+        picked = self.rng.sample(pool, min(4, len(pool)))
+        return [str(m) for m in picked[:2]], [str(m) for m in picked[2:]]
+
+    def prepare(self, scenario):
+        # Returns a zero-argument callable issuing one request; set-up stays outside the timing.
+        rng = self.rng
+        if scenario == "admin.swaps":
+            self.login(self.teacher, "teacher")
+            args = {}
+            if rng.random() < 0.5:
+                args["status"] = rng.choice(("Open", "Needs Info"))
+            if rng.random() < 0.4:
+                args["department"] = rng.choice(list(self.departments)).lower()
+            if rng.random() < 0.3:
+                args["q"] = rng.choice(self.codes)[:5].lower()
+            if rng.random() < 0.2:
+                args["sort"] = "reputation"
+            return lambda: self.client.get("/admin/swaps", query_string=args)
+        self.login(rng.choice(self.users))
+        if scenario == "swaps.suggest":
+            give, want = self.modules()
+            return lambda: self.client.post("/swaps/suggest", data={"give": give, "want": want})
+        if scenario == "swaps.browse":
+            q = rng.choice(("", "", rng.choice(self.codes)[:5].lower()))
+            return lambda: self.client.get("/swaps/", query_string={"q": q})
+        if scenario == "swaps.create_post":
+            give, want = self.modules()
+            return lambda: self.client.post("/swaps/create", data={"give": give, "want": want})
+        return lambda: self.client.get("/profile/")
+
+    def run(self, scenario, requests, warmup, statements):
+        for _ in range(warmup):
+            self.prepare(scenario)()
+        timings = []
+        counts = []
+        failures = 0
+        for _ in range(requests):
+            call = self.prepare(scenario)
+            before = statements[0]
+            started = time.perf_counter()
+            response = call()
+            timings.append(time.perf_counter() - started)
+            counts.append(statements[0] - before)
+            if response.status_code >= 400:
+                failures += 1
+        timings.sort()
+        return {
+            "requests": requests,
+            "failures": failures,
+            "mean_ms": sum(timings) / len(timings) * 1000,
+            "p50_ms": percentile(timings, 0.5) * 1000,
+            "p95_ms": percentile(timings, 0.95) * 1000,
+            "max_ms": timings[-1] * 1000,
+            "statements_mean": sum(counts) / len(counts),
+        }
+
+
+def compare(result, previous):
+    print(f"{'scenario':24} {'p50 ms':>10} {'was':>10} {'change':>8}")
+    for name, row in result["scenarios"].items():
+        old = previous.get("scenarios", {}).get(name)
+        if not old:
+            print(f"{name:24} {row['p50_ms']:10.2f} {'-':>10}")
+            continue
+        change = (row["p50_ms"] / old["p50_ms"] - 1) * 100 if old["p50_ms"] else 0.0
+        print(f"{name:24} {row['p50_ms']:10.2f} {old['p50_ms']:10.2f} {change:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the main swap routes on a synthetic dataset through the Flask test client")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--modules", type=int, default=300)
+    parser.add_argument("--swaps", type=int, default=20000)
+    parser.add_argument("--ratings", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--database-url", help="Empty database to use instead of a temporary SQLite file")
+    parser.add_argument("--json", help="Write results here, e.g. benchmarks/results/<commit>.json")
+    parser.add_argument("--compare", help="Earlier results file to compare p50 latencies against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Config reads the environment at import time.
+        os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        from modswap.app import create_app
+        from benchmarks.datagen import generate
+
+        app = create_app()
+        app.config["QUERY_BUDGET_ENFORCE"] = False
+        started = time.perf_counter()
+        with app.app_context():
+            ids = generate(args.users, args.modules, args.swaps, args.ratings, args.seed)
+        generated_s = time.perf_counter() - started
+
+        statements = [0]
+        event.listen(Engine, "before_cursor_execute", lambda *a: statements.__setitem__(0, statements[0] + 1))
+        bench = Bench(app, ids, args.seed)
+        result = {
+            "commit": git_commit(),
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "database": app.config["SQLALCHEMY_DATABASE_URI"].split(":", 1)[0],
+            "dataset": {"users": args.users, "modules": args.modules, "swaps": args.swaps, "ratings": args.ratings, "seed": args.seed},
+            "generate_s": generated_s,
+            "scenarios": {},
+        }
+        for scenario in args.scenarios.split(","):
+            if scenario not in SCENARIOS:
+                parser.error(f"unknown scenario {scenario!r}")
+            result["scenarios"][scenario] = bench.run(scenario, args.requests, args.warmup, statements)
+
+    print(json.dumps(result, indent=2))
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w") as fh:
+            json.dump(result, fh, indent=2)
+    if args.compare:
+        with open(args.compare) as fh:
+            compare(result, json.load(fh))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+CHILD = """
+import json, time
+started = time.perf_counter()
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+statements = [0]
+event.listen(Engine, "before_cursor_execute", lambda *a: statements.__setitem__(0, statements[0] + 1))
+imported = time.perf_counter()
+from modswap.app import create_app
+create_app()
+print(json.dumps({"total_s": time.perf_counter() - started, "create_app_s": time.perf_counter() - imported, "statements": statements[0]}))
+"""
+
+
+def start_once(database_url):
+    env = dict(os.environ, DATABASE_URL=database_url)
+    out = subprocess.run([sys.executable, "-c", CHILD], env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure create_app cold-start cost on an empty and a migrated database")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'startup.db')}"
+        first = start_once(url)
+        warm = [start_once(url) for _ in range(args.runs)]
+    warm.sort(key=lambda r: r["create_app_s"])
+    result = {
+        "empty_database": first,
+        "migrated_database_median": warm[len(warm) // 2],
+        "runs": args.runs,
+    }
+    print(json.dumps(result, indent=2))
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(result, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
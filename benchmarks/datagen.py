@@ -0,0 +1,151 @@
+import argparse
+import random
+from datetime import datetime, timedelta
+from modswap.app.extensions import db
+from modswap.app.models import Module, Rating, SwapRequest, User, swap_give_modules, swap_want_modules
+from modswap.app.reputation import rebuild_reputation
+
+DEPARTMENTS = ("Computing", "Mathematics", "Physics", "Business", "Law", "Engineering", "Design", "Biology")
+PRIORITIES = (None, None, "Low", "Medium", "High")
+CHUNK = 5000
+
+
+def insert_chunks(table, rows):
+    for start in range(0, len(rows), CHUNK):
+        db.session.execute(db.insert(table), rows[start:start + CHUNK])
+
+
+def generate(users=1000, modules=300, swaps=5000, ratings=2000, seed=7):
+    # Populates the current app's database through Core inserts. Module popularity is Zipf-like
+    # and most requests trade within the owner's own department, so the matcher and filters see
+    # the skew a real cohort produces.
+    # Returns the generated ids keyed by kind.
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    first_user = (db.session.execute(db.select(db.func.max(User.id))).scalar() or 0) + 1
+    first_module = (db.session.execute(db.select(db.func.max(Module.id))).scalar() or 0) + 1
+    first_swap = (db.session.execute(db.select(db.func.max(SwapRequest.id))).scalar() or 0) + 1
+
+    module_rows = []
+    by_department = {}
+    for n in range(modules):
+        module_id = first_module + n
+        department = DEPARTMENTS[n % len(DEPARTMENTS)]
+        module_rows.append({
+            "id": module_id,
+            "code": f"{department[:3].upper()}{n:04d}",
+            "name": f"{department} module {n}",
+            "department": department,
+            "university": "bcu",
+            "year": rng.randint(1, 4),
+        })
+        by_department.setdefault(department, []).append(module_id)
+    weights = {dept: [1.0 / (rank + 1) for rank in range(len(ids))] for dept, ids in by_department.items()}
+    insert_chunks(Module, module_rows)
+
+    user_rows = []
+    for n in range(users):
+        user_rows.append({
+            "id": first_user + n,
+            "username": f"student{n}",
+            "email": f"student{n}.{seed}@mail.bcu.ac.uk",
+            "university": "bcu",
+            "department": rng.choice(DEPARTMENTS),
+            "year": rng.randint(1, 4),
+            "role": "student",
+            "verified_ac_email": True,
+            "created_at": now - timedelta(days=rng.randint(0, 365)),
+        })
+    teacher_id = first_user + users
+    insert_chunks(User, user_rows + [{
+        "id": teacher_id,
+        "username": "teacher",
+        "email": f"teacher.{seed}@mail.bcu.ac.uk",
+        "university": "bcu",
+        "role": "teacher",
+        "verified_ac_email": True,
+        "created_at": now,
+    }])
+
+    swap_rows, give_rows, want_rows = [], [], []
+    for n in range(swaps):
+        swap_id = first_swap + n
+        owner = rng.choice(user_rows)
+        department = owner["department"] if rng.random() < 0.8 else rng.choice(DEPARTMENTS)
+        pool, pool_weights = by_department[department], weights[department]
+        picked = set()
+        size = rng.randint(2, min(6, len(pool)))
+        while len(picked) < size:
+            picked.add(rng.choices(pool, pool_weights)[0])
+        picked = list(picked)
+        rng.shuffle(picked)
+        split = rng.randint(1, len(picked) - 1)
+        give, want = picked[:split][:5], picked[split:][:5]
+        created = now - timedelta(minutes=rng.randint(0, 60 * 24 * 120))
+        swap_rows.append({
+            "id": swap_id,
+            "user_id": owner["id"],
+            "status": rng.choices(("Open", "Needs Info", "Expired"), (85, 10, 5))[0],
+            "notes": rng.choice(("", "Clashes with my timetable", "Prefer morning labs", "Flexible on campus")),
+            "priority": rng.choice(PRIORITIES),
+            "expires_at": created + timedelta(days=rng.randint(14, 180)) if rng.random() < 0.6 else None,
+            "visibility": "public",
+            "alerts_email": False,
+            "auto_create_chat": False,
+            "created_at": created,
+            "updated_at": created,
+            "signature": SwapRequest.make_signature(give, want),
+        })
+        give_rows += [{"swap_id": swap_id, "module_id": m} for m in give]
+        want_rows += [{"swap_id": swap_id, "module_id": m} for m in want]
+    insert_chunks(SwapRequest, swap_rows)
+    insert_chunks(swap_give_modules, give_rows)
+    insert_chunks(swap_want_modules, want_rows)
+
+    rating_rows = []
+    for _ in range(ratings if swaps else 0):
+        swap = rng.choice(swap_rows)
+        rater = rng.choice(user_rows)["id"]
+        if rater == swap["user_id"]:
+            continue
+        rating_rows.append({
+            "swap_id": swap["id"],
+            "rater_id": rater,
+            "receiver_id": swap["user_id"],
+            "thumbs_up": rng.random() < 0.85,
+            "created_at": now,
+        })
+    # Core inserts skip the per-row reputation hook, so the summary is rebuilt once instead.
+    insert_chunks(Rating, rating_rows)
+    rebuild_reputation(db.session.connection())
+    if db.session.get_bind().dialect.name == "postgresql":
+        # Ids were assigned here, so move the serial sequences past them.
+        for table in ("users", "modules", "swap_requests"):
+            db.session.execute(db.text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))"))
+    db.session.commit()
+    return {
+        "users": [r["id"] for r in user_rows],
+        "teacher": teacher_id,
+        "modules": [r["id"] for r in module_rows],
+        "swaps": [r["id"] for r in swap_rows],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill the configured database (DATABASE_URL) with synthetic swap data")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--modules", type=int, default=300)
+    parser.add_argument("--swaps", type=int, default=5000)
+    parser.add_argument("--ratings", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    from modswap.app import create_app
+    app = create_app()
+    with app.app_context():
+        ids = generate(args.users, args.modules, args.swaps, args.ratings, args.seed)
+    print(f"Created {len(ids['users'])} students, a teacher, {len(ids['modules'])} modules and {len(ids['swaps'])} swap requests")
+
+
+if __name__ == "__main__":
+    main()
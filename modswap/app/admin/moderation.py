@@ -0,0 +1,100 @@
+from datetime import datetime
+from ..events import mark_swaps_changed, mark_user_stats_changed, mark_users_changed
+from ..extensions import db
+from ..models import Document, SwapRequest, SwapRequestHistory, User, swap_give_modules, swap_want_modules
+from ..notifications import notify
+
+
+def archive_swaps(ids, status, decided_by=None):
+    # Copies the requests into swap_request_history, then removes them and their module links
+    # with one DELETE per table. Returns the owners of the archived rows keyed by swap id.
+    rows = db.session.execute(
+        db.select(
+            SwapRequest.id, SwapRequest.user_id, SwapRequest.notes, SwapRequest.priority, SwapRequest.created_at
+        ).filter(SwapRequest.id.in_(ids))
+    ).all()
+    if not rows:
+        return {}
+    ids = [r.id for r in rows]
+    modules = {}
+    for key, table in (("give", swap_give_modules), ("want", swap_want_modules)):
+        for swap_id, module_id in db.session.execute(
+            db.select(table.c.swap_id, table.c.module_id).filter(table.c.swap_id.in_(ids)).order_by(table.c.module_id)
+        ):
+            modules.setdefault((key, swap_id), []).append(str(module_id))
+    now = datetime.utcnow()
+    # render_nulls keeps rows with and without a priority or notes in one multi-row INSERT; the
+    # ORM would otherwise split the batch by which columns are None.
+    db.session.execute(db.insert(SwapRequestHistory).execution_options(render_nulls=True), [
+        {
+            "swap_id": r.id,
+            "user_id": r.user_id,
+            "status": status,
+            "notes": r.notes,
+            "priority": r.priority,
+            "give_module_ids": ",".join(modules.get(("give", r.id), [])),
+            "want_module_ids": ",".join(modules.get(("want", r.id), [])),
+            "created_at": r.created_at,
+            "decided_at": now,
+            "decided_by": decided_by,
+        }
+        for r in rows
+    ])
+    db.session.execute(db.delete(swap_give_modules).where(swap_give_modules.c.swap_id.in_(ids)))
+    db.session.execute(db.delete(swap_want_modules).where(swap_want_modules.c.swap_id.in_(ids)))
+    db.session.execute(db.delete(SwapRequest).where(SwapRequest.id.in_(ids)))
+    return {r.id: r.user_id for r in rows}
+
+
+def moderate(ids, status, decided_by=None):
+    # Applies a moderation decision to many requests with a fixed number of statements.
+    # The caller commits.
+    if status in {"Approved", "Rejected"}:
+        owners = archive_swaps(ids, status, decided_by)
+    else:
+        owners = dict(db.session.execute(
+            db.update(SwapRequest)
+            .where(SwapRequest.id.in_(ids))
+            .values(status=status)
+            .returning(SwapRequest.id, SwapRequest.user_id)
+        ).all())
+    if not owners:
+        return 0
+    recipients = {}
+    for swap_id, user_id in sorted(owners.items()):
+        recipients.setdefault(user_id, {"swap_ids": [], "status": status})["swap_ids"].append(swap_id)
+    notify("status", recipients)
+    mark_swaps_changed(db.session, owners)
+    mark_user_stats_changed(db.session, recipients)
+    return len(owners)
+
+
+VERIFICATION_STATUSES = {"Approved": "Verified", "Rejected": "Rejected"}
+
+
+def review_documents(ids, status):
+    # Decides many pending documents at once: one UPDATE for the documents and one for their
+    # owners, whose verification status only changes once nothing of theirs is left pending.
+    # The caller commits.
+    owners = {}
+    for doc_id, user_id in db.session.execute(
+        db.update(Document)
+        .where(Document.id.in_(ids), Document.status == "Pending")
+        .values(status=status)
+        .returning(Document.id, Document.user_id)
+    ):
+        owners.setdefault(user_id, []).append(doc_id)
+    if not owners:
+        return 0
+    still_pending = db.select(Document.id).filter(Document.user_id == User.id, Document.status == "Pending").exists()
+    db.session.execute(
+        db.update(User)
+        .where(User.id.in_(owners), ~still_pending)
+        .values(student_id_status=VERIFICATION_STATUSES[status])
+        .execution_options(synchronize_session=False)
+    )
+    mark_users_changed(db.session, owners)
+    notify("verification", {
+        user_id: {"document_ids": sorted(doc_ids), "status": status} for user_id, doc_ids in owners.items()
+    })
+    return sum(map(len, owners.values()))
@@ -1,7 +1,17 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash
-from flask_login import login_required
+from datetime import datetime
+from flask import Blueprint, render_template, redirect, url_for, request, flash, current_app, jsonify
+from flask_login import login_required, current_user
+from sqlalchemy import func, or_
+from sqlalchemy.orm import joinedload
 from ..extensions import db
-from ..models import SwapRequest, Module
+from ..models import Document, SwapRequest, Module, UserReputation, swap_give_modules, swap_want_modules
+from ..queries import after_cursor, before_cursor, decode_cursor, encode_cursor, select_swaps, swap_list_options
+from ..querybudget import query_budget
+from ..swaps.bulk import InvalidImport, import_swaps, parse_rows
+from ..swaps.cycles import get_cycle_matcher
+from ..swaps.matching import compatibility_scores
+from ..search import any_module, ranked_swaps
+from .moderation import moderate, review_documents
 
 
 admin_bp = Blueprint("admin", __name__, template_folder="templates")
@@ -14,6 +24,7 @@ def teacher_only():
 
 @admin_bp.get("/swaps")
 @login_required
+@query_budget(8)
 def swaps():
     if not teacher_only():
         return redirect(url_for("auth.login"))
@@ -28,88 +39,187 @@ def swaps():
         base = base.filter_by(status=status)
     if priority:
         base = base.filter_by(priority=priority)
-    swaps = db.session.execute(base.order_by(SwapRequest.created_at.desc())).scalars().all()
-    def matches_filters(s: SwapRequest) -> bool:
-        modules = list(s.giving) + list(s.wanting)
-        ok_dept = True
-        ok_year = True
-        if dept:
-            ok_dept = any((m.department or "").lower() == dept for m in modules)
-        if year:
-            try:
-                yr = int(year)
-                ok_year = any((m.year or 0) == yr for m in modules)
-            except Exception:
-                ok_year = True
-        ok_search = True
-        if search:
-            ok_search = any(search in (m.code or '').lower() or search in (m.name or '').lower() or search in (m.department or '').lower() for m in modules) or (search in (s.notes or '').lower())
-        ok_expiry = True
-        if expires_before and s.expires_at:
-            try:
-                from datetime import datetime
-                import datetime as dt
-                cutoff = datetime.strptime(expires_before, "%Y-%m-%d")
-                ok_expiry = s.expires_at <= cutoff
-            except Exception:
-                ok_expiry = True
-        return ok_dept and ok_year and ok_search and ok_expiry
-    swaps = [s for s in swaps if matches_filters(s)]
-    others = swaps
-    def score_for(s: SwapRequest) -> int:
-        s_g = {m.id for m in s.giving}
-        s_w = {m.id for m in s.wanting}
-        score = 0
-        for o in others:
-            if o.id == s.id:
-                continue
-            o_g = {m.id for m in o.giving}
-            o_w = {m.id for m in o.wanting}
-            score += len(o_w & s_g) + len(o_g & s_w)
-        return score
+    if dept:
+        base = base.filter(any_module(func.lower(Module.department) == dept))
+    if year:
+        try:
+            yr = int(year)
+            base = base.filter(any_module(or_(Module.year == yr, Module.year.is_(None)) if yr == 0 else Module.year == yr))
+        except ValueError:
+            pass
+    ranked = ranked_swaps(search)
+    if ranked is not None:
+        base = base.filter(SwapRequest.id.in_(db.select(ranked.c.swap_id)))
+    if expires_before:
+        try:
+            cutoff = datetime.strptime(expires_before, "%Y-%m-%d")
+            base = base.filter(or_(SwapRequest.expires_at.is_(None), SwapRequest.expires_at <= cutoff))
+        except ValueError:
+            pass
+    filtered_ids = base.with_only_columns(SwapRequest.id).scalar_subquery()
+    give_counts = dict(db.session.execute(
+        db.select(swap_give_modules.c.module_id, func.count())
+        .filter(swap_give_modules.c.swap_id.in_(filtered_ids))
+        .group_by(swap_give_modules.c.module_id)
+    ).all())
+    want_counts = dict(db.session.execute(
+        db.select(swap_want_modules.c.module_id, func.count())
+        .filter(swap_want_modules.c.swap_id.in_(filtered_ids))
+        .group_by(swap_want_modules.c.module_id)
+    ).all())
+    page = base.options(*swap_list_options())
+    if request.args.get("sort") == "reputation":
+        # Owner reputation from the summary table, joined rather than looked up per row.
+        sort_key = func.coalesce(UserReputation.score, 0.0)
+        page = page.outerjoin(UserReputation, UserReputation.user_id == SwapRequest.user_id)
+        cursor = decode_cursor(request.args.get("after"), float)
+    else:
+        sort_key = SwapRequest.created_at
+        cursor = decode_cursor(request.args.get("after"))
+    if cursor:
+        page = page.filter(before_cursor(sort_key, SwapRequest.id, cursor))
+    page_size = current_app.config["ADMIN_PAGE_SIZE"]
+    swaps = db.session.execute(
+        page.order_by(sort_key.desc(), SwapRequest.id.desc()).limit(page_size + 1)
+    ).scalars().all()
+    next_url = None
+    if len(swaps) > page_size:
+        swaps = swaps[:page_size]
+        last = swaps[-1]
+        args = request.args.to_dict()
+        if request.args.get("sort") == "reputation":
+            args["after"] = encode_cursor(last.user.reputation.score if last.user.reputation else 0.0, last.id)
+        else:
+            args["after"] = encode_cursor(last.created_at, last.id)
+        next_url = url_for("admin.swaps", **args)
+    scores = compatibility_scores(
+        {s.id: {m.id for m in s.giving} for s in swaps},
+        {s.id: {m.id for m in s.wanting} for s in swaps},
+        give_counts=give_counts,
+        want_counts=want_counts,
+    )
     annotated = []
-    from datetime import datetime
     for s in swaps:
         days_left = None
         if s.expires_at:
             days_left = (s.expires_at - datetime.utcnow()).days
-        annotated.append({"swap": s, "score": score_for(s), "days_left": days_left})
-    return render_template("admin/swaps.html", swaps=annotated)
+        annotated.append({"swap": s, "score": scores[s.id], "days_left": days_left})
+    return render_template("admin/swaps.html", swaps=annotated, next_url=next_url)
+
+
+@admin_bp.get("/cycles")
+@login_required
+@query_budget(8)
+def cycles():
+    if not teacher_only():
+        return redirect(url_for("auth.login"))
+    found = get_cycle_matcher().sync()
+    ids = {n for c in found for n in c}
+    rows = db.session.execute(select_swaps().filter(SwapRequest.id.in_(ids))).scalars().all() if ids else []
+    by_id = {s.id: s for s in rows}
+    chains = []
+    for cycle in found:
+        if not all(n in by_id for n in cycle):
+            continue
+        steps = []
+        for pos, n in enumerate(cycle):
+            s = by_id[n]
+            nxt = by_id[cycle[(pos + 1) % len(cycle)]]
+            wanted = {m.id for m in nxt.wanting}
+            steps.append({"swap": s, "to": nxt, "gives": [m for m in s.giving if m.id in wanted]})
+        chains.append(steps)
+    return render_template("admin/cycles.html", chains=chains)
 
 
 @admin_bp.post("/swaps/<int:swap_id>/status")
 @login_required
+@query_budget(11)
 def set_status(swap_id: int):
     if not teacher_only():
         return redirect(url_for("auth.login"))
     status = request.form.get("status")
-    s = db.session.get(SwapRequest, swap_id)
-    if s and status in {"Approved", "Rejected", "Needs Info"}:
-        if status in {"Approved", "Rejected"}:
-            db.session.delete(s)
-            db.session.commit()
-        else:
-            s.status = status
-            db.session.commit()
+    if status in {"Approved", "Rejected", "Needs Info"}:
+        moderate([swap_id], status, current_user.id)
+        db.session.commit()
     return redirect(url_for("admin.swaps"))
 
 
 @admin_bp.post("/swaps/bulk")
 @login_required
+@query_budget(11)
 def bulk():
     if not teacher_only():
         return redirect(url_for("auth.login"))
     action = request.form.get("action")
     ids = [int(x) for x in request.form.getlist("ids")]
-    rows = db.session.execute(db.select(SwapRequest).filter(SwapRequest.id.in_(ids))).scalars().all()
-    if action in {"approve", "reject", "needs_info"}:
-        if action in {"approve", "reject"}:
-            for r in rows:
-                db.session.delete(r)
-            db.session.commit()
-        else:
-            for r in rows:
-                r.status = "Needs Info"
-            db.session.commit()
-        flash(f"Updated {len(rows)} request(s)")
+    statuses = {"approve": "Approved", "reject": "Rejected", "needs_info": "Needs Info"}
+    if action in statuses and ids:
+        updated = moderate(ids, statuses[action], current_user.id)
+        db.session.commit()
+        flash(f"Updated {updated} request(s)")
     return redirect(url_for("admin.swaps"))
+
+
+@admin_bp.post("/swaps/import")
+@login_required
+def import_requests():
+    if not teacher_only():
+        return jsonify({"error": "Teacher access required"}), 403
+    upload = request.files.get("file")
+    try:
+        if upload:
+            content_type = "text/csv" if upload.filename.lower().endswith(".csv") else upload.mimetype
+            rows = parse_rows(upload.read(), content_type)
+        elif request.is_json:
+            payload = request.get_json(silent=True)
+            rows = parse_rows(payload.get("swaps") if isinstance(payload, dict) else payload, request.content_type)
+        else:
+            rows = parse_rows(request.get_data(), request.content_type)
+    except InvalidImport as exc:
+        return jsonify({"error": str(exc)}), 400
+    ids, errors = import_swaps(rows, max_rows=current_app.config["IMPORT_MAX_ROWS"])
+    if ids:
+        db.session.commit()
+    return jsonify({"created": len(ids), "ids": ids, "errors": errors})
+
+
+@admin_bp.get("/documents")
+@login_required
+@query_budget(6)
+def documents():
+    if not teacher_only():
+        return redirect(url_for("auth.login"))
+    status = request.args.get("status") or "Pending"
+    # Oldest first, walking ix_documents_status_created.
+    base = db.select(Document).filter(Document.status == status)
+    total = db.session.execute(base.with_only_columns(func.count(Document.id))).scalar()
+    cursor = decode_cursor(request.args.get("after"))
+    if cursor:
+        base = base.filter(after_cursor(Document.created_at, Document.id, cursor))
+    page_size = current_app.config["DOCUMENT_REVIEW_PAGE_SIZE"]
+    docs = db.session.execute(
+        base.options(joinedload(Document.user))
+        .order_by(Document.created_at, Document.id)
+        .limit(page_size + 1)
+    ).scalars().all()
+    next_url = None
+    if len(docs) > page_size:
+        docs = docs[:page_size]
+        next_url = url_for("admin.documents", status=status, after=encode_cursor(docs[-1].created_at, docs[-1].id))
+    return render_template("admin/documents.html", documents=docs, status=status, total=total, next_url=next_url)
+
+
+@admin_bp.post("/documents/review")
+@login_required
+@query_budget(8)
+def review():
+    if not teacher_only():
+        return redirect(url_for("auth.login"))
+    statuses = {"approve": "Approved", "reject": "Rejected"}
+    action = request.form.get("action")
+    ids = [int(x) for x in request.form.getlist("ids") if x.isdigit()]
+    if action in statuses and ids:
+        updated = review_documents(ids, statuses[action])
+        db.session.commit()
+        flash(f"{statuses[action]} {updated} document(s)")
+    return redirect(url_for("admin.documents"))
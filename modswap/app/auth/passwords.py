@@ -0,0 +1,44 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from flask import current_app
+from ..extensions import bcrypt
+
+
+class VerifierBusy(RuntimeError):
+    pass
+
+
+class PasswordVerifier:
+    # bcrypt releases the GIL while hashing, so a small thread pool runs checks in parallel.
+    # At most workers + queue checks are admitted at once; the rest fail fast instead of
+    # tying up every request worker behind a login burst.
+    def __init__(self, workers, queue, timeout):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.slots = threading.BoundedSemaphore(workers + queue)
+        self.timeout = timeout
+
+    def check(self, password_hash, password):
+        if not self.slots.acquire(blocking=False):
+            raise VerifierBusy("Too many sign-ins in progress")
+        try:
+            future = self.executor.submit(bcrypt.check_password_hash, password_hash, password)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # Before Python 3.11 this is not the builtin TimeoutError.
+            raise VerifierBusy("Password check timed out") from None
+
+
+def check_password(password_hash, password):
+    workers = current_app.config["BCRYPT_WORKERS"]
+    if workers <= 0:
+        return bcrypt.check_password_hash(password_hash, password)
+    if "password_verifier" not in current_app.extensions:
+        current_app.extensions["password_verifier"] = PasswordVerifier(
+            workers, current_app.config["BCRYPT_QUEUE"], current_app.config["BCRYPT_TIMEOUT"]
+        )
+    return current_app.extensions["password_verifier"].check(password_hash, password)
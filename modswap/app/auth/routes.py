@@ -4,8 +4,10 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_user, logout_user, current_user
 from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 from flask import current_app
-from ..extensions import db, bcrypt
+from ..extensions import db
 from ..models import User
+from ..ratelimit import take_token
+from .passwords import VerifierBusy, check_password
 
 
 auth_bp = Blueprint("auth", __name__, template_folder="templates")
@@ -19,6 +21,34 @@ def email_is_uni(email):
     return re.search(r"@.+\.ac\.uk$", email) is not None
 
 
+def login_allowed(email):
+    # Checked before any lookup or hashing so a flood costs one cache round trip per attempt.
+    # The email bucket is per client address too, so guessing at an account from elsewhere
+    # cannot lock its owner out. remote_addr is the real client once PROXY_FIX_HOPS is set.
+    config = current_app.config
+    if not config["LOGIN_RATE_LIMIT"]:
+        return True
+    ip = request.remote_addr
+    return (
+        take_token(f"login:ip:{ip}", config["LOGIN_IP_BURST"], config["LOGIN_IP_RATE"])
+        and take_token(f"login:email:{email}:{ip}", config["LOGIN_EMAIL_BURST"], config["LOGIN_EMAIL_RATE"])
+    )
+
+
+def login_refused(message, status):
+    flash(message)
+    response = current_app.make_response((render_template("auth/login.html"), status))
+    response.headers["Retry-After"] = "30"
+    return response
+
+
+def password_matches(password_hash, password):
+    try:
+        return check_password(password_hash, password)
+    except VerifierBusy:
+        return None
+
+
 @auth_bp.get("/login")
 def login():
     if current_user.is_authenticated:
@@ -30,6 +60,8 @@ def login():
 def send_magic_link():
     email = request.form.get("email", "").strip().lower()
     role = request.form.get("role", "student")
+    if not login_allowed(email):
+        return login_refused("Too many sign-in attempts, please wait a moment and try again", 429)
     if role == "teacher":
         password = request.form.get("password", "")
         user = db.session.execute(db.select(User).filter_by(email=email)).scalar_one_or_none()
@@ -37,7 +69,10 @@ def send_magic_link():
         if not user or not user.password_hash or (getattr(user, "role", "student") != "teacher" and email not in admin_emails):
             flash("Admin account not found")
             return redirect(url_for("auth.login"))
-        if not bcrypt.check_password_hash(user.password_hash, password):
+        matches = password_matches(user.password_hash, password)
+        if matches is None:
+            return login_refused("Sign-in is busy, please try again shortly", 503)
+        if not matches:
             flash("Invalid admin credentials")
             return redirect(url_for("auth.login"))
         login_user(user)
@@ -55,7 +90,10 @@ def send_magic_link():
     if not user or getattr(user, "role", "student") != "student" or not user.password_hash:
         flash("Student account not found")
         return redirect(url_for("auth.login"))
-    if not bcrypt.check_password_hash(user.password_hash, password):
+    matches = password_matches(user.password_hash, password)
+    if matches is None:
+        return login_refused("Sign-in is busy, please try again shortly", 503)
+    if not matches:
         flash("Invalid student credentials")
         return redirect(url_for("auth.login"))
     login_user(user)
@@ -0,0 +1,63 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+
+
+class LRUCache:
+    # With a ttl, entries also expire: other processes cannot reach this cache to invalidate
+    # it, so without Redis that bounds how long they serve data changed elsewhere.
+    def __init__(self, maxsize=256, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            expires, value = self._data[key]
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl if self.ttl else None, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def get_redis():
+    url = current_app.config.get("REDIS_URL")
+    if not url:
+        return None
+    if "redis" not in current_app.extensions:
+        import redis
+        current_app.extensions["redis"] = redis.Redis.from_url(url)
+    return current_app.extensions["redis"]
+
+
+def app_cache(name, maxsize=256, ttl=None):
+    # ttl defaults to LOCAL_CACHE_TTL; 0 keeps entries until evicted, for state rather than
+    # cached copies of the database.
+    key = f"cache:{name}"
+    if key not in current_app.extensions:
+        current_app.extensions[key] = LRUCache(maxsize, current_app.config["LOCAL_CACHE_TTL"] if ttl is None else ttl)
+    return current_app.extensions[key]
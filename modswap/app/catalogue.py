@@ -0,0 +1,80 @@
+import hashlib
+import json
+from flask import current_app, has_app_context
+from .cache import app_cache, get_redis
+from .events import modules_changed
+from .extensions import db
+from .models import Module
+
+
+VERSION_KEY = "modswap:catalogue:version"
+
+
+def catalogue_version():
+    client = get_redis()
+    if client is not None:
+        return int(client.get(VERSION_KEY) or 0)
+    return current_app.extensions.get("catalogue_version", 0)
+
+
+def bump_catalogue_version():
+    client = get_redis()
+    if client is not None:
+        client.incr(VERSION_KEY)
+    else:
+        current_app.extensions["catalogue_version"] = current_app.extensions.get("catalogue_version", 0) + 1
+    app_cache("catalogue", 4).clear()
+
+
+def build_catalogue(version):
+    modules = [
+        {"id": m.id, "code": m.code, "name": m.name, "department": m.department, "year": m.year}
+        for m in db.session.execute(
+            db.select(Module).order_by(Module.department, Module.year, Module.code)
+        ).scalars()
+    ]
+    groups = []
+    for m in modules:
+        if not groups or (groups[-1]["department"], groups[-1]["year"]) != (m["department"], m["year"]):
+            groups.append({"department": m["department"], "year": m["year"], "modules": []})
+        groups[-1]["modules"].append(m)
+    body = json.dumps({"version": version, "modules": modules, "groups": groups}, separators=(",", ":"))
+    return {
+        "version": version,
+        "etag": hashlib.sha1(body.encode("utf-8")).hexdigest(),
+        "json": body,
+        "modules": modules,
+        "groups": groups,
+    }
+
+
+def get_catalogue():
+    version = catalogue_version()
+    cache = app_cache("catalogue", 4)
+    catalogue = cache.get(version)
+    if catalogue is not None:
+        return catalogue
+    client = get_redis()
+    key = f"modswap:catalogue:{version}"
+    raw = client.get(key) if client is not None else None
+    if raw is not None:
+        data = json.loads(raw)
+        catalogue = {
+            "version": version,
+            "etag": hashlib.sha1(raw).hexdigest(),
+            "json": raw.decode("utf-8"),
+            "modules": data["modules"],
+            "groups": data["groups"],
+        }
+    else:
+        catalogue = build_catalogue(version)
+        if client is not None:
+            client.set(key, catalogue["json"], ex=current_app.config["CATALOGUE_TTL"])
+    cache.set(version, catalogue)
+    return catalogue
+
+
+@modules_changed.connect
+def on_modules_changed(sender):
+    if has_app_context():
+        bump_catalogue_version()
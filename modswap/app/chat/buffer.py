@@ -0,0 +1,94 @@
+import atexit
+import threading
+from datetime import datetime
+from ..extensions import db, socketio
+from ..models import Message
+
+
+class MessageBuffer:
+    # Collects chat messages and writes them with one multi-row INSERT per batch,
+    # either when batch_size is reached or every interval seconds.
+
+    def __init__(self, app, batch_size=100, interval=1.0, limit=10000):
+        self.app = app
+        self.batch_size = batch_size
+        self.interval = interval
+        self.limit = limit
+        self._rows = []
+        self._lock = threading.Lock()
+        self._flusher = None
+        atexit.register(self.flush)
+
+    def add(self, swap_id, sender_id, receiver_id, content):
+        row = {
+            "swap_id": swap_id,
+            "sender_id": sender_id,
+            "receiver_id": receiver_id,
+            "content": content,
+            "created_at": datetime.utcnow(),
+        }
+        with self._lock:
+            self._rows.append(row)
+            full = len(self._rows) >= self.batch_size
+            if self._flusher is None:
+                self._flusher = socketio.start_background_task(self._run)
+        if full:
+            self.flush()
+        return row
+
+    def pending(self):
+        with self._lock:
+            return len(self._rows)
+
+    def involves(self, swap_id, user_id):
+        with self._lock:
+            return any(
+                row["swap_id"] == swap_id and user_id in (row["sender_id"], row["receiver_id"]) for row in self._rows
+            )
+
+    def buffered(self, swap_id):
+        # Copies of the swap's messages that are not written yet, oldest first.
+        with self._lock:
+            return [dict(row) for row in self._rows if row["swap_id"] == swap_id]
+
+    def flush(self):
+        with self._lock:
+            rows, self._rows = self._rows, []
+        if not rows:
+            return 0
+        with self.app.app_context():
+            try:
+                db.session.execute(db.insert(Message), rows)
+                db.session.commit()
+            except Exception:
+                # Put the batch back ahead of anything added since, so the next flush retries it.
+                # While writes keep failing the oldest messages beyond the limit are dropped.
+                with self._lock:
+                    self._rows[:0] = rows
+                    dropped = len(self._rows) - self.limit
+                    if dropped > 0:
+                        del self._rows[:dropped]
+                if dropped > 0:
+                    self.app.logger.error("Dropped %d unwritten chat message(s) over the buffer limit", dropped)
+                raise
+        return len(rows)
+
+    def _run(self):
+        while True:
+            socketio.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                self.app.logger.exception("Failed to flush chat messages")
+
+
+def get_message_buffer():
+    from flask import current_app
+    if "message_buffer" not in current_app.extensions:
+        current_app.extensions["message_buffer"] = MessageBuffer(
+            current_app._get_current_object(),
+            batch_size=current_app.config["CHAT_BATCH_SIZE"],
+            interval=current_app.config["CHAT_FLUSH_INTERVAL"],
+            limit=current_app.config["CHAT_BUFFER_LIMIT"],
+        )
+    return current_app.extensions["message_buffer"]
@@ -0,0 +1,80 @@
+from flask import has_app_context
+from flask_login import current_user
+from flask_socketio import join_room, leave_room
+from ..events import chats_opened
+from ..extensions import socketio
+from .buffer import get_message_buffer
+from .participants import is_counterpart, thread_owner
+
+
+MAX_MESSAGE_LENGTH = 2000
+
+
+def room_for(swap_id, user_id):
+    # One room per person per thread: someone other than the owner only hears their own
+    # conversation with the owner, while the owner hears all of them.
+    return f"swap-{swap_id}-user-{user_id}"
+
+
+def send_message(swap_id, sender_id, receiver_id, content):
+    # Buffers the message for the next batched INSERT and pushes it to both people's rooms.
+    row = get_message_buffer().add(swap_id, sender_id, receiver_id, content)
+    payload = dict(row, created_at=row["created_at"].isoformat())
+    socketio.emit("message", payload, to=room_for(swap_id, sender_id))
+    socketio.emit("message", payload, to=room_for(swap_id, receiver_id))
+    return row
+
+
+def swap_id_from(data):
+    try:
+        return int((data or {}).get("swap_id"))
+    except (TypeError, ValueError):
+        return None
+
+
+@socketio.on("join")
+def on_join(data):
+    swap_id = swap_id_from(data)
+    if not current_user.is_authenticated or swap_id is None or thread_owner(swap_id, current_user.id) is None:
+        return {"ok": False, "error": "Not allowed"}
+    join_room(room_for(swap_id, current_user.id))
+    return {"ok": True}
+
+
+@socketio.on("leave")
+def on_leave(data):
+    swap_id = swap_id_from(data)
+    if swap_id is not None and current_user.is_authenticated:
+        leave_room(room_for(swap_id, current_user.id))
+    return {"ok": True}
+
+
+@socketio.on("message")
+def on_message(data):
+    swap_id = swap_id_from(data)
+    content = ((data or {}).get("content") or "").strip()
+    if not current_user.is_authenticated or swap_id is None:
+        return {"ok": False, "error": "Not allowed"}
+    if not content or len(content) > MAX_MESSAGE_LENGTH:
+        return {"ok": False, "error": f"Messages must be 1-{MAX_MESSAGE_LENGTH} characters"}
+    owner_id = thread_owner(swap_id, current_user.id)
+    if owner_id is None:
+        return {"ok": False, "error": "Swap request not found"}
+    receiver_id = owner_id
+    if owner_id == current_user.id:
+        try:
+            receiver_id = int(data.get("to"))
+        except (TypeError, ValueError):
+            return {"ok": False, "error": "Choose who to reply to"}
+        if receiver_id == owner_id or not is_counterpart(swap_id, receiver_id):
+            return {"ok": False, "error": "Choose who to reply to"}
+    send_message(swap_id, current_user.id, receiver_id, content)
+    return {"ok": True}
+
+
+@chats_opened.connect
+def on_chats_opened(sender, messages):
+    if not has_app_context():
+        return
+    for message in messages:
+        send_message(message["swap_id"], message["sender_id"], message["receiver_id"], message["content"])
@@ -0,0 +1,58 @@
+from sqlalchemy import and_, or_
+from ..cache import app_cache
+from ..extensions import db
+from ..models import Message, SwapMatch, SwapRequest
+from .buffer import get_message_buffer
+
+
+def swap_owner(swap_id):
+    owners = app_cache("swap_owner", 10000)
+    owner_id = owners.get(swap_id)
+    if owner_id is None:
+        owner_id = db.session.execute(db.select(SwapRequest.user_id).filter_by(id=swap_id)).scalar_one_or_none()
+        if owner_id is not None:
+            owners.set(swap_id, owner_id)
+    return owner_id
+
+
+def is_counterpart(swap_id, user_id):
+    # Someone other than the owner belongs in a thread once they have exchanged a message in it,
+    # or while one of their requests is a stored match for it, which lets them open the thread.
+    if get_message_buffer().involves(swap_id, user_id):
+        return True
+    messaged = db.select(Message.id).filter(
+        Message.swap_id == swap_id, or_(Message.sender_id == user_id, Message.receiver_id == user_id)
+    ).exists()
+    matched = (
+        db.select(SwapMatch.swap_id)
+        .join(SwapRequest, SwapRequest.id == SwapMatch.match_id)
+        .filter(SwapMatch.swap_id == swap_id, SwapRequest.user_id == user_id)
+        .exists()
+    )
+    return bool(db.session.execute(db.select(or_(messaged, matched))).scalar())
+
+
+def thread_owner(swap_id, user_id):
+    # The owner's id when user_id may read and post in the swap's thread, otherwise None.
+    owner_id = swap_owner(swap_id)
+    if owner_id is None or user_id is None:
+        return None
+    if owner_id == user_id or is_counterpart(swap_id, user_id):
+        return owner_id
+    return None
+
+
+def visible_messages(swap_id, owner_id, user_id):
+    # The owner sees every conversation in the thread; anyone else only their own with the owner.
+    criteria = [Message.swap_id == swap_id]
+    if user_id != owner_id:
+        criteria.append(or_(
+            and_(Message.sender_id == user_id, Message.receiver_id == owner_id),
+            and_(Message.sender_id == owner_id, Message.receiver_id == user_id),
+        ))
+    return criteria
+
+
+def sees_message(owner_id, user_id, sender_id, receiver_id):
+    # visible_messages() for a message that is not in the database yet.
+    return user_id == owner_id or (sender_id, receiver_id) in ((user_id, owner_id), (owner_id, user_id))
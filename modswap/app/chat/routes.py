@@ -1,10 +1,118 @@
-from flask import Blueprint, render_template
-from flask_login import login_required
+from flask import Blueprint, render_template, request, jsonify, current_app, abort, flash, redirect, url_for
+from flask_login import login_required, current_user
+from sqlalchemy import or_
+from ..extensions import db
+from ..models import Message, Rating, SwapRequest
+from ..queries import before_cursor, decode_cursor, encode_cursor
+from .buffer import get_message_buffer
+from .participants import sees_message, thread_owner, visible_messages
 
 chat_bp = Blueprint("chat", __name__, template_folder="templates")
 
+# Sorts buffered messages, which have no id yet, after written ones with the same timestamp.
+UNWRITTEN_ID = 2 ** 63 - 1
+
 
 @chat_bp.get("/")
 @login_required
 def index():
-    return render_template("chat/thread.html")
\ No newline at end of file
+    swap_ids = db.select(Message.swap_id).filter(
+        or_(Message.sender_id == current_user.id, Message.receiver_id == current_user.id)
+    ).distinct()
+    threads = db.session.execute(
+        db.select(SwapRequest)
+        .filter(or_(SwapRequest.user_id == current_user.id, SwapRequest.id.in_(swap_ids)))
+        .order_by(SwapRequest.created_at.desc())
+        .limit(50)
+    ).scalars().all()
+    return render_template("chat/thread.html", threads=threads, swap=None)
+
+
+@chat_bp.get("/<int:swap_id>")
+@login_required
+def thread(swap_id: int):
+    if thread_owner(swap_id, current_user.id) is None:
+        abort(404)
+    swap = db.session.get(SwapRequest, swap_id)
+    return render_template("chat/thread.html", threads=[], swap=swap)
+
+
+@chat_bp.get("/<int:swap_id>/messages")
+@login_required
+def history(swap_id: int):
+    owner_id = thread_owner(swap_id, current_user.id)
+    if owner_id is None:
+        abort(404)
+    limit = max(1, min(request.args.get("limit", current_app.config["CHAT_PAGE_SIZE"], type=int), 200))
+    cursor = decode_cursor(request.args.get("before"))
+    # Messages still in the buffer are merged in rather than flushed. The buffer is read before
+    # the database, so a message written in between is seen twice and kept once.
+    pending = [
+        dict(row, id=None) for row in get_message_buffer().buffered(swap_id)
+        if sees_message(owner_id, current_user.id, row["sender_id"], row["receiver_id"])
+        and (cursor is None or (row["created_at"], UNWRITTEN_ID) < cursor)
+    ]
+    query = db.select(Message).filter(*visible_messages(swap_id, owner_id, current_user.id))
+    if cursor:
+        query = query.filter(before_cursor(Message.created_at, Message.id, cursor))
+    rows = [
+        {
+            "id": m.id,
+            "swap_id": m.swap_id,
+            "sender_id": m.sender_id,
+            "receiver_id": m.receiver_id,
+            "content": m.content,
+            "created_at": m.created_at,
+        }
+        for m in db.session.execute(
+            query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1)
+        ).scalars()
+    ]
+    written = {(m["sender_id"], m["receiver_id"], m["created_at"], m["content"]) for m in rows}
+    rows += [m for m in pending if (m["sender_id"], m["receiver_id"], m["created_at"], m["content"]) not in written]
+    rows.sort(key=lambda m: (m["created_at"], m["id"] or UNWRITTEN_ID), reverse=True)
+    more = len(rows) > limit
+    rows = rows[:limit]
+    last = rows[-1] if rows else None
+    return jsonify({
+        "messages": [dict(m, created_at=m["created_at"].isoformat()) for m in rows],
+        "next": encode_cursor(last["created_at"], last["id"] or UNWRITTEN_ID) if more else None,
+    })
+
+
+@chat_bp.post("/<int:swap_id>/rate")
+@login_required
+def rate(swap_id: int):
+    swap = db.session.get(SwapRequest, swap_id)
+    if swap is None:
+        abort(404)
+    # Only people who took part in the thread can rate each other.
+    if swap.user_id == current_user.id:
+        receiver_id = sender_id = request.form.get("receiver_id", type=int)
+    else:
+        receiver_id, sender_id = swap.user_id, current_user.id
+    took_part = sender_id and (
+        any(row["sender_id"] == sender_id for row in get_message_buffer().buffered(swap_id))
+        or db.session.execute(
+            db.select(Message.id).filter(Message.swap_id == swap_id, Message.sender_id == sender_id).limit(1)
+        ).first()
+    )
+    if not took_part or receiver_id == current_user.id:
+        flash("You can only rate someone you have messaged about this swap")
+        return redirect(url_for("chat.thread", swap_id=swap_id))
+    exists = db.session.execute(
+        db.select(Rating.id).filter_by(swap_id=swap_id, rater_id=current_user.id, receiver_id=receiver_id).limit(1)
+    ).first()
+    if exists:
+        flash("You have already rated this swap")
+        return redirect(url_for("chat.thread", swap_id=swap_id))
+    db.session.add(Rating(
+        swap_id=swap_id,
+        rater_id=current_user.id,
+        receiver_id=receiver_id,
+        thumbs_up=request.form.get("thumbs") != "down",
+        comment=(request.form.get("comment") or "").strip()[:500] or None,
+    ))
+    db.session.commit()
+    flash("Thanks for your rating")
+    return redirect(url_for("chat.thread", swap_id=swap_id))
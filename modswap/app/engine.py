@@ -0,0 +1,67 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+
+# Pool sizes are per process. Timeouts are in milliseconds: statement_timeout is enforced by
+# Postgres, busy_timeout is how long a SQLite writer waits for the lock before failing.
+# "default" leaves SQLAlchemy's own settings untouched.
+ENGINE_PROFILES = {
+    "default": {},
+    "web": {
+        "pool_size": 10, "max_overflow": 20, "pool_timeout": 10, "pool_recycle": 1800,
+        "statement_timeout": 15000, "busy_timeout": 5000, "synchronous": "NORMAL",
+    },
+    "worker": {
+        "pool_size": 2, "max_overflow": 2, "pool_timeout": 30, "pool_recycle": 1800,
+        "statement_timeout": 300000, "busy_timeout": 30000, "synchronous": "NORMAL",
+    },
+    "serverless": {
+        "poolclass": NullPool, "statement_timeout": 10000, "busy_timeout": 5000, "synchronous": "NORMAL",
+    },
+}
+
+POOL_KEYS = ("poolclass", "pool_size", "max_overflow", "pool_timeout", "pool_recycle")
+
+
+def is_memory_sqlite(url):
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def engine_options(uri, name):
+    profile = ENGINE_PROFILES[name]
+    url = make_url(uri)
+    if not profile or is_memory_sqlite(url):
+        return {}
+    options = {key: profile[key] for key in POOL_KEYS if key in profile}
+    if options.get("poolclass") is NullPool:
+        options = {"poolclass": NullPool}
+    if url.get_backend_name() == "postgresql":
+        options["pool_pre_ping"] = True
+        if profile.get("statement_timeout"):
+            options["connect_args"] = {"options": f"-c statement_timeout={profile['statement_timeout']}"}
+    return options
+
+
+def init_engine(app):
+    # Must run before db.init_app, which builds the engine from these options.
+    name = app.config["DB_PROFILE"]
+    if name not in ENGINE_PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE {name!r}; expected one of {', '.join(ENGINE_PROFILES)}")
+    options = engine_options(app.config["SQLALCHEMY_DATABASE_URI"], name)
+    options.update(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+
+
+def tune_connections(engine, name):
+    profile = ENGINE_PROFILES[name]
+    if engine.dialect.name != "sqlite" or not profile or is_memory_sqlite(engine.url):
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL lets readers run alongside the single writer instead of blocking on it.
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(profile['busy_timeout'])}")
+        cursor.execute(f"PRAGMA synchronous={profile['synchronous']}")
+        cursor.close()
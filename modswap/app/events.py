@@ -0,0 +1,122 @@
+from blinker import Namespace
+from sqlalchemy import event, insert, inspect
+from sqlalchemy.orm import Session
+from .models import ChangeLog, Module, Notification, Rating, SwapRequest, User
+
+
+signals = Namespace()
+swaps_changed = signals.signal("swaps-changed")
+modules_changed = signals.signal("modules-changed")
+notifications_queued = signals.signal("notifications-queued")
+unread_changed = signals.signal("unread-changed")
+user_stats_changed = signals.signal("user-stats-changed")
+reputation_changed = signals.signal("reputation-changed")
+users_changed = signals.signal("users-changed")
+chats_opened = signals.signal("chats-opened")
+
+
+def mark_swaps_changed(session, ids):
+    # For swaps written with Core statements, which never pass through a flush.
+    session.info.setdefault("changed_swaps", set()).update(ids)
+
+
+def mark_user_stats_changed(session, user_ids):
+    # For Core writes that change a user's swap or rating counts.
+    session.info.setdefault("stats_users", set()).update(user_ids)
+
+
+def mark_users_changed(session, user_ids):
+    # For Core writes to users rows, so cached session users are dropped on commit.
+    session.info.setdefault("users_changed", set()).update(user_ids)
+
+
+def mark_chats_opened(session, messages):
+    # Chat messages written by the server itself; they go out through the chat buffer once the
+    # transaction that decided to send them has committed.
+    session.info.setdefault("opened_chats", []).extend(messages)
+
+
+def mark_unread_changed(session, deltas):
+    # deltas maps user id -> change in unread notifications, applied to cached counters on commit.
+    pending = session.info.setdefault("unread_deltas", {})
+    for user_id, delta in deltas.items():
+        pending[user_id] = pending.get(user_id, 0) + delta
+
+
+@event.listens_for(Session, "before_flush")
+def refresh_swap_signatures(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, SwapRequest):
+            continue
+        state = inspect(obj)
+        if obj in session.new or state.attrs.giving.history.has_changes() or state.attrs.wanting.history.has_changes():
+            obj.signature = SwapRequest.make_signature([m.id for m in obj.giving], [m.id for m in obj.wanting])
+
+
+@event.listens_for(Session, "after_flush")
+def collect_changes(session, flush_context):
+    changed = session.info.setdefault("changed_swaps", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, SwapRequest) and obj.id is not None:
+            changed.add(obj.id)
+            session.info.setdefault("stats_users", set()).add(obj.user_id)
+        elif isinstance(obj, Rating):
+            session.info.setdefault("stats_users", set()).add(obj.receiver_id)
+            session.info.setdefault("rated_users", set()).add(obj.receiver_id)
+        elif isinstance(obj, Module) and (obj not in session.dirty or session.is_modified(obj, include_collections=False)):
+            session.info["modules_changed"] = True
+        elif isinstance(obj, User) and obj.id is not None:
+            session.info.setdefault("users_changed", set()).add(obj.id)
+        elif isinstance(obj, Notification):
+            # ORM writes only; Core inserts and updates call mark_unread_changed themselves.
+            session.info.setdefault("unread_users", set()).add(obj.user_id)
+
+
+@event.listens_for(Session, "before_commit")
+def log_changes(session):
+    # Signals only reach this process; the change log is how the others hear about it.
+    session.flush()
+    rows = [{"topic": "swap", "ref_id": swap_id} for swap_id in session.info.get("changed_swaps", ())]
+    rows += [{"topic": "reputation", "ref_id": user_id} for user_id in session.info.get("rated_users", ())]
+    if rows:
+        session.execute(insert(ChangeLog), rows)
+
+
+@event.listens_for(Session, "after_commit")
+def publish_changes(session):
+    changed = session.info.pop("changed_swaps", None)
+    if changed:
+        swaps_changed.send(None, ids=changed)
+    if session.info.pop("modules_changed", False):
+        modules_changed.send(None)
+    if session.info.pop("notifications_queued", False):
+        notifications_queued.send(None)
+    stats_users = session.info.pop("stats_users", None)
+    if stats_users:
+        user_stats_changed.send(None, users=stats_users)
+    rated_users = session.info.pop("rated_users", None)
+    if rated_users:
+        reputation_changed.send(None, users=rated_users)
+    changed_users = session.info.pop("users_changed", None)
+    if changed_users:
+        users_changed.send(None, users=changed_users)
+    deltas = session.info.pop("unread_deltas", None)
+    users = session.info.pop("unread_users", None)
+    if deltas or users:
+        unread_changed.send(None, deltas=deltas or {}, users=users or set())
+    opened = session.info.pop("opened_chats", None)
+    if opened:
+        chats_opened.send(None, messages=opened)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_changes(session):
+    session.info.pop("changed_swaps", None)
+    session.info.pop("modules_changed", None)
+    session.info.pop("notifications_queued", None)
+    session.info.pop("unread_deltas", None)
+    session.info.pop("unread_users", None)
+    session.info.pop("stats_users", None)
+    session.info.pop("rated_users", None)
+    session.info.pop("users_changed", None)
+    session.info.pop("opened_chats", None)
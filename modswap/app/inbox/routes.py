@@ -0,0 +1,88 @@
+import json
+from flask import Blueprint, render_template, request, redirect, url_for, jsonify
+from flask_login import login_required, current_user
+from ..extensions import db
+from ..notifications import describe, inbox_page, mark_read, unread_count
+from ..querybudget import query_budget
+
+inbox_bp = Blueprint("inbox", __name__, template_folder="templates")
+
+
+@inbox_bp.app_context_processor
+def inject_unread():
+    if current_user.is_authenticated:
+        return {"unread_notifications": unread_count(current_user.id)}
+    return {"unread_notifications": 0}
+
+
+def serialize(n):
+    try:
+        payload = json.loads(n.payload or "{}")
+    except ValueError:
+        payload = {}
+    return {
+        "id": n.id,
+        "type": n.type,
+        "payload": payload,
+        "text": describe(n),
+        "read": bool(n.read),
+        "created_at": n.created_at.isoformat(),
+    }
+
+
+@inbox_bp.get("/")
+@login_required
+@query_budget(4)
+def index():
+    unread_only = request.args.get("unread") == "1"
+    rows, next_cursor = inbox_page(current_user.id, request.args.get("before"), unread_only)
+    next_url = url_for("inbox.index", before=next_cursor, unread="1" if unread_only else None) if next_cursor else None
+    return render_template("inbox/index.html", notifications=rows, next_url=next_url, unread_only=unread_only, describe=describe)
+
+
+@inbox_bp.get("/feed")
+@login_required
+@query_budget(4)
+def feed():
+    rows, next_cursor = inbox_page(
+        current_user.id,
+        request.args.get("before"),
+        request.args.get("unread") == "1",
+        request.args.get("limit", type=int),
+        request.args.get("type"),
+    )
+    return jsonify({
+        "notifications": [serialize(n) for n in rows],
+        "next": next_cursor,
+        "unread": unread_count(current_user.id),
+    })
+
+
+@inbox_bp.get("/unread")
+@login_required
+@query_budget(2)
+def unread():
+    return jsonify({"unread": unread_count(current_user.id)})
+
+
+@inbox_bp.post("/read")
+@login_required
+@query_budget(4)
+def read():
+    # Marks the given ids, or everything when none are posted, in one UPDATE.
+    if request.is_json:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not isinstance(data.get("ids") or [], list):
+            return jsonify({"error": "Expected a JSON object with an ids list"}), 400
+        ids = data.get("ids")
+    else:
+        ids = request.form.getlist("ids")
+    try:
+        ids = [int(x) for x in ids] if ids else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "Notification ids must be integers"}), 400
+    updated = mark_read(current_user.id, ids)
+    db.session.commit()
+    if request.is_json:
+        return jsonify({"updated": updated, "unread": unread_count(current_user.id)})
+    return redirect(request.form.get("next") or url_for("inbox.index"))
@@ -0,0 +1,22 @@
+from flask import Blueprint, current_app, abort
+from ..storage import get_storage
+from ..uploads import original_path
+
+media_bp = Blueprint("media", __name__)
+
+
+@media_bp.get("/<path:path>")
+def file(path):
+    # Only avatars are public; their names are content hashes, so they never change.
+    if not path.startswith("avatars/") or ".." in path.split("/"):
+        abort(404)
+    storage = get_storage()
+    if storage.exists(path):
+        response = storage.download_response(path, max_age=current_app.config["MEDIA_MAX_AGE"], public=True)
+        response.cache_control.immutable = True
+        return response
+    # A resized variant that is still being generated: serve the original briefly.
+    original = original_path(path)
+    if original is None or not storage.exists(original):
+        abort(404)
+    return storage.download_response(original, max_age=60, public=True)
@@ -0,0 +1,197 @@
+import cProfile
+import hmac
+import ipaddress
+import os
+import random
+import threading
+import time
+from flask import Response, abort, current_app, g, has_request_context, request, request_finished, request_started
+from flask import before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for pos, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[pos] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    # Per-process registry. Each worker process exposes its own numbers, which is what a
+    # Prometheus scrape of every instance expects.
+    HELP = {
+        "modswap_request_duration_seconds": ("histogram", "Time spent handling a request"),
+        "modswap_request_sql_seconds": ("histogram", "Time spent in SQL statements per request"),
+        "modswap_request_sql_statements": ("histogram", "SQL statements issued per request"),
+        "modswap_request_template_seconds": ("histogram", "Time spent rendering templates per request"),
+        "modswap_template_render_seconds": ("histogram", "Time spent rendering each template"),
+        "modswap_requests_total": ("counter", "Requests handled by endpoint and status"),
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram(buckets)
+            hist.observe(value)
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def render(self):
+        lines = []
+        with self.lock:
+            series = {}
+            for (name, labels), hist in self.histograms.items():
+                series.setdefault(name, []).append((labels, hist))
+            for (name, labels), value in self.counters.items():
+                series.setdefault(name, []).append((labels, value))
+            for name in sorted(series):
+                kind, text = self.HELP.get(name, ("untyped", name))
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in sorted(series[name], key=lambda item: item[0]):
+                    if kind != "histogram":
+                        lines.append(f"{name}{format_labels(labels)} {value}")
+                        continue
+                    running = 0
+                    for bound, count in zip(value.buckets, value.counts):
+                        running += count
+                        lines.append(f"{name}_bucket{format_labels(labels + (('le', repr(float(bound))),))} {running}")
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {value.count}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {value.sum}")
+                    lines.append(f"{name}_count{format_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in labels) + "}"
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def get_metrics():
+    return current_app.extensions.get("metrics")
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "metrics_started" in g:
+        conn.info.setdefault("metrics_timers", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def stop_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    timers = conn.info.get("metrics_timers")
+    if timers and has_request_context():
+        g.metrics_sql = g.get("metrics_sql", 0.0) + time.perf_counter() - timers.pop()
+
+
+def on_request_started(app, **extra):
+    g.metrics_started = time.perf_counter()
+    g.metrics_templates = []
+    rate = app.config["PROFILE_SAMPLE_RATE"]
+    if rate > 0 and random.random() < rate:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another request on this interpreter is already being profiled.
+            return
+        g.metrics_profiler = profiler
+
+
+def on_request_finished(app, response, **extra):
+    started = g.pop("metrics_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    profiler = g.pop("metrics_profiler", None)
+    if profiler is not None:
+        profiler.disable()
+        if elapsed * 1000 >= app.config["PROFILE_SLOW_MS"]:
+            save_profile(app, profiler, elapsed)
+    endpoint = request.endpoint or "unmatched"
+    labels = {"endpoint": endpoint}
+    metrics = app.extensions["metrics"]
+    metrics.observe("modswap_request_duration_seconds", labels, elapsed)
+    metrics.observe("modswap_request_sql_seconds", labels, g.get("metrics_sql", 0.0))
+    metrics.observe("modswap_request_sql_statements", labels, g.get("sql_statements", 0), COUNT_BUCKETS)
+    metrics.observe("modswap_request_template_seconds", labels, sum(t for _, t in g.metrics_templates))
+    for name, seconds in g.metrics_templates:
+        metrics.observe("modswap_template_render_seconds", {"template": name}, seconds)
+    metrics.inc("modswap_requests_total", {"endpoint": endpoint, "status": response.status_code})
+
+
+def on_before_render(app, template, context, **extra):
+    if "metrics_started" in g:
+        g.setdefault("metrics_render_stack", []).append(time.perf_counter())
+
+
+def on_rendered(app, template, context, **extra):
+    stack = g.get("metrics_render_stack")
+    if stack:
+        g.metrics_templates.append((template.name or "string", time.perf_counter() - stack.pop()))
+
+
+def save_profile(app, profiler, elapsed):
+    directory = app.config["PROFILE_DIR"] or os.path.join(app.instance_path, "profiles")
+    os.makedirs(directory, exist_ok=True)
+    name = f"{(request.endpoint or 'unmatched').replace('.', '-')}-{int(time.time() * 1000)}-{int(elapsed * 1000)}ms.prof"
+    profiler.dump_stats(os.path.join(directory, name))
+
+
+def metrics_view():
+    # With METRICS_TOKEN set scrapers send it as a bearer token; without one only the local
+    # machine may read the numbers.
+    token = current_app.config["METRICS_TOKEN"]
+    if token:
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            abort(403)
+    elif not is_loopback(request.remote_addr):
+        abort(403)
+    return Response(get_metrics().render(), mimetype="text/plain; version=0.0.4")
+
+
+def is_loopback(address):
+    try:
+        return ipaddress.ip_address(address or "").is_loopback
+    except ValueError:
+        return False
+
+
+def init_metrics(app):
+    if not app.config["METRICS_ENABLED"]:
+        return
+    app.extensions["metrics"] = Metrics()
+    request_started.connect(on_request_started, app)
+    request_finished.connect(on_request_finished, app)
+    before_render_template.connect(on_before_render, app)
+    template_rendered.connect(on_rendered, app)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
@@ -0,0 +1,235 @@
+import warnings
+from sqlalchemy import Column, Integer, MetaData, String, Table, bindparam, func, inspect, select
+from sqlalchemy.exc import DBAPIError, SAWarning
+from sqlalchemy.schema import CreateIndex
+from .extensions import db
+from .models import ChangeLog, MatchSync, SwapRequest, swap_give_modules, swap_want_modules
+from .reputation import rebuild_reputation
+from .search import install_search, search_backend
+from .swaps.matchcache import rebuild_matches
+
+
+schema_metadata = MetaData()
+
+schema_version = Table(
+    "schema_version",
+    schema_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("search_backend", String(20), nullable=False, default="like"),
+)
+
+
+LEGACY_COLUMNS = {
+    "users": [
+        ("username", "VARCHAR(255)"),
+        ("role", "VARCHAR(50)"),
+        ("password_hash", "VARCHAR(255)"),
+        ("profile_image", "VARCHAR(255)"),
+        ("department", "VARCHAR(255)"),
+        ("bio", "TEXT"),
+        ("interests", "TEXT"),
+        ("email_notifications", "BOOLEAN DEFAULT 0"),
+        ("verified_ac_email", "BOOLEAN DEFAULT 0"),
+        ("student_id_status", "VARCHAR(50) DEFAULT 'None'"),
+        ("preferred_timeslots", "VARCHAR(255)"),
+        ("campus", "VARCHAR(255)"),
+        ("preferred_module_groups", "TEXT"),
+        ("show_university", "BOOLEAN DEFAULT 1"),
+        ("show_modules", "BOOLEAN DEFAULT 1"),
+        ("show_bio", "BOOLEAN DEFAULT 1"),
+        ("consent_data_usage", "BOOLEAN DEFAULT 0"),
+    ],
+    "swap_requests": [
+        ("notes", "TEXT"),
+        ("priority", "VARCHAR(20)"),
+        ("expires_at", "DATETIME"),
+        ("timeslots", "VARCHAR(255)"),
+        ("campus", "VARCHAR(255)"),
+        ("module_group_pref", "TEXT"),
+        ("visibility", "VARCHAR(20) DEFAULT 'public'"),
+        ("alerts_email", "BOOLEAN DEFAULT 0"),
+        ("auto_create_chat", "BOOLEAN DEFAULT 0"),
+    ],
+}
+
+
+def add_columns(engine, table, columns):
+    insp = inspect(engine)
+    if not insp.has_table(table):
+        return
+    existing = {c["name"] for c in insp.get_columns(table)}
+    with engine.begin() as conn:
+        for name, ddl in columns:
+            if name not in existing:
+                conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}")
+
+
+def create_indexes(engine, *names):
+    with warnings.catch_warnings():
+        # checkfirst reflects each table's indexes; expression indexes are skipped with a warning.
+        warnings.filterwarnings("ignore", "Skipped unsupported reflection", SAWarning)
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name in names:
+                    index.create(bind=engine, checkfirst=True)
+
+
+def legacy_schema(engine, state):
+    for table, columns in LEGACY_COLUMNS.items():
+        add_columns(engine, table, columns)
+    db.metadata.create_all(bind=engine)
+
+
+def swap_filter_indexes(engine, state):
+    create_indexes(
+        engine,
+        "ix_modules_department",
+        "ix_modules_year",
+        "ix_swap_requests_status",
+        "ix_swap_requests_priority",
+        "ix_swap_requests_expires_at",
+        "ix_swap_requests_created_at",
+        "ix_swap_give_modules_module_id",
+        "ix_swap_want_modules_module_id",
+    )
+
+
+def swap_search_index(engine, state):
+    if inspect(engine).has_table("swap_search"):
+        state["search_backend"] = search_backend(engine)
+    else:
+        state["search_backend"] = install_search(engine)
+
+
+def swap_signatures(engine, state):
+    add_columns(engine, "swap_requests", [("signature", "VARCHAR(40)")])
+    create_indexes(engine, "ix_swap_requests_owner_signature")
+    with engine.begin() as conn:
+        giving, wanting = {}, {}
+        for table, target in ((swap_give_modules, giving), (swap_want_modules, wanting)):
+            for swap_id, module_id in conn.execute(select(table.c.swap_id, table.c.module_id)):
+                target.setdefault(swap_id, []).append(module_id)
+        rows = [
+            {"swap_id": swap_id, "signature": SwapRequest.make_signature(giving.get(swap_id, ()), wanting.get(swap_id, ()))}
+            for (swap_id,) in conn.execute(select(SwapRequest.id).filter(SwapRequest.signature.is_(None)))
+        ]
+        if rows:
+            conn.execute(
+                SwapRequest.__table__.update()
+                .where(SwapRequest.id == bindparam("swap_id"))
+                .values(signature=bindparam("signature")),
+                rows,
+            )
+
+
+def message_history_index(engine, state):
+    create_indexes(engine, "ix_messages_swap_created")
+
+
+def notification_outbox(engine, state):
+    db.metadata.create_all(bind=engine, tables=[db.metadata.tables["notification_outbox"]])
+
+
+def notification_inbox_index(engine, state):
+    create_indexes(engine, "ix_notifications_user_read_created")
+
+
+def swap_expiry_index(engine, state):
+    create_indexes(engine, "ix_swap_requests_status_expires")
+
+
+def swap_request_history(engine, state):
+    db.metadata.create_all(bind=engine, tables=[db.metadata.tables["swap_request_history"]])
+
+
+def rating_receiver_index(engine, state):
+    create_indexes(engine, "ix_ratings_receiver_id")
+
+
+def user_reputation(engine, state):
+    db.metadata.create_all(bind=engine, tables=[db.metadata.tables["user_reputation"]])
+    with engine.begin() as conn:
+        rebuild_reputation(conn)
+
+
+def document_review_index(engine, state):
+    create_indexes(engine, "ix_documents_status_created")
+
+
+def swap_matches(engine, state):
+    db.metadata.create_all(bind=engine, tables=[db.metadata.tables["swap_matches"]])
+
+
+def change_log(engine, state):
+    # swap_matches is backfilled here rather than in its own step: building the match index
+    # reads the change log.
+    db.metadata.create_all(bind=engine, tables=[db.metadata.tables["change_log"]])
+    rebuild_matches()
+    db.session.commit()
+
+
+def module_department_index(engine, state):
+    # Reflection does not report expression indexes, so checkfirst cannot be relied on.
+    index = next(i for i in db.metadata.tables["modules"].indexes if i.name == "ix_modules_department_lower")
+    with engine.begin() as conn:
+        conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+def match_sync(engine, state):
+    # swap_matches was kept current by the process that made each change until now, so the
+    # cursor starts at the end of the log.
+    db.metadata.create_all(bind=engine, tables=[db.metadata.tables["match_sync"]])
+    with engine.begin() as conn:
+        if conn.execute(select(MatchSync.id)).first() is None:
+            last = conn.execute(select(func.max(ChangeLog.id))).scalar() or 0
+            conn.execute(MatchSync.__table__.insert().values(id=1, log_id=last, version=0))
+
+
+# Steps must be idempotent: a fresh database gets every table from create_all
+# in the first step and then replays the rest.
+MIGRATIONS = [
+    (1, legacy_schema),
+    (2, swap_filter_indexes),
+    (3, swap_search_index),
+    (4, swap_signatures),
+    (5, message_history_index),
+    (6, notification_outbox),
+    (7, notification_inbox_index),
+    (8, swap_expiry_index),
+    (9, swap_request_history),
+    (10, rating_receiver_index),
+    (11, user_reputation),
+    (12, document_review_index),
+    (13, swap_matches),
+    (14, change_log),
+    (15, module_department_index),
+    (16, match_sync),
+]
+
+LATEST = MIGRATIONS[-1][0]
+
+
+def current_schema(engine):
+    try:
+        with engine.connect() as conn:
+            return conn.execute(select(schema_version.c.version, schema_version.c.search_backend)).first()
+    except DBAPIError:
+        return None
+
+
+def upgrade(engine):
+    # Returns (search_backend, created); created is True when the database was empty.
+    row = current_schema(engine)
+    if row is not None and row.version >= LATEST:
+        return row.search_backend, False
+    created = not inspect(engine).has_table("users")
+    version = row.version if row is not None else 0
+    state = {"search_backend": row.search_backend if row is not None else "like"}
+    for number, step in MIGRATIONS:
+        if number > version:
+            step(engine, state)
+    schema_metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(schema_version.delete())
+        conn.execute(schema_version.insert().values(version=LATEST, search_backend=state["search_backend"]))
+    return state["search_backend"], created
@@ -1,7 +1,8 @@
+import hashlib
 from datetime import datetime
 from typing import Optional
 from flask_login import UserMixin
-from sqlalchemy import Table, Column, Integer, String, DateTime, ForeignKey, Boolean, Text
+from sqlalchemy import Table, Column, Index, Integer, String, DateTime, ForeignKey, Boolean, Text, Float, func
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from .extensions import db
 
@@ -26,6 +27,7 @@ swap_give_modules = Table(
     db.metadata,
     Column("swap_id", ForeignKey("swap_requests.id"), primary_key=True),
     Column("module_id", ForeignKey("modules.id"), primary_key=True),
+    Index("ix_swap_give_modules_module_id", "module_id"),
 )
 
 
@@ -34,6 +36,7 @@ swap_want_modules = Table(
     db.metadata,
     Column("swap_id", ForeignKey("swap_requests.id"), primary_key=True),
     Column("module_id", ForeignKey("modules.id"), primary_key=True),
+    Index("ix_swap_want_modules_module_id", "module_id"),
 )
 
 
@@ -49,8 +52,8 @@ class User(db.Model, UserMixin):
     department: Mapped[str] = mapped_column(String(255), nullable=True)
     role: Mapped[str] = mapped_column(String(50), default="student")
     password_hash: Mapped[str] = mapped_column(String(255), nullable=True)
-    bio: Mapped[str] = mapped_column(Text, nullable=True)
-    interests: Mapped[str] = mapped_column(Text, nullable=True)
+    bio: Mapped[str] = mapped_column(Text, nullable=True, deferred=True, deferred_group="profile_text")
+    interests: Mapped[str] = mapped_column(Text, nullable=True, deferred=True, deferred_group="profile_text")
     email_notifications: Mapped[bool] = mapped_column(Boolean, default=False)
     verified_ac_email: Mapped[bool] = mapped_column(Boolean, default=False)
     student_id_status: Mapped[str] = mapped_column(String(50), default="None")
@@ -63,6 +66,7 @@ class User(db.Model, UserMixin):
     consent_data_usage: Mapped[bool] = mapped_column(Boolean, default=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     modules = relationship("Module", secondary=user_modules, back_populates="students")
+    reputation = relationship("UserReputation", uselist=False, viewonly=True)
     wishlist = relationship("Module", secondary=user_wishlist)
 
 
@@ -71,35 +75,104 @@ class Module(db.Model):
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     code: Mapped[str] = mapped_column(String(50), index=True, nullable=False)
     name: Mapped[str] = mapped_column(String(255), nullable=False)
-    department: Mapped[str] = mapped_column(String(255), nullable=True)
+    department: Mapped[str] = mapped_column(String(255), index=True, nullable=True)
     university: Mapped[str] = mapped_column(String(255), nullable=True)
-    year: Mapped[int] = mapped_column(Integer, nullable=True)
+    year: Mapped[int] = mapped_column(Integer, index=True, nullable=True)
     students = relationship("User", secondary=user_modules, back_populates="modules")
 
 
+# The admin department filter is case-insensitive, so it compares lower(department).
+Index("ix_modules_department_lower", func.lower(Module.department))
+
+
 class SwapRequest(db.Model):
     __tablename__ = "swap_requests"
+    __table_args__ = (
+        Index("ix_swap_requests_owner_signature", "user_id", "status", "signature"),
+        Index("ix_swap_requests_status_expires", "status", "expires_at"),
+    )
+    LIVE_STATUSES = ("Open", "Needs Info")
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
-    status: Mapped[str] = mapped_column(String(50), default="Open")
+    status: Mapped[str] = mapped_column(String(50), index=True, default="Open")
     notes: Mapped[str] = mapped_column(Text, nullable=True)
-    priority: Mapped[str] = mapped_column(String(20), nullable=True)
-    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    priority: Mapped[str] = mapped_column(String(20), index=True, nullable=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, index=True, nullable=True)
     timeslots: Mapped[str] = mapped_column(String(255), nullable=True)
     campus: Mapped[str] = mapped_column(String(255), nullable=True)
     module_group_pref: Mapped[str] = mapped_column(Text, nullable=True)
     visibility: Mapped[str] = mapped_column(String(20), default="public")
     alerts_email: Mapped[bool] = mapped_column(Boolean, default=False)
     auto_create_chat: Mapped[bool] = mapped_column(Boolean, default=False)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime, index=True, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    signature: Mapped[str] = mapped_column(String(40), nullable=True)
     user = relationship("User")
     giving = relationship("Module", secondary=swap_give_modules)
     wanting = relationship("Module", secondary=swap_want_modules)
 
+    @staticmethod
+    def make_signature(give_ids, want_ids):
+        raw = "g:%s|w:%s" % (",".join(map(str, sorted(set(give_ids)))), ",".join(map(str, sorted(set(want_ids)))))
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class SwapRequestHistory(db.Model):
+    # Approved and rejected requests are moved here when moderated.
+    __tablename__ = "swap_request_history"
+    __table_args__ = (Index("ix_swap_request_history_user_status", "user_id", "status"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    swap_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    status: Mapped[str] = mapped_column(String(50), nullable=False)
+    notes: Mapped[str] = mapped_column(Text, nullable=True)
+    priority: Mapped[str] = mapped_column(String(20), nullable=True)
+    give_module_ids: Mapped[str] = mapped_column(Text, nullable=True)
+    want_module_ids: Mapped[str] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    decided_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    decided_by: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=True)
+
+
+class SwapMatch(db.Model):
+    # Top counterparts of each live request, kept up to date as requests change. Plain integer
+    # columns: rows of removed requests are cleared by the match cache, not by the database.
+    __tablename__ = "swap_matches"
+    __table_args__ = (
+        Index("ix_swap_matches_swap_score", "swap_id", "score"),
+        Index("ix_swap_matches_match_id", "match_id"),
+    )
+    swap_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    match_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    score: Mapped[int] = mapped_column(Integer, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class ChangeLog(db.Model):
+    # Written in the same transaction as swap and rating changes so every process can bring
+    # its in-memory match index up to date, not only the one that committed. AUTOINCREMENT
+    # keeps ids increasing after old rows are pruned.
+    __tablename__ = "change_log"
+    __table_args__ = {"sqlite_autoincrement": True}
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    topic: Mapped[str] = mapped_column(String(20), nullable=False)
+    ref_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, index=True, default=datetime.utcnow)
+
+
+class MatchSync(db.Model):
+    # One row: how far into the change log swap_matches has been brought. Any process may apply
+    # the rows after log_id; bumping version claims a batch so no two processes apply the same one.
+    __tablename__ = "match_sync"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    log_id: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
 
 class Message(db.Model):
     __tablename__ = "messages"
+    __table_args__ = (Index("ix_messages_swap_created", "swap_id", "created_at"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     swap_id: Mapped[int] = mapped_column(ForeignKey("swap_requests.id"), nullable=False)
     sender_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
@@ -110,6 +183,7 @@ class Message(db.Model):
 
 class Notification(db.Model):
     __tablename__ = "notifications"
+    __table_args__ = (Index("ix_notifications_user_read_created", "user_id", "read", "created_at"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     type: Mapped[str] = mapped_column(String(50), nullable=False)
@@ -118,14 +192,31 @@ class Notification(db.Model):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 
+class NotificationOutbox(db.Model):
+    __tablename__ = "notification_outbox"
+    __table_args__ = (Index("ix_notification_outbox_status_due", "status", "next_attempt_at"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    notification_id: Mapped[int] = mapped_column(ForeignKey("notifications.id"), nullable=False)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    status: Mapped[str] = mapped_column(String(20), default="pending")
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    claimed_by: Mapped[str] = mapped_column(String(36), nullable=True)
+    last_error: Mapped[str] = mapped_column(Text, nullable=True)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    sent_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+
 class Document(db.Model):
     __tablename__ = "documents"
+    __table_args__ = (Index("ix_documents_status_created", "status", "created_at"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     type: Mapped[str] = mapped_column(String(50), nullable=False)
     path: Mapped[str] = mapped_column(String(255), nullable=False)
     status: Mapped[str] = mapped_column(String(50), default="Pending")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    user = relationship("User")
 
 
 class Rating(db.Model):
@@ -133,7 +224,17 @@ class Rating(db.Model):
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     swap_id: Mapped[int] = mapped_column(ForeignKey("swap_requests.id"), nullable=False)
     rater_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
-    receiver_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    receiver_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True, nullable=False)
     thumbs_up: Mapped[bool] = mapped_column(Boolean, default=True)
     comment: Mapped[str] = mapped_column(Text, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class UserReputation(db.Model):
+    # Running totals over Rating, updated on insert; score is the Wilson lower bound.
+    __tablename__ = "user_reputation"
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    positive: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    negative: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    score: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
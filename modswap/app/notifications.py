@@ -0,0 +1,302 @@
+import json
+import threading
+import uuid
+from datetime import datetime, timedelta
+import click
+from flask import current_app, has_app_context
+from flask_mail import Message as MailMessage
+from sqlalchemy import func
+from .cache import app_cache, get_redis
+from .events import mark_unread_changed, notifications_queued, unread_changed
+from .extensions import db, mail
+from .models import Notification, NotificationOutbox, User
+from .queries import before_cursor, decode_cursor, encode_cursor
+
+
+def notify(type, recipients, email_user_ids=()):
+    # recipients maps user id -> payload. Writes one in-app Notification per user and queues
+    # email delivery for users in email_user_ids or with email_notifications switched on.
+    # Nothing is sent inline; the caller commits.
+    if not recipients:
+        return []
+    user_ids = list(recipients)
+    now = datetime.utcnow()
+    ids = db.session.execute(
+        db.insert(Notification).returning(Notification.id, Notification.user_id),
+        [{"user_id": uid, "type": type, "payload": json.dumps(payload), "read": False, "created_at": now}
+         for uid, payload in recipients.items()],
+    ).all()
+    mark_unread_changed(db.session, {uid: 1 for uid in user_ids})
+    wants_email = set(email_user_ids) | set(db.session.execute(
+        db.select(User.id).filter(User.id.in_(user_ids), User.email_notifications.is_(True))
+    ).scalars())
+    outbox = [
+        {"notification_id": nid, "user_id": uid, "status": "pending", "attempts": 0, "next_attempt_at": now, "created_at": now}
+        for nid, uid in ids if uid in wants_email
+    ]
+    if outbox:
+        db.session.execute(db.insert(NotificationOutbox), outbox)
+        db.session.info["notifications_queued"] = True
+    return [nid for nid, _ in ids]
+
+
+def unread_key(user_id):
+    return f"modswap:unread:{user_id}"
+
+
+def unread_count(user_id):
+    # Cached per user and adjusted on commit, so the badge costs no query on most pages.
+    client = get_redis()
+    if client is not None:
+        cached = client.get(unread_key(user_id))
+    else:
+        cached = app_cache("unread", 4096).get(user_id)
+    if cached is not None:
+        return int(cached)
+    count = db.session.execute(
+        db.select(func.count()).select_from(Notification)
+        .filter(Notification.user_id == user_id, Notification.read.is_(False))
+    ).scalar()
+    if client is not None:
+        client.set(unread_key(user_id), count, ex=current_app.config["UNREAD_TTL"])
+    else:
+        app_cache("unread", 4096).set(user_id, count)
+    return count
+
+
+def inbox_page(user_id, before=None, unread_only=False, limit=None, type=None):
+    # Served by ix_notifications_user_read_created: (user_id, read) equality, then created_at.
+    limit = min(limit or current_app.config["INBOX_PAGE_SIZE"], 100)
+    query = db.select(Notification).filter(Notification.user_id == user_id)
+    if unread_only:
+        query = query.filter(Notification.read.is_(False))
+    if type:
+        query = query.filter(Notification.type == type)
+    cursor = decode_cursor(before)
+    if cursor:
+        query = query.filter(before_cursor(Notification.created_at, Notification.id, cursor))
+    rows = db.session.execute(
+        query.order_by(Notification.created_at.desc(), Notification.id.desc()).limit(limit + 1)
+    ).scalars().all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id) if more else None
+
+
+def mark_read(user_id, ids=None):
+    query = db.update(Notification).where(Notification.user_id == user_id, Notification.read.is_(False))
+    if ids is not None:
+        query = query.where(Notification.id.in_(ids))
+    updated = db.session.execute(query.values(read=True)).rowcount
+    if updated:
+        mark_unread_changed(db.session, {user_id: -updated})
+    return updated
+
+
+@unread_changed.connect
+def on_unread_changed(sender, deltas, users):
+    if not has_app_context():
+        return
+    client = get_redis()
+    cache = app_cache("unread", 4096)
+    for user_id in users:
+        if client is not None:
+            client.delete(unread_key(user_id))
+        else:
+            cache.pop(user_id)
+    for user_id, delta in deltas.items():
+        if user_id in users or not delta:
+            continue
+        if client is not None:
+            if client.exists(unread_key(user_id)):
+                client.incrby(unread_key(user_id), delta)
+        else:
+            cached = cache.get(user_id)
+            if cached is not None:
+                cache.set(user_id, max(cached + delta, 0))
+
+
+def describe(notification):
+    try:
+        payload = json.loads(notification.payload or "{}")
+    except ValueError:
+        payload = {}
+    if notification.type == "match":
+        return f"New match for your swap request #{payload.get('swap_id')} (score {payload.get('score')})"
+    if notification.type == "status":
+        ids = payload.get("swap_ids") or [payload.get("swap_id")]
+        return f"Your swap request(s) {', '.join(f'#{i}' for i in ids)} now {payload.get('status')}"
+    if notification.type == "verification":
+        return f"Your verification document(s) were {(payload.get('status') or 'reviewed').lower()}"
+    if notification.type == "chat":
+        return f"New message about your swap request #{payload.get('swap_id')}"
+    if notification.type == "deadline":
+        return f"Reminder: {payload.get('note') or 'deadline'} on {payload.get('date')}"
+    return payload.get("message") or notification.type
+
+
+class ResendConnection:
+    def __init__(self, api_key, sender):
+        import http.client
+        self.api_key = api_key
+        self.sender = sender
+        self.conn = http.client.HTTPSConnection("api.resend.com", timeout=10)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.conn.close()
+
+    def send(self, message):
+        body = json.dumps({"from": self.sender, "to": message.recipients, "subject": message.subject, "text": message.body})
+        self.conn.request("POST", "/emails", body=body, headers={
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        })
+        response = self.conn.getresponse()
+        response.read()
+        if response.status >= 300:
+            raise RuntimeError(f"Resend returned {response.status}")
+
+
+def open_connection():
+    # One connection is reused for a whole batch of digests.
+    api_key = current_app.config.get("RESEND_API_KEY")
+    if api_key:
+        return ResendConnection(api_key, current_app.config["MAIL_DEFAULT_SENDER"])
+    return mail.connect()
+
+
+def claim_batch(limit):
+    # Claimed rows get a lease; rows left in "sending" by a crashed worker become due again.
+    token = str(uuid.uuid4())
+    now = datetime.utcnow()
+    due = db.select(NotificationOutbox.id).filter(
+        NotificationOutbox.status.in_(("pending", "sending")), NotificationOutbox.next_attempt_at <= now
+    ).order_by(NotificationOutbox.next_attempt_at).limit(limit)
+    ids = db.session.execute(due).scalars().all()
+    if not ids:
+        return []
+    db.session.execute(
+        db.update(NotificationOutbox)
+        .where(
+            NotificationOutbox.id.in_(ids),
+            NotificationOutbox.status.in_(("pending", "sending")),
+            NotificationOutbox.next_attempt_at <= now,
+        )
+        .values(
+            status="sending",
+            claimed_by=token,
+            next_attempt_at=now + timedelta(seconds=current_app.config["NOTIFY_CLAIM_TIMEOUT"]),
+        )
+    )
+    db.session.commit()
+    return db.session.execute(
+        db.select(NotificationOutbox, Notification, User)
+        .join(Notification, Notification.id == NotificationOutbox.notification_id)
+        .join(User, User.id == NotificationOutbox.user_id)
+        .filter(NotificationOutbox.claimed_by == token)
+        .order_by(NotificationOutbox.user_id, Notification.created_at)
+    ).all()
+
+
+def deliver_pending(limit=500):
+    rows = claim_batch(limit)
+    if not rows:
+        return 0
+    digests = {}
+    for entry, notification, user in rows:
+        digests.setdefault(user.id, (user, []))[1].append((entry, notification))
+    now = datetime.utcnow()
+    sent = 0
+    try:
+        with open_connection() as conn:
+            for user, items in list(digests.values()):
+                lines = [f"- {describe(n)}" for _, n in items]
+                message = MailMessage(
+                    subject=f"ModSwap: {len(items)} new notification{'s' if len(items) != 1 else ''}",
+                    recipients=[user.email],
+                    body="\n".join(["Here is what happened since your last update:", ""] + lines),
+                    sender=current_app.config["MAIL_DEFAULT_SENDER"],
+                )
+                try:
+                    conn.send(message)
+                except Exception as exc:
+                    current_app.logger.warning("Digest to user %s failed: %s", user.id, exc)
+                    retry_later(items, exc, now)
+                else:
+                    sent += 1
+                    for entry, _ in items:
+                        entry.status = "sent"
+                        entry.sent_at = now
+                del digests[user.id]
+    except Exception as exc:
+        current_app.logger.warning("Mail connection failed: %s", exc)
+        for _, items in digests.values():
+            retry_later(items, exc, now)
+    db.session.commit()
+    return sent
+
+
+def retry_later(items, exc, now):
+    max_attempts = current_app.config["NOTIFY_MAX_ATTEMPTS"]
+    for entry, _ in items:
+        entry.attempts += 1
+        entry.last_error = str(exc)[:500]
+        entry.status = "failed" if entry.attempts >= max_attempts else "pending"
+        entry.next_attempt_at = now + timedelta(seconds=30 * 2 ** entry.attempts)
+        entry.claimed_by = None
+
+
+class NotificationWorker:
+    def __init__(self, app):
+        self.app = app
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="notification-worker", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+
+    def run(self):
+        interval = self.app.config["NOTIFY_POLL_INTERVAL"]
+        while not self.stopped.is_set():
+            self.wake.wait(interval)
+            self.wake.clear()
+            with self.app.app_context():
+                try:
+                    while deliver_pending():
+                        pass
+                except Exception:
+                    self.app.logger.exception("Notification delivery failed")
+                    db.session.rollback()
+
+
+def init_notifications(app):
+    if app.config["NOTIFY_WORKER"]:
+        app.extensions["notification_worker"] = NotificationWorker(app)
+        app.extensions["notification_worker"].start()
+
+    @app.cli.command("send-notifications")
+    def send_notifications():
+        total = 0
+        while sent := deliver_pending():
+            total += sent
+        click.echo(f"Sent {total} digest(s)")
+
+    @app.cli.command("notify-worker")
+    def notify_worker():
+        NotificationWorker(app).run()
+
+
+@notifications_queued.connect
+def on_notifications_queued(sender):
+    if has_app_context() and "notification_worker" in current_app.extensions:
+        current_app.extensions["notification_worker"].wake.set()
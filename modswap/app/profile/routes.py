@@ -1,30 +1,43 @@
 import os
-import json
-from flask import Blueprint, render_template, request, redirect, url_for, current_app, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, current_app, flash, jsonify, session, abort, send_from_directory
 from flask_login import login_required, current_user
-from werkzeug.utils import secure_filename
+from sqlalchemy.orm import undefer_group
+from ..catalogue import get_catalogue
 from ..extensions import db
-from ..models import User, Module, SwapRequest, Document, Notification
+from ..notifications import describe, inbox_page, notify
+from ..models import User, Module, SwapRequest, Document
+from ..queries import before_cursor, decode_cursor, encode_cursor, select_swaps
+from ..querybudget import query_budget
+from ..stats import user_stats
+from ..storage import get_storage
+from ..uploads import DOCUMENT_EXTENSIONS, UploadError, format_size, remove_upload, schedule_avatar_variants, store_upload
 
 profile_bp = Blueprint("profile", __name__, template_folder="templates")
 
-ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
-
-def allowed_file(filename):
-    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
-
 @profile_bp.get("/")
 @login_required
+@query_budget(11)
 def view_profile():
+    query = select_swaps().filter(SwapRequest.user_id == current_user.id)
+    cursor = decode_cursor(request.args.get("before"))
+    if cursor:
+        query = query.filter(before_cursor(SwapRequest.created_at, SwapRequest.id, cursor))
+    limit = current_app.config["PROFILE_PAGE_SIZE"]
     swaps = db.session.execute(
-        db.select(SwapRequest).filter_by(user_id=current_user.id).order_by(SwapRequest.created_at.desc())
+        query.order_by(SwapRequest.created_at.desc(), SwapRequest.id.desc()).limit(limit + 1)
     ).scalars().all()
-    stats = {
-        "requests": len(swaps),
-        "approved": sum(1 for s in swaps if s.status == "Approved"),
-        "rejected": sum(1 for s in swaps if s.status == "Rejected"),
-    }
-    return render_template("profile/view.html", user=current_user, swaps=swaps, stats=stats)
+    next_url = None
+    if len(swaps) > limit:
+        swaps = swaps[:limit]
+        next_url = url_for("profile.view_profile", before=encode_cursor(swaps[-1].created_at, swaps[-1].id))
+    reminders, _ = inbox_page(current_user.id, unread_only=True, limit=5, type="deadline")
+    user = db.session.execute(
+        db.select(User).options(undefer_group("profile_text")).filter(User.id == current_user.id)
+    ).scalar_one()
+    return render_template(
+        "profile/view.html", user=user, swaps=swaps, stats=user_stats(current_user.id),
+        catalogue=get_catalogue(), reminders=reminders, describe=describe, next_url=next_url,
+    )
 
 @profile_bp.post("/")
 @login_required
@@ -45,36 +58,42 @@ def update_profile():
     u.consent_data_usage = request.form.get("consent_data_usage") == "on"
     file = request.files.get("avatar")
     if file and file.filename != "":
-        if not allowed_file(file.filename):
-            flash("Invalid image type")
+        try:
+            path = store_upload(file.stream, "avatars", current_app.config["AVATAR_MAX_BYTES"])
+        except UploadError as exc:
+            flash(str(exc))
             return redirect(url_for("profile.view_profile"))
-        uploads_dir = os.path.join(current_app.root_path, "static", "uploads")
-        os.makedirs(uploads_dir, exist_ok=True)
-        ext = file.filename.rsplit(".", 1)[1].lower()
-        filename = f"user_{current_user.id}.{ext}"
-        filepath = os.path.join(uploads_dir, secure_filename(filename))
-        file.save(filepath)
-        u.profile_image = f"uploads/{filename}"
+        u.profile_image = path
+        schedule_avatar_variants(path)
     db.session.commit()
     flash("Profile updated")
     return redirect(url_for("profile.view_profile"))
 
+
 @profile_bp.post("/avatar/delete")
 @login_required
 def delete_avatar():
     u = db.session.get(User, current_user.id)
     if u.profile_image:
-        path = os.path.join(current_app.root_path, "static", u.profile_image)
-        if os.path.exists(path):
-            try:
-                os.remove(path)
-            except Exception:
-                pass
+        path = u.profile_image
         u.profile_image = None
         db.session.commit()
+        # Content-addressed files may be shared by several users.
+        shared = db.session.execute(db.select(User.id).filter_by(profile_image=path).limit(1)).first()
+        if not shared:
+            remove_upload(path)
     flash("Avatar deleted")
     return redirect(url_for("profile.view_profile"))
 
+
+@profile_bp.app_errorhandler(413)
+def upload_too_large(error):
+    if request.blueprint != "profile":
+        return error
+    flash(f"Uploads are limited to {format_size(current_app.config['MAX_CONTENT_LENGTH'])}")
+    return redirect(url_for("profile.view_profile"))
+
+
 @profile_bp.post("/wishlist/add")
 @login_required
 def wishlist_add():
@@ -129,13 +148,16 @@ def upload_document():
     if not file or file.filename == "":
         flash("Select a document to upload")
         return redirect(url_for("profile.view_profile"))
-    uploads_dir = os.path.join(current_app.root_path, "static", "docs")
-    os.makedirs(uploads_dir, exist_ok=True)
-    ext = file.filename.rsplit(".", 1)[1].lower()
-    filename = f"doc_{current_user.id}_{dtype}.{ext}"
-    filepath = os.path.join(uploads_dir, secure_filename(filename))
-    file.save(filepath)
-    doc = Document(user_id=current_user.id, type=dtype, path=f"docs/{filename}", status="Pending")
+    ext = file.filename.rsplit(".", 1)[-1].lower()
+    if ext not in DOCUMENT_EXTENSIONS:
+        flash("Documents must be PDF or image files")
+        return redirect(url_for("profile.view_profile"))
+    try:
+        path = store_upload(file.stream, "documents", current_app.config["DOCUMENT_MAX_BYTES"], ext=ext)
+    except UploadError as exc:
+        flash(str(exc))
+        return redirect(url_for("profile.view_profile"))
+    doc = Document(user_id=current_user.id, type=dtype, path=path, status="Pending")
     db.session.add(doc)
     u = db.session.get(User, current_user.id)
     u.student_id_status = "Pending"
@@ -143,6 +165,20 @@ def upload_document():
     flash("Document uploaded")
     return redirect(url_for("profile.view_profile"))
 
+@profile_bp.get("/documents/<int:doc_id>")
+@login_required
+def download_document(doc_id: int):
+    doc = db.session.get(Document, doc_id)
+    if doc is None or (doc.user_id != current_user.id and session.get("role") != "teacher"):
+        abort(404)
+    download_name = f"{doc.type}.{doc.path.rsplit('.', 1)[-1]}"
+    if not doc.path.startswith("documents/"):
+        # Saved under static/ before documents moved to the storage backend.
+        return send_from_directory(
+            os.path.join(current_app.root_path, "static"), doc.path, as_attachment=True, download_name=download_name
+        )
+    return get_storage().download_response(doc.path, download_name=download_name)
+
 @profile_bp.post("/reminders/add")
 @login_required
 def add_reminder():
@@ -152,8 +188,7 @@ def add_reminder():
         "date": request.form.get("deadline_date") or "",
         "note": request.form.get("deadline_note") or "",
     }
-    n = Notification(user_id=current_user.id, type="deadline", payload=json.dumps(payload))
-    db.session.add(n)
+    notify("deadline", {current_user.id: payload})
     db.session.commit()
     flash("Reminder added")
     return redirect(url_for("profile.view_profile"))
@@ -0,0 +1,41 @@
+from datetime import datetime
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import joinedload, selectinload
+from .extensions import db
+from .models import SwapRequest, User
+
+
+def swap_list_options():
+    return (
+        selectinload(SwapRequest.giving),
+        selectinload(SwapRequest.wanting),
+        joinedload(SwapRequest.user).joinedload(User.reputation),
+    )
+
+
+def select_swaps():
+    return db.select(SwapRequest).options(*swap_list_options())
+
+
+def encode_cursor(key, row_id):
+    return f"{key.isoformat() if isinstance(key, datetime) else repr(key)}_{row_id}"
+
+
+def decode_cursor(value, parse=datetime.fromisoformat):
+    if not value:
+        return None
+    try:
+        key, row_id = value.rsplit("_", 1)
+        return parse(key), int(row_id)
+    except ValueError:
+        return None
+
+
+def before_cursor(key_col, id_col, cursor):
+    # Rows that sort after the cursor under ORDER BY key DESC, id DESC.
+    return or_(key_col < cursor[0], and_(key_col == cursor[0], id_col < cursor[1]))
+
+
+def after_cursor(key_col, id_col, cursor):
+    # Rows that sort after the cursor under ORDER BY key ASC, id ASC.
+    return or_(key_col > cursor[0], and_(key_col == cursor[0], id_col > cursor[1]))
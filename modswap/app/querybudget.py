@@ -0,0 +1,51 @@
+from contextlib import contextmanager
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+def query_budget(limit):
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.sql_statements = g.get("sql_statements", 0) + 1
+
+
+@contextmanager
+def unbudgeted():
+    # Statements issued inside the block do not count against the view's budget: background
+    # work a view runs inline only because no worker is configured.
+    used = g.get("sql_statements", 0) if has_request_context() else None
+    try:
+        yield
+    finally:
+        if used is not None:
+            g.sql_statements = used
+
+
+def init_query_budget(app):
+    if not app.config.get("QUERY_BUDGET_ENFORCE"):
+        return
+
+    @app.before_request
+    def reset_query_count():
+        g.sql_statements = 0
+
+    @app.after_request
+    def enforce_query_budget(response):
+        view = app.view_functions.get(request.endpoint)
+        limit = getattr(view, "query_budget", None)
+        used = g.get("sql_statements", 0)
+        if limit is not None and used > limit:
+            raise QueryBudgetExceeded(f"{request.endpoint} issued {used} SQL statements (budget {limit})")
+        return response
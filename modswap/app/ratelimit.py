@@ -0,0 +1,44 @@
+import math
+import threading
+import time
+from flask import current_app
+from .cache import app_cache, get_redis
+
+# KEYS[1] = bucket; ARGV = capacity, refill per second, now. Returns 1 when a token was taken.
+TAKE_TOKEN = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local tokens = tonumber(redis.call('HGET', KEYS[1], 't') or capacity)
+local updated = tonumber(redis.call('HGET', KEYS[1], 'u') or now)
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'u', tostring(now))
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[4]))
+return allowed
+"""
+
+_lock = threading.Lock()
+
+
+def take_token(key, capacity, rate):
+    # Token bucket holding up to capacity tokens and refilling at rate per second.
+    # Returns False when the bucket is empty, without touching the database.
+    now = time.time()
+    client = get_redis()
+    if client is not None:
+        if "rate_limit_script" not in current_app.extensions:
+            current_app.extensions["rate_limit_script"] = client.register_script(TAKE_TOKEN)
+        ttl = math.ceil(capacity / rate) + 1
+        return bool(current_app.extensions["rate_limit_script"](keys=[f"modswap:rate:{key}"], args=[capacity, rate, now, ttl]))
+    buckets = app_cache("rate_limits", current_app.config["RATE_LIMIT_KEYS"], ttl=0)
+    with _lock:
+        tokens, updated = buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+        allowed = tokens >= 1
+        buckets.set(key, (tokens - 1 if allowed else tokens, now))
+    return allowed
@@ -0,0 +1,64 @@
+import math
+from datetime import datetime
+from sqlalchemy import case, event, func
+from sqlalchemy.exc import IntegrityError
+from .extensions import db
+from .models import Rating, UserReputation
+
+
+def wilson_lower_bound(positive, negative, z=1.96):
+    n = positive + negative
+    if n == 0:
+        return 0.0
+    phat = positive / n
+    return (phat + z * z / (2 * n) - z * math.sqrt((phat * (1 - phat) + z * z / (4 * n)) / n)) / (1 + z * z / n)
+
+
+def record_rating(connection, user_id, thumbs_up):
+    # Adds one rating to the receiver's running totals; never rescans Rating.
+    table = UserReputation.__table__
+    up, down = (1, 0) if thumbs_up else (0, 1)
+    now = datetime.utcnow()
+    row = connection.execute(
+        table.update()
+        .where(table.c.user_id == user_id)
+        .values(positive=table.c.positive + up, negative=table.c.negative + down, updated_at=now)
+        .returning(table.c.positive, table.c.negative)
+    ).first()
+    if row is None:
+        try:
+            with connection.begin_nested():
+                connection.execute(table.insert().values(
+                    user_id=user_id, positive=up, negative=down, score=wilson_lower_bound(up, down), updated_at=now
+                ))
+        except IntegrityError:
+            # A concurrent first rating created the row since the UPDATE; add to it instead.
+            record_rating(connection, user_id, thumbs_up)
+    else:
+        connection.execute(
+            table.update().where(table.c.user_id == user_id).values(score=wilson_lower_bound(*row))
+        )
+
+
+def rebuild_reputation(connection):
+    # Full recount, used once to backfill the summary table.
+    table = UserReputation.__table__
+    totals = connection.execute(
+        db.select(
+            Rating.receiver_id,
+            func.sum(case((Rating.thumbs_up.is_(True), 1), else_=0)),
+            func.sum(case((Rating.thumbs_up.is_(True), 0), else_=1)),
+        ).group_by(Rating.receiver_id)
+    ).all()
+    connection.execute(table.delete())
+    if totals:
+        now = datetime.utcnow()
+        connection.execute(table.insert(), [
+            {"user_id": uid, "positive": up, "negative": down, "score": wilson_lower_bound(up, down), "updated_at": now}
+            for uid, up, down in totals
+        ])
+
+
+@event.listens_for(Rating, "after_insert")
+def rating_inserted(mapper, connection, target):
+    record_rating(connection, target.receiver_id, bool(target.thumbs_up))
@@ -0,0 +1,190 @@
+import re
+from flask import current_app
+from sqlalchemy import Float, Integer, func, literal, or_, text, union, union_all
+from sqlalchemy.exc import OperationalError
+from .extensions import db
+from .models import Module, SwapRequest, swap_give_modules, swap_want_modules
+
+
+SQLITE_DOCUMENT = """
+INSERT INTO swap_search (rowid, codes, names, notes)
+SELECT s.id,
+       coalesce((SELECT group_concat(m.code, ' ') FROM modules m WHERE m.id IN (
+           SELECT module_id FROM swap_give_modules WHERE swap_id = s.id
+           UNION SELECT module_id FROM swap_want_modules WHERE swap_id = s.id)), ''),
+       coalesce((SELECT group_concat(m.name || ' ' || coalesce(m.department, ''), ' ') FROM modules m WHERE m.id IN (
+           SELECT module_id FROM swap_give_modules WHERE swap_id = s.id
+           UNION SELECT module_id FROM swap_want_modules WHERE swap_id = s.id)), ''),
+       coalesce(s.notes, '')
+FROM swap_requests s WHERE {cond};
+"""
+
+
+def sqlite_refresh(cond):
+    return f"DELETE FROM swap_search WHERE rowid IN (SELECT s.id FROM swap_requests s WHERE {cond});" + SQLITE_DOCUMENT.format(cond=cond)
+
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE swap_search USING fts5(codes, names, notes, tokenize='unicode61', prefix='2 3 4')",
+    f"CREATE TRIGGER IF NOT EXISTS swap_search_ai AFTER INSERT ON swap_requests BEGIN {sqlite_refresh('s.id = NEW.id')} END",
+    f"CREATE TRIGGER IF NOT EXISTS swap_search_au AFTER UPDATE OF notes ON swap_requests BEGIN {sqlite_refresh('s.id = NEW.id')} END",
+    "CREATE TRIGGER IF NOT EXISTS swap_search_ad AFTER DELETE ON swap_requests BEGIN DELETE FROM swap_search WHERE rowid = OLD.id; END",
+    f"CREATE TRIGGER IF NOT EXISTS swap_search_gi AFTER INSERT ON swap_give_modules BEGIN {sqlite_refresh('s.id = NEW.swap_id')} END",
+    f"CREATE TRIGGER IF NOT EXISTS swap_search_gd AFTER DELETE ON swap_give_modules BEGIN {sqlite_refresh('s.id = OLD.swap_id')} END",
+    f"CREATE TRIGGER IF NOT EXISTS swap_search_wi AFTER INSERT ON swap_want_modules BEGIN {sqlite_refresh('s.id = NEW.swap_id')} END",
+    f"CREATE TRIGGER IF NOT EXISTS swap_search_wd AFTER DELETE ON swap_want_modules BEGIN {sqlite_refresh('s.id = OLD.swap_id')} END",
+    "CREATE TRIGGER IF NOT EXISTS swap_search_mu AFTER UPDATE OF code, name, department ON modules BEGIN "
+    + sqlite_refresh("s.id IN (SELECT swap_id FROM swap_give_modules WHERE module_id = NEW.id "
+                     "UNION SELECT swap_id FROM swap_want_modules WHERE module_id = NEW.id)")
+    + " END",
+    SQLITE_DOCUMENT.format(cond="1 = 1"),
+]
+
+
+POSTGRES_DDL = [
+    "CREATE TABLE swap_search (swap_id INTEGER PRIMARY KEY, document TSVECTOR NOT NULL)",
+    "CREATE INDEX ix_swap_search_document ON swap_search USING GIN (document)",
+    """CREATE OR REPLACE FUNCTION swap_search_refresh(target integer) RETURNS void AS $$
+BEGIN
+  DELETE FROM swap_search WHERE swap_id = target;
+  INSERT INTO swap_search (swap_id, document)
+  SELECT s.id,
+         setweight(to_tsvector('simple', coalesce(string_agg(m.code, ' '), '')), 'A')
+         || setweight(to_tsvector('simple', coalesce(string_agg(m.name || ' ' || coalesce(m.department, ''), ' '), '')), 'B')
+         || setweight(to_tsvector('simple', coalesce(s.notes, '')), 'C')
+  FROM swap_requests s
+  LEFT JOIN (SELECT swap_id, module_id FROM swap_give_modules
+             UNION SELECT swap_id, module_id FROM swap_want_modules) sm ON sm.swap_id = s.id
+  LEFT JOIN modules m ON m.id = sm.module_id
+  WHERE s.id = target
+  GROUP BY s.id, s.notes;
+END;
+$$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE FUNCTION swap_search_swap_trigger() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    DELETE FROM swap_search WHERE swap_id = OLD.id;
+    RETURN OLD;
+  END IF;
+  PERFORM swap_search_refresh(NEW.id);
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE FUNCTION swap_search_link_trigger() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    PERFORM swap_search_refresh(OLD.swap_id);
+    RETURN OLD;
+  END IF;
+  PERFORM swap_search_refresh(NEW.swap_id);
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE FUNCTION swap_search_module_trigger() RETURNS trigger AS $$
+DECLARE
+  target integer;
+BEGIN
+  FOR target IN SELECT swap_id FROM swap_give_modules WHERE module_id = NEW.id
+                UNION SELECT swap_id FROM swap_want_modules WHERE module_id = NEW.id LOOP
+    PERFORM swap_search_refresh(target);
+  END LOOP;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql""",
+    "CREATE TRIGGER swap_search_swap AFTER INSERT OR DELETE OR UPDATE OF notes ON swap_requests "
+    "FOR EACH ROW EXECUTE FUNCTION swap_search_swap_trigger()",
+    "CREATE TRIGGER swap_search_give AFTER INSERT OR DELETE ON swap_give_modules "
+    "FOR EACH ROW EXECUTE FUNCTION swap_search_link_trigger()",
+    "CREATE TRIGGER swap_search_want AFTER INSERT OR DELETE ON swap_want_modules "
+    "FOR EACH ROW EXECUTE FUNCTION swap_search_link_trigger()",
+    "CREATE TRIGGER swap_search_module AFTER UPDATE OF code, name, department ON modules "
+    "FOR EACH ROW EXECUTE FUNCTION swap_search_module_trigger()",
+    "SELECT swap_search_refresh(id) FROM swap_requests",
+]
+
+
+def search_backend(engine):
+    return {"sqlite": "fts5", "postgresql": "tsvector"}.get(engine.dialect.name, "like")
+
+
+def install_search(engine):
+    ddl = {"sqlite": SQLITE_DDL, "postgresql": POSTGRES_DDL}.get(engine.dialect.name)
+    if ddl is None:
+        return "like"
+    try:
+        with engine.begin() as conn:
+            for statement in ddl:
+                conn.exec_driver_sql(statement)
+    except OperationalError:
+        # SQLite builds without FTS5 fall back to LIKE matching.
+        return "like"
+    return search_backend(engine)
+
+
+def any_module(*criteria):
+    clauses = []
+    for table in (swap_give_modules, swap_want_modules):
+        clauses.append(
+            db.select(table.c.swap_id)
+            .join(Module, Module.id == table.c.module_id)
+            .filter(table.c.swap_id == SwapRequest.id, *criteria)
+            .exists()
+        )
+    return or_(*clauses)
+
+
+def search_terms(query):
+    return re.findall(r"\w+", (query or "").lower())
+
+
+def module_substring_swaps(needle):
+    # Swaps with a module whose code, name or department contains needle anywhere, as the old
+    # LIKE search matched. Scans only the modules table, then follows the module_id indexes.
+    module_ids = db.select(Module.id).filter(or_(
+        func.lower(Module.code).contains(needle, autoescape=True),
+        func.lower(Module.name).contains(needle, autoescape=True),
+        func.lower(Module.department).contains(needle, autoescape=True),
+    ))
+    return union(
+        db.select(swap_give_modules.c.swap_id).filter(swap_give_modules.c.module_id.in_(module_ids)),
+        db.select(swap_want_modules.c.swap_id).filter(swap_want_modules.c.module_id.in_(module_ids)),
+    ).subquery()
+
+
+def ranked_swaps(query, notes=True):
+    # Word-prefix matches from the full-text index rank first; mid-word matches in module
+    # codes, names and departments follow with the lowest rank. Notes, searched only when
+    # notes is true, are matched by word prefix alone.
+    terms = search_terms(query)
+    if not terms:
+        return None
+    needle = " ".join(terms)
+    backend = current_app.extensions.get("search_backend", "like")
+    if backend == "fts5":
+        match = " ".join(f'"{t}"*' for t in terms)
+        stmt = text(
+            "SELECT rowid AS swap_id, bm25(swap_search, 10.0, 5.0, 1.0) AS rank "
+            "FROM swap_search WHERE swap_search MATCH :match"
+        ).bindparams(match=match if notes else f"{{codes names}} : ({match})")
+    elif backend == "tsvector":
+        weights = "" if notes else "AB"
+        stmt = text(
+            "SELECT swap_id, -ts_rank(document, q) AS rank "
+            "FROM swap_search, to_tsquery('simple', :match) q WHERE document @@ q"
+        ).bindparams(match=" & ".join(f"{t}:*{weights}" for t in terms))
+    else:
+        clause = any_module(or_(
+            func.lower(Module.code).contains(needle, autoescape=True),
+            func.lower(Module.name).contains(needle, autoescape=True),
+            func.lower(Module.department).contains(needle, autoescape=True),
+        ))
+        if notes:
+            clause = or_(clause, func.lower(SwapRequest.notes).contains(needle, autoescape=True))
+        return db.select(SwapRequest.id.label("swap_id"), literal(0.0).label("rank")).filter(clause).subquery()
+    indexed = stmt.columns(swap_id=Integer, rank=Float).subquery()
+    substring = module_substring_swaps(needle)
+    combined = union_all(
+        db.select(indexed.c.swap_id, indexed.c.rank),
+        db.select(substring.c.swap_id, literal(0.0).label("rank")),
+    ).subquery()
+    return db.select(combined.c.swap_id, func.min(combined.c.rank).label("rank")).group_by(combined.c.swap_id).subquery()
@@ -0,0 +1,54 @@
+from .extensions import db, bcrypt
+from .models import User
+
+
+def seed_accounts():
+    admin_email = "vikramjeet.-3@mail.bcu.ac.uk"
+    admin = db.session.execute(db.select(User).filter_by(email=admin_email)).scalar_one_or_none()
+    if not admin:
+        domain = admin_email.split("@")[1]
+        uni = domain.replace(".ac.uk", "")
+        pw = bcrypt.generate_password_hash("Vansh@123").decode("utf-8")
+        admin = User(email=admin_email, university=uni, role="teacher", password_hash=pw)
+        db.session.add(admin)
+        db.session.commit()
+    else:
+        updated = False
+        if getattr(admin, "role", "student") != "teacher":
+            admin.role = "teacher"
+            updated = True
+        if not getattr(admin, "password_hash", None):
+            admin.password_hash = bcrypt.generate_password_hash("Vansh@123").decode("utf-8")
+            updated = True
+        if updated:
+            db.session.commit()
+    students = [
+        {"username": "vikramjeet", "email": "vikramjeet.-3@mail.bcu.ac.uk", "password": "Vansh@123"},
+        {"username": "rajveer", "email": "rajveer.saini@mail.bcu.ac.uk", "password": "Raj@123"},
+    ]
+    for s in students:
+        existing = db.session.execute(db.select(User).filter_by(email=s["email"]))
+        existing = existing.scalar_one_or_none()
+        if not existing:
+            domain = s["email"].split("@")[1]
+            uni = domain.replace(".ac.uk", "")
+            pw = bcrypt.generate_password_hash(s["password"]).decode("utf-8")
+            u = User(username=s["username"], email=s["email"], university=uni, role="student", password_hash=pw, verified_ac_email=True)
+            db.session.add(u)
+            db.session.commit()
+        else:
+            updated = False
+            if getattr(existing, "username", None) != s["username"]:
+                existing.username = s["username"]
+                updated = True
+            if getattr(existing, "role", "student") != "student":
+                existing.role = "student"
+                updated = True
+            if not getattr(existing, "password_hash", None):
+                existing.password_hash = bcrypt.generate_password_hash(s["password"]).decode("utf-8")
+                updated = True
+            if not getattr(existing, "verified_ac_email", False):
+                existing.verified_ac_email = True
+                updated = True
+            if updated:
+                db.session.commit()
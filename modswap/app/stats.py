@@ -0,0 +1,68 @@
+import json
+from flask import current_app, has_app_context
+from sqlalchemy import case, func
+from .cache import app_cache, get_redis
+from .events import user_stats_changed
+from .extensions import db
+from .models import Rating, SwapRequest, SwapRequestHistory
+
+
+def stats_key(user_id):
+    return f"modswap:stats:{user_id}"
+
+
+def build_user_stats(user_id):
+    live = dict(db.session.execute(
+        db.select(SwapRequest.status, func.count())
+        .filter(SwapRequest.user_id == user_id)
+        .group_by(SwapRequest.status)
+    ).all())
+    decided = dict(db.session.execute(
+        db.select(SwapRequestHistory.status, func.count())
+        .filter(SwapRequestHistory.user_id == user_id)
+        .group_by(SwapRequestHistory.status)
+    ).all())
+    ratings, thumbs_up = db.session.execute(
+        db.select(func.count(), func.coalesce(func.sum(case((Rating.thumbs_up.is_(True), 1), else_=0)), 0))
+        .filter(Rating.receiver_id == user_id)
+    ).one()
+    return {
+        "requests": sum(live.values()) + sum(decided.values()),
+        "open": live.get("Open", 0) + live.get("Needs Info", 0),
+        "expired": live.get("Expired", 0),
+        "approved": decided.get("Approved", 0),
+        "rejected": decided.get("Rejected", 0),
+        "ratings": ratings,
+        "thumbs_up": int(thumbs_up),
+    }
+
+
+def user_stats(user_id):
+    client = get_redis()
+    if client is not None:
+        raw = client.get(stats_key(user_id))
+        if raw is not None:
+            return json.loads(raw)
+    else:
+        cached = app_cache("user_stats", 4096).get(user_id)
+        if cached is not None:
+            return cached
+    stats = build_user_stats(user_id)
+    if client is not None:
+        client.set(stats_key(user_id), json.dumps(stats), ex=current_app.config["STATS_TTL"])
+    else:
+        app_cache("user_stats", 4096).set(user_id, stats)
+    return stats
+
+
+@user_stats_changed.connect
+def on_user_stats_changed(sender, users):
+    if not has_app_context():
+        return
+    client = get_redis()
+    if client is not None:
+        client.delete(*[stats_key(user_id) for user_id in users])
+    else:
+        cache = app_cache("user_stats", 4096)
+        for user_id in users:
+            cache.pop(user_id)
@@ -0,0 +1,150 @@
+import mimetypes
+import os
+import shutil
+from flask import current_app, redirect, send_file
+
+CHUNK_SIZE = 64 * 1024
+
+
+class LocalStorage:
+    # Files under a directory on this machine. With accel_prefix set, downloads are handed to
+    # the front-end server via X-Accel-Redirect instead of being streamed by the worker.
+    def __init__(self, root, accel_prefix=None):
+        self.root = os.path.realpath(root)
+        self.accel_prefix = accel_prefix
+        self.staging_dir = os.path.join(self.root, ".staging")
+
+    def _full(self, path):
+        full = os.path.realpath(os.path.join(self.root, path))
+        if not full.startswith(self.root + os.sep):
+            raise ValueError(f"Path escapes storage root: {path}")
+        return full
+
+    def exists(self, path):
+        return os.path.isfile(self._full(path))
+
+    def open(self, path):
+        return open(self._full(path), "rb")
+
+    def put(self, path, fileobj):
+        full = self._full(path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        tmp = f"{full}.part"
+        with open(tmp, "wb") as out:
+            shutil.copyfileobj(fileobj, out, CHUNK_SIZE)
+        os.replace(tmp, full)
+
+    def put_file(self, path, local_path):
+        full = self._full(path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        shutil.move(local_path, full)
+
+    def delete(self, path):
+        try:
+            os.remove(self._full(path))
+        except FileNotFoundError:
+            pass
+
+    def download_response(self, path, download_name=None, max_age=0, public=False):
+        if self.accel_prefix:
+            response = current_app.response_class()
+            response.headers["X-Accel-Redirect"] = f"{self.accel_prefix.rstrip('/')}/{path}"
+            response.headers["Content-Type"] = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            if download_name:
+                response.headers["Content-Disposition"] = f'attachment; filename="{download_name}"'
+            response.cache_control.max_age = max_age
+        else:
+            response = send_file(
+                self._full(path), download_name=download_name, as_attachment=bool(download_name), max_age=max_age
+            )
+        response.cache_control.public = public
+        response.cache_control.private = not public
+        return response
+
+
+class S3Storage:
+    # Any S3-compatible service (AWS, MinIO, R2). Uploads use multipart transfers and downloads
+    # redirect to a pre-signed URL, so file bytes never pass through the app.
+    def __init__(self, bucket, prefix="", endpoint_url=None, region=None, access_key=None, secret_key=None, url_ttl=3600):
+        try:
+            import boto3
+            from botocore.exceptions import ClientError
+        except ImportError as exc:
+            raise RuntimeError("boto3 is required for STORAGE_BACKEND=s3") from exc
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+        )
+        self.client_error = ClientError
+        self.bucket = bucket
+        self.prefix = prefix
+        self.url_ttl = url_ttl
+        self.staging_dir = None
+
+    def _key(self, path):
+        return f"{self.prefix}{path}"
+
+    def exists(self, path):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(path))
+        except self.client_error as exc:
+            if exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    def open(self, path):
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(path))["Body"]
+
+    def put(self, path, fileobj):
+        self.client.upload_fileobj(
+            fileobj, self.bucket, self._key(path),
+            ExtraArgs={"ContentType": mimetypes.guess_type(path)[0] or "application/octet-stream"},
+        )
+
+    def put_file(self, path, local_path):
+        try:
+            with open(local_path, "rb") as fh:
+                self.put(path, fh)
+        finally:
+            os.remove(local_path)
+
+    def delete(self, path):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(path))
+
+    def download_response(self, path, download_name=None, max_age=0, public=False):
+        params = {"Bucket": self.bucket, "Key": self._key(path)}
+        if download_name:
+            params["ResponseContentDisposition"] = f'attachment; filename="{download_name}"'
+        url = self.client.generate_presigned_url("get_object", Params=params, ExpiresIn=self.url_ttl)
+        response = redirect(url)
+        # The redirect must not outlive its signature.
+        response.cache_control.max_age = min(max_age, self.url_ttl // 2)
+        response.cache_control.private = True
+        return response
+
+
+def upload_root():
+    return current_app.config["UPLOAD_ROOT"] or os.path.join(current_app.instance_path, "uploads")
+
+
+def get_storage():
+    if "storage" not in current_app.extensions:
+        config = current_app.config
+        if config["STORAGE_BACKEND"] == "s3":
+            storage = S3Storage(
+                config["STORAGE_S3_BUCKET"],
+                prefix=config["STORAGE_S3_PREFIX"],
+                endpoint_url=config["STORAGE_S3_ENDPOINT"],
+                region=config["STORAGE_S3_REGION"],
+                access_key=config["STORAGE_S3_ACCESS_KEY"],
+                secret_key=config["STORAGE_S3_SECRET_KEY"],
+                url_ttl=config["STORAGE_URL_TTL"],
+            )
+        else:
+            storage = LocalStorage(upload_root(), config["STORAGE_ACCEL_PREFIX"])
+        current_app.extensions["storage"] = storage
+    return current_app.extensions["storage"]
@@ -0,0 +1,150 @@
+import csv
+import io
+from datetime import datetime
+from sqlalchemy import func, or_
+from ..extensions import db
+from ..events import mark_swaps_changed, mark_user_stats_changed
+from ..models import Module, SwapRequest, User, swap_give_modules, swap_want_modules
+
+
+TEXT_FIELDS = ("notes", "priority", "timeslots", "campus", "module_group_pref")
+
+
+def split_modules(value):
+    if isinstance(value, (list, tuple)):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [v.strip() for v in str(value or "").replace(",", ";").split(";") if v.strip()]
+
+
+class InvalidImport(ValueError):
+    pass
+
+
+def parse_rows(payload, content_type):
+    # Accepts CSV text or an already decoded JSON list of row objects.
+    if "csv" in (content_type or ""):
+        try:
+            text = payload.decode("utf-8-sig") if isinstance(payload, bytes) else payload
+            return list(csv.DictReader(io.StringIO(text)))
+        except (UnicodeDecodeError, csv.Error) as exc:
+            raise InvalidImport(f"Could not read CSV: {exc}") from None
+    if not isinstance(payload, list) or not all(isinstance(row, dict) for row in payload):
+        raise InvalidImport("Send a CSV file or a JSON list of row objects")
+    return payload
+
+
+def resolve_modules(tokens):
+    ids = {int(t) for t in tokens if t.isdigit()}
+    codes = {t.upper() for t in tokens if not t.isdigit()}
+    by_id, by_code = {}, {}
+    if ids or codes:
+        query = db.select(Module).filter(or_(Module.id.in_(ids), func.upper(Module.code).in_(codes)))
+        for m in db.session.execute(query).scalars():
+            by_id[m.id] = m
+            by_code.setdefault(m.code.upper(), []).append(m)
+    return by_id, by_code
+
+
+def import_swaps(rows, max_rows=10000):
+    if len(rows) > max_rows:
+        return [], [{"row": None, "error": f"At most {max_rows} rows per import"}]
+    errors = []
+    parsed = []
+    for pos, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append({"row": pos, "error": "Row must be an object"})
+            continue
+        parsed.append((pos, row, split_modules(row.get("give")), split_modules(row.get("want"))))
+
+    emails = {str(r.get("email") or "").strip().lower() for _, r, _, _ in parsed} - {""}
+    users = {}
+    if emails:
+        users = {email.lower(): user_id for user_id, email in db.session.execute(
+            db.select(User.id, User.email).filter(func.lower(User.email).in_(emails))
+        )}
+    by_id, by_code = resolve_modules([t for _, _, g, w in parsed for t in g + w])
+
+    def lookup(token):
+        if token.isdigit():
+            return by_id.get(int(token)), "Unknown module id"
+        matches = by_code.get(token.upper(), [])
+        if len(matches) > 1:
+            return None, "Ambiguous module code"
+        return (matches[0] if matches else None), "Unknown module code"
+
+    candidates = []
+    for pos, row, give, want in parsed:
+        user_id = users.get(str(row.get("email") or "").strip().lower())
+        if user_id is None:
+            errors.append({"row": pos, "error": "Unknown user email"})
+            continue
+        if not give or not want:
+            errors.append({"row": pos, "error": "Select at least one module to give and one to want"})
+            continue
+        if len(give) > 5 or len(want) > 5:
+            errors.append({"row": pos, "error": "You can select up to 5 modules in each list"})
+            continue
+        resolved = {"give": [], "want": []}
+        problem = None
+        for side, tokens in (("give", give), ("want", want)):
+            for token in tokens:
+                module, message = lookup(token)
+                if module is None:
+                    problem = f"{message}: {token}"
+                    break
+                if module.id not in resolved[side]:
+                    resolved[side].append(module.id)
+            if problem:
+                break
+        if not problem and set(resolved["give"]) & set(resolved["want"]):
+            problem = "You cannot give and want the same module"
+        expires_at = None
+        if not problem and row.get("expires_on"):
+            try:
+                expires_at = datetime.strptime(str(row["expires_on"]).strip(), "%Y-%m-%d")
+            except ValueError:
+                problem = "Invalid expiry date format, use YYYY-MM-DD"
+        if problem:
+            errors.append({"row": pos, "error": problem})
+            continue
+        values = {
+            "user_id": user_id,
+            "status": "Open",
+            "visibility": row.get("visibility") or "public",
+            "expires_at": expires_at,
+            "signature": SwapRequest.make_signature(resolved["give"], resolved["want"]),
+        }
+        for field in TEXT_FIELDS:
+            values[field] = row.get(field) or None
+        candidates.append((pos, values, resolved))
+
+    existing = set()
+    signatures = {v["signature"] for _, v, _ in candidates}
+    if signatures:
+        existing = set(db.session.execute(
+            db.select(SwapRequest.user_id, SwapRequest.signature)
+            .filter(SwapRequest.status == "Open", SwapRequest.signature.in_(signatures))
+        ).all())
+    accepted = []
+    for pos, values, resolved in candidates:
+        key = (values["user_id"], values["signature"])
+        if key in existing:
+            errors.append({"row": pos, "error": "Duplicate request already exists"})
+            continue
+        existing.add(key)
+        accepted.append((values, resolved))
+    if not accepted:
+        return [], errors
+
+    now = datetime.utcnow()
+    new_ids = db.session.execute(
+        db.insert(SwapRequest).returning(SwapRequest.id, sort_by_parameter_order=True).execution_options(render_nulls=True),
+        [dict(values, created_at=now, updated_at=now) for values, _ in accepted],
+    ).scalars().all()
+    give_rows = [{"swap_id": sid, "module_id": mid} for sid, (_, r) in zip(new_ids, accepted) for mid in r["give"]]
+    want_rows = [{"swap_id": sid, "module_id": mid} for sid, (_, r) in zip(new_ids, accepted) for mid in r["want"]]
+    db.session.execute(swap_give_modules.insert(), give_rows)
+    db.session.execute(swap_want_modules.insert(), want_rows)
+    mark_swaps_changed(db.session, new_ids)
+    mark_user_stats_changed(db.session, {values["user_id"] for values, _ in accepted})
+    return new_ids, errors
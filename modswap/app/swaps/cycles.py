@@ -0,0 +1,234 @@
+import threading
+import time
+from collections import defaultdict
+from flask import current_app, has_app_context
+from ..extensions import db
+from ..models import SwapRequest, swap_give_modules, swap_want_modules
+from ..events import swaps_changed
+
+
+class CycleMatcher:
+    # Nodes are swap requests; an edge u -> v means u gives a module v wants.
+    # A cycle is a trade where every participant receives something they want.
+
+    def __init__(self, max_length=4, time_budget=2.0, max_expansions=200):
+        self.max_length = max_length
+        self.time_budget = time_budget
+        self.max_expansions = max_expansions
+        self.owner = {}
+        self.give = {}
+        self.want = {}
+        self.givers = defaultdict(set)
+        self.wanters = defaultdict(set)
+        self.pairs = defaultdict(set)
+        self.assigned = {}
+        self.cycles = set()
+        # Nodes a run reached its deadline before exploring; resume() picks them up.
+        self.unexplored = set()
+
+    def __len__(self):
+        return len(self.owner)
+
+    def _insert(self, node, owner, giving, wanting):
+        self.owner[node] = owner
+        self.give[node] = frozenset(giving)
+        self.want[node] = frozenset(wanting)
+        for m in self.give[node]:
+            self.givers[m].add(node)
+        for m in self.want[node]:
+            self.wanters[m].add(node)
+        for g in self.give[node]:
+            for w in self.want[node]:
+                self.pairs[(g, w)].add(node)
+
+    def _delete(self, node):
+        for g in self.give.get(node, ()):
+            for w in self.want.get(node, ()):
+                self.pairs[(g, w)].discard(node)
+        for m in self.give.pop(node, ()):
+            self.givers[m].discard(node)
+        for m in self.want.pop(node, ()):
+            self.wanters[m].discard(node)
+        self.owner.pop(node, None)
+
+    def _assign(self, cycle):
+        self.cycles.add(cycle)
+        for node in cycle:
+            self.assigned[node] = cycle
+
+    def _unassign(self, node):
+        cycle = self.assigned.get(node)
+        if cycle is None:
+            return ()
+        self.cycles.discard(cycle)
+        for n in cycle:
+            self.assigned.pop(n, None)
+        return cycle
+
+    def _search(self, start, deadline):
+        owner = self.owner[start]
+        # Remaining expansions, and expansions so far for spacing out the deadline checks.
+        budget = [self.max_expansions, 0]
+        for length in range(2, self.max_length + 1):
+            found = self._extend([start], {owner}, length, deadline, budget)
+            if found or budget[0] <= 0:
+                return found
+        return None
+
+    def _spend(self, budget, deadline):
+        budget[0] -= 1
+        budget[1] += 1
+        if budget[0] <= 0 or (budget[1] % 64 == 0 and time.monotonic() > deadline):
+            budget[0] = 0
+            return True
+        return False
+
+    def _extend(self, path, owners, length, deadline, budget):
+        last = path[-1]
+        if len(path) + 1 == length:
+            # Closing hop: a node that wants what last gives and gives what the start wants.
+            for m in self.give[last]:
+                for wanted in self.want[path[0]]:
+                    for c in self.pairs.get((wanted, m), ()):
+                        if self._spend(budget, deadline):
+                            return None
+                        if c not in self.assigned and c not in path and self.owner[c] not in owners:
+                            return tuple(path) + (c,)
+            return None
+        # No memo of nodes that failed to close: whether a node closes depends on the owners
+        # already on the path, so a failure under one path says nothing about another.
+        for m in self.give[last]:
+            for nxt in self.wanters[m]:
+                if self._spend(budget, deadline):
+                    return None
+                if nxt in self.assigned or nxt in path or self.owner[nxt] in owners:
+                    continue
+                path.append(nxt)
+                owners.add(self.owner[nxt])
+                found = self._extend(path, owners, length, deadline, budget)
+                path.pop()
+                owners.discard(self.owner[nxt])
+                if found:
+                    return found
+                if budget[0] <= 0:
+                    return None
+        return None
+
+    def _match(self, nodes, deadline):
+        found = []
+        nodes = list(nodes)
+        for i, node in enumerate(nodes):
+            if time.monotonic() > deadline:
+                self.unexplored.update(nodes[i:])
+                break
+            self.unexplored.discard(node)
+            if node not in self.owner or node in self.assigned:
+                continue
+            cycle = self._search(node, deadline)
+            if cycle:
+                self._assign(cycle)
+                found.append(cycle)
+            elif time.monotonic() > deadline:
+                # Cut short by the deadline rather than by max_expansions.
+                self.unexplored.add(node)
+        return found
+
+    def _deadline(self, budget):
+        return time.monotonic() + (self.time_budget if budget is None else budget)
+
+    def match_all(self, budget=None):
+        self.unexplored.clear()
+        return self._match(sorted(self.owner), self._deadline(budget))
+
+    def resume(self, budget=None):
+        return self._match(sorted(self.unexplored), self._deadline(budget))
+
+    def add(self, node, owner, giving, wanting, budget=None):
+        self.remove(node)
+        self._insert(node, owner, giving, wanting)
+        return self._match([node], self._deadline(budget))
+
+    def remove(self, node, budget=None):
+        freed = [n for n in self._unassign(node) if n != node]
+        self._delete(node)
+        return self._match(freed, self._deadline(budget)) if freed else []
+
+
+def _live_swaps(ids=None):
+    swaps = {}
+    query = db.select(SwapRequest.id, SwapRequest.user_id).filter(SwapRequest.status.in_(SwapRequest.LIVE_STATUSES))
+    if ids is not None:
+        query = query.filter(SwapRequest.id.in_(ids))
+    for swap_id, user_id in db.session.execute(query).all():
+        swaps[swap_id] = (user_id, set(), set())
+    for pos, table in ((1, swap_give_modules), (2, swap_want_modules)):
+        query = (
+            db.select(table.c.swap_id, table.c.module_id)
+            .join(SwapRequest, SwapRequest.id == table.c.swap_id)
+            .filter(SwapRequest.status.in_(SwapRequest.LIVE_STATUSES))
+        )
+        if ids is not None:
+            query = query.filter(table.c.swap_id.in_(ids))
+        for swap_id, module_id in db.session.execute(query).all():
+            if swap_id in swaps:
+                swaps[swap_id][pos].add(module_id)
+    return swaps
+
+
+class SwapCycleMatcher(CycleMatcher):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._pending = set()
+
+    def invalidate(self, ids=None):
+        with self._lock:
+            if ids is None:
+                self._loaded = False
+                self._pending.clear()
+            else:
+                self._pending.update(ids)
+
+    def sync(self):
+        with self._lock:
+            if not self._loaded:
+                for node in list(self.owner):
+                    self._delete(node)
+                self.assigned.clear()
+                self.cycles.clear()
+                for swap_id, (user_id, giving, wanting) in _live_swaps().items():
+                    self._insert(swap_id, user_id, giving, wanting)
+                self._pending = set()
+                self._loaded = True
+                self.match_all()
+            elif self._pending:
+                ids = sorted(self._pending)
+                self._pending = set()
+                deadline = self._deadline(None)
+                freed = []
+                for node in ids:
+                    freed.extend(n for n in self._unassign(node) if n not in ids)
+                    self._delete(node)
+                for swap_id, (user_id, giving, wanting) in _live_swaps(ids).items():
+                    self._insert(swap_id, user_id, giving, wanting)
+                touched = set(ids) | set(freed)
+                self._match(ids + freed + sorted(self.unexplored - touched), deadline)
+            elif self.unexplored:
+                self.resume()
+            return sorted(self.cycles)
+
+
+def get_cycle_matcher():
+    if "cycle_matcher" not in current_app.extensions:
+        current_app.extensions["cycle_matcher"] = SwapCycleMatcher(
+            max_length=current_app.config["CYCLE_MAX_LENGTH"],
+            time_budget=current_app.config["CYCLE_TIME_BUDGET"],
+        )
+    return current_app.extensions["cycle_matcher"]
+
+
+@swaps_changed.connect
+def on_swaps_changed(sender, ids=None):
+    if has_app_context() and "cycle_matcher" in current_app.extensions:
+        current_app.extensions["cycle_matcher"].invalidate(ids)
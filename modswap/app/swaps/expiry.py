@@ -0,0 +1,84 @@
+import threading
+from datetime import datetime
+import click
+from ..events import mark_swaps_changed, mark_user_stats_changed
+from ..extensions import db
+from ..models import SwapRequest
+from ..notifications import notify
+from .matchcache import sync_matches
+
+
+def expire_swaps(now=None, batch_size=500):
+    # Walks ix_swap_requests_status_expires in bounded batches, one transaction each, so a
+    # large backlog never holds a long write lock. Returns the number of requests expired.
+    now = now or datetime.utcnow()
+    total = 0
+    while True:
+        due = db.session.execute(
+            db.select(SwapRequest.id)
+            .filter(SwapRequest.status.in_(SwapRequest.LIVE_STATUSES), SwapRequest.expires_at <= now)
+            .order_by(SwapRequest.expires_at)
+            .limit(batch_size)
+        ).scalars().all()
+        if not due:
+            return total
+        # Another sweeper may have expired some of these since the SELECT; only the rows this
+        # UPDATE actually changed come back, so each owner is notified once.
+        rows = db.session.execute(
+            db.update(SwapRequest)
+            .where(SwapRequest.id.in_(due), SwapRequest.status.in_(SwapRequest.LIVE_STATUSES))
+            .values(status="Expired")
+            .returning(SwapRequest.id, SwapRequest.user_id)
+        ).all()
+        if not rows:
+            db.session.commit()
+            continue
+        ids = [swap_id for swap_id, _ in rows]
+        recipients = {}
+        for swap_id, user_id in rows:
+            recipients.setdefault(user_id, {"swap_ids": [], "status": "Expired"})["swap_ids"].append(swap_id)
+        notify("status", recipients)
+        mark_swaps_changed(db.session, ids)
+        mark_user_stats_changed(db.session, recipients)
+        db.session.commit()
+        total += len(ids)
+
+
+class ExpirySweeper:
+    def __init__(self, app):
+        self.app = app
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="expiry-sweeper", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        interval = self.app.config["EXPIRY_SWEEP_INTERVAL"]
+        while not self.stopped.wait(interval):
+            with self.app.app_context():
+                try:
+                    expire_swaps(batch_size=self.app.config["EXPIRY_BATCH_SIZE"])
+                except Exception:
+                    self.app.logger.exception("Expiry sweep failed")
+                    db.session.rollback()
+
+
+def init_expiry(app):
+    if app.config["EXPIRY_SWEEP_INTERVAL"] > 0:
+        app.extensions["expiry_sweeper"] = ExpirySweeper(app)
+        app.extensions["expiry_sweeper"].start()
+
+    @app.cli.command("expire-swaps")
+    @click.option("--batch-size", type=int, default=None)
+    def expire_swaps_command(batch_size):
+        count = expire_swaps(batch_size=batch_size or app.config["EXPIRY_BATCH_SIZE"])
+        # The command exits before a match-cache worker would get to the expired requests.
+        if sync_matches():
+            db.session.commit()
+        click.echo(f"Expired {count} swap request(s)")
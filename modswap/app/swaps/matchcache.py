@@ -0,0 +1,309 @@
+import threading
+from datetime import datetime, timedelta
+import click
+from flask import current_app, has_app_context
+from sqlalchemy import func, tuple_
+from ..chat.buffer import get_message_buffer
+from ..events import mark_chats_opened, swaps_changed
+from ..extensions import db
+from ..models import ChangeLog, MatchSync, Message, SwapMatch, SwapRequest
+from ..notifications import notify
+from ..queries import swap_list_options
+from ..querybudget import unbudgeted
+from .matching import LOG_LOOKBACK, get_match_index, prune_change_log
+
+CHUNK = 500
+LOG_BATCH = 5000
+# A changed request is offered to the lists of its best MATCH_CACHE_SIZE * OFFER_FACTOR
+# counterparts; lists further down are refreshed when their own request changes.
+OFFER_FACTOR = 5
+
+
+def chunks(values):
+    values = list(values)
+    for start in range(0, len(values), CHUNK):
+        yield values[start:start + CHUNK]
+
+
+def ranked(swap_id, limit):
+    return get_match_index().matches_for(swap_id, limit, by_reputation=current_app.config["REPUTATION_RANKING"])
+
+
+def tie_order(ids):
+    # Sort key that puts equal scores in the order ranked() does: by owner reputation with
+    # REPUTATION_RANKING, otherwise oldest request first.
+    if not current_app.config["REPUTATION_RANKING"]:
+        return lambda swap_id: swap_id
+    tiebreak = get_match_index().tiebreaks(ids)
+    return lambda swap_id: -tiebreak[swap_id]
+
+
+def rebuild_matches():
+    # Recomputes every live request's list. Used to backfill the table; the caller commits.
+    limit = current_app.config["MATCH_CACHE_SIZE"]
+    db.session.execute(db.delete(SwapMatch))
+    rows = []
+    for swap_id in get_match_index().live_ids():
+        rows += [{"swap_id": swap_id, "match_id": m, "score": sc} for m, sc in ranked(swap_id, limit) or ()]
+    for chunk in chunks(rows):
+        db.session.execute(db.insert(SwapMatch), chunk)
+    return len(rows)
+
+
+def update_matches(ids):
+    # Brings swap_matches up to date after the given requests were created, edited, expired or
+    # removed. Their own lists and every list that referenced them are recomputed; other lists
+    # gain a changed request only when it beats their current lowest score, dropping that entry
+    # once the list is full. The caller commits. Returns the (swap_id, match_id) pairs added.
+    limit = current_app.config["MATCH_CACHE_SIZE"]
+    ids = set(ids)
+    recompute = set(ids)
+    previous = set()
+    for chunk in chunks(ids):
+        recompute.update(db.session.execute(
+            db.select(SwapMatch.swap_id).filter(SwapMatch.match_id.in_(chunk))
+        ).scalars())
+    for chunk in chunks(recompute):
+        previous.update(db.session.execute(
+            db.select(SwapMatch.swap_id, SwapMatch.match_id).filter(SwapMatch.swap_id.in_(chunk))
+        ).tuples())
+        db.session.execute(db.delete(SwapMatch).where(SwapMatch.swap_id.in_(chunk)))
+
+    rows = {}
+    offers = {}
+    for swap_id in recompute:
+        for match_id, score in ranked(swap_id, limit) or ():
+            rows[(swap_id, match_id)] = score
+    for swap_id in ids:
+        for match_id, score in ranked(swap_id, limit * OFFER_FACTOR) or ():
+            if match_id not in recompute:
+                offers.setdefault(match_id, []).append((score, swap_id))
+
+    listed = {}
+    for chunk in chunks(offers):
+        for swap_id, count, lowest in db.session.execute(
+            db.select(SwapMatch.swap_id, func.count(), func.min(SwapMatch.score))
+            .filter(SwapMatch.swap_id.in_(chunk))
+            .group_by(SwapMatch.swap_id)
+        ):
+            listed[swap_id] = (count, lowest)
+    full = []
+    order = tie_order(ids)
+    for swap_id, candidates in offers.items():
+        count, lowest = listed.get(swap_id, (0, 0))
+        # Ties keep the entries already listed.
+        entering = sorted((o for o in candidates if count < limit or o[0] > lowest), key=lambda o: (-o[0], order(o[1])))
+        offers[swap_id] = entering = entering[:limit]
+        if count + len(entering) > limit:
+            full.append(swap_id)
+        for score, match_id in entering:
+            rows[(swap_id, match_id)] = score
+    for chunk in chunks(rows.items()):
+        db.session.execute(db.insert(SwapMatch), [{"swap_id": s, "match_id": m, "score": sc} for (s, m), sc in chunk])
+    dropped = trim_lists(full, limit) if full else set()
+    added = {pair: score for pair, score in rows.items() if pair not in previous and pair not in dropped}
+    open_auto_chats(added)
+    return added
+
+
+def trim_lists(swap_ids, limit):
+    drop = []
+    for chunk in chunks(swap_ids):
+        lists = {}
+        for swap_id, match_id, score in db.session.execute(
+            db.select(SwapMatch.swap_id, SwapMatch.match_id, SwapMatch.score).filter(SwapMatch.swap_id.in_(chunk))
+        ):
+            lists.setdefault(swap_id, []).append((score, match_id))
+        order = tie_order({match_id for entries in lists.values() for _, match_id in entries})
+        for swap_id, entries in lists.items():
+            entries.sort(key=lambda e: (-e[0], order(e[1])))
+            drop += [(swap_id, match_id) for _, match_id in entries[limit:]]
+    for chunk in chunks(drop):
+        db.session.execute(db.delete(SwapMatch).where(tuple_(SwapMatch.swap_id, SwapMatch.match_id).in_(chunk)))
+    return set(drop)
+
+
+def open_auto_chats(added):
+    # For requests created with auto_create_chat, a new strong match opens a conversation: the
+    # owner's first message lands in the matched request's thread, once per pair of requests.
+    strong = {pair: score for pair, score in added.items() if score >= current_app.config["AUTO_CHAT_MIN_SCORE"]}
+    if not strong:
+        return 0
+    ids = {swap_id for pair in strong for swap_id in pair}
+    owners, opted_in = {}, set()
+    for chunk in chunks(ids):
+        for swap_id, user_id, auto in db.session.execute(
+            db.select(SwapRequest.id, SwapRequest.user_id, SwapRequest.auto_create_chat).filter(SwapRequest.id.in_(chunk))
+        ):
+            owners[swap_id] = user_id
+            if auto:
+                opted_in.add(swap_id)
+    wanted = {
+        (swap_id, match_id): score for (swap_id, match_id), score in strong.items()
+        if swap_id in opted_in and match_id in owners
+    }
+    if not wanted:
+        return 0
+    started = set()
+    for chunk in chunks({match_id for _, match_id in wanted}):
+        started.update(db.session.execute(
+            db.select(Message.swap_id, Message.sender_id).filter(Message.swap_id.in_(chunk)).distinct()
+        ).tuples())
+    buffer = get_message_buffer()
+    messages, recipients = [], {}
+    for (swap_id, match_id), score in sorted(wanted.items()):
+        sender = owners[swap_id]
+        if (match_id, sender) in started or buffer.involves(match_id, sender):
+            continue
+        started.add((match_id, sender))
+        messages.append({
+            "swap_id": match_id,
+            "sender_id": sender,
+            "receiver_id": owners[match_id],
+            "content": f"Your request #{match_id} is a strong match for my request #{swap_id} (score {score}). Shall we swap?",
+        })
+        recipients.setdefault(owners[match_id], {"swap_id": match_id, "match_id": swap_id, "score": score})
+    if messages:
+        # Sent through the chat buffer after commit, like any other message.
+        mark_chats_opened(db.session, messages)
+        notify("chat", recipients)
+    return len(messages)
+
+
+def unsynced_log():
+    # Change log rows swap_matches has not caught up with, and how far the cursor can move.
+    # Ids can commit out of order, so the cursor stops at a gap until the row after it is
+    # LOG_LOOKBACK seconds old; rows past the gap are applied again next time, which is harmless.
+    state = db.session.execute(db.select(MatchSync.log_id, MatchSync.version).filter(MatchSync.id == 1)).first()
+    if state is None:
+        return None, [], None
+    rows = db.session.execute(
+        db.select(ChangeLog.id, ChangeLog.topic, ChangeLog.ref_id, ChangeLog.created_at)
+        .filter(ChangeLog.id > state.log_id)
+        .order_by(ChangeLog.id)
+        .limit(LOG_BATCH)
+    ).all()
+    cutoff = datetime.utcnow() - timedelta(seconds=LOG_LOOKBACK)
+    position = state.log_id
+    for log_id, _, _, created_at in rows:
+        if log_id != position + 1 and created_at >= cutoff:
+            break
+        position = log_id
+    return state, rows, position
+
+
+def sync_matches():
+    # Applies every change logged since swap_matches was last brought up to date, by whichever
+    # process made it. Returns True when there is something for the caller to commit.
+    state, rows, position = unsynced_log()
+    if not rows:
+        return False
+    claimed = db.session.execute(
+        db.update(MatchSync)
+        .where(MatchSync.id == 1, MatchSync.version == state.version)
+        .values(log_id=position, version=state.version + 1, updated_at=datetime.utcnow())
+    ).rowcount
+    if not claimed:
+        # Another process took this batch first.
+        return False
+    ids = {ref_id for _, topic, ref_id, _ in rows if topic == "swap"}
+    if ids:
+        # Rank against every committed change, not only those this process has heard of.
+        get_match_index().catch_up()
+        update_matches(ids)
+    return True
+
+
+def settle_matches():
+    # Without the worker, requests that write or read matches apply pending changes inline.
+    if current_app.config["MATCH_CACHE_WORKER"]:
+        return False
+    with unbudgeted():
+        return sync_matches()
+
+
+def cached_matches(swap_id, limit):
+    rows = db.session.execute(
+        db.select(SwapRequest, SwapMatch.score)
+        .join(SwapMatch, SwapMatch.match_id == SwapRequest.id)
+        .filter(SwapMatch.swap_id == swap_id, SwapRequest.status.in_(SwapRequest.LIVE_STATUSES))
+        .order_by(SwapMatch.score.desc(), SwapMatch.match_id)
+        .limit(limit)
+        .options(*swap_list_options())
+    ).all()
+    return [(swap, score) for swap, score in rows]
+
+
+class MatchCacheWorker:
+    def __init__(self, app):
+        self.app = app
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="match-cache", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+
+    def run(self):
+        # Woken by swaps-changed for changes made here, and every MATCH_CACHE_POLL_INTERVAL for
+        # changes made by other processes; the old end of the change log is pruned as it goes.
+        interval = self.app.config["MATCH_CACHE_POLL_INTERVAL"]
+        while not self.stopped.is_set():
+            woken = self.wake.wait(interval)
+            self.wake.clear()
+            with self.app.app_context():
+                try:
+                    if sync_matches():
+                        db.session.commit()
+                    if not woken and prune_change_log():
+                        db.session.commit()
+                except Exception:
+                    self.app.logger.exception("Match cache update failed")
+                    db.session.rollback()
+
+
+@swaps_changed.connect
+def on_swaps_changed(sender, ids=None):
+    if not has_app_context():
+        return
+    worker = current_app.extensions.get("match_cache_worker")
+    if worker is not None:
+        worker.wake.set()
+
+
+def init_match_cache(app):
+    # Off by default: requests apply pending changes inline through settle_matches(). With
+    # MATCH_CACHE_WORKER each process runs a thread instead; without it, run sync-matches from a
+    # scheduler so the change log is pruned and lists settle between requests.
+    if app.config["MATCH_CACHE_WORKER"]:
+        app.extensions["match_cache_worker"] = MatchCacheWorker(app)
+        app.extensions["match_cache_worker"].start()
+
+    @app.cli.command("refresh-matches")
+    def refresh_matches_command():
+        last = db.session.execute(db.select(func.max(ChangeLog.id))).scalar() or 0
+        get_match_index().catch_up()
+        count = rebuild_matches()
+        db.session.execute(db.update(MatchSync).where(MatchSync.id == 1).values(log_id=last, updated_at=datetime.utcnow()))
+        db.session.commit()
+        click.echo(f"Stored {count} match(es)")
+
+    @app.cli.command("sync-matches")
+    def sync_matches_command():
+        # For deployments without the worker thread, e.g. run from a scheduler.
+        synced = sync_matches()
+        pruned = prune_change_log()
+        db.session.commit()
+        click.echo(f"{'Applied' if synced else 'No'} pending match changes, pruned {pruned} change log row(s)")
+
+    @app.cli.command("prune-change-log")
+    def prune_change_log_command():
+        count = prune_change_log()
+        db.session.commit()
+        click.echo(f"Pruned {count} change log row(s)")
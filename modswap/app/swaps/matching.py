@@ -0,0 +1,311 @@
+import heapq
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import func, or_
+from ..extensions import db
+from ..models import ChangeLog, MatchSync, SwapRequest, UserReputation, swap_give_modules, swap_want_modules
+from ..events import reputation_changed, swaps_changed
+from ..notifications import notify
+
+
+TIEBREAK_BASE = 10 ** 12
+# Log rows are written just before their transaction commits, so one committed out of id order
+# is at most this many seconds old when it becomes visible.
+LOG_LOOKBACK = 10
+
+
+class MatchIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._pending = set()
+        self._pending_users = set()
+        self._seen = 0
+        self._applied = {}
+        self._checked = 0.0
+        self._detached = False
+        self.owners = {}
+        self.owned = defaultdict(set)
+        self.reputation = {}
+        self.tiebreak = {}
+        self.giving = defaultdict(set)
+        self.wanting = defaultdict(set)
+        self.givers = defaultdict(set)
+        self.wanters = defaultdict(set)
+
+    @classmethod
+    def from_rows(cls, owners, gives, wants, reputation=None):
+        # A fixed index over prebuilt (swap_id, user_id) and (swap_id, module_id) rows. It never
+        # reads the database or the change log, so it works without an app, e.g. in benchmarks.
+        index = cls()
+        index.reputation = dict(reputation or {})
+        index._add_rows(owners, gives, wants)
+        index._loaded = index._detached = True
+        return index
+
+    def invalidate(self, ids=None):
+        with self._lock:
+            if ids is None:
+                self._loaded = False
+                self._pending.clear()
+            else:
+                self._pending.update(ids)
+
+    def invalidate_reputation(self, user_ids):
+        with self._lock:
+            self._pending_users.update(user_ids)
+
+    def _sync(self, fresh=False):
+        if self._detached:
+            return
+        now = time.monotonic()
+        if self._loaded and now - self._checked > current_app.config["CHANGE_LOG_RETENTION"] / 2:
+            # Idle for long enough that log rows may have been pruned unread.
+            self._loaded = False
+        if not self._loaded:
+            self._load()
+            return
+        if fresh or now - self._checked >= current_app.config["MATCH_SYNC_INTERVAL"]:
+            self._read_log()
+        if self._pending:
+            self._refresh(self._pending)
+            self._pending = set()
+        if self._pending_users:
+            users = list(self._pending_users)
+            self._pending_users = set()
+            for user_id, score in db.session.execute(
+                db.select(UserReputation.user_id, UserReputation.score).filter(UserReputation.user_id.in_(users))
+            ):
+                self.reputation[user_id] = score
+                for swap_id in self.owned.get(user_id, ()):
+                    self.tiebreak[swap_id] = self._tiebreak(swap_id, user_id)
+
+    def _read_log(self):
+        # Picks up changes committed by other processes. Rows from the last LOG_LOOKBACK seconds
+        # are read again in case an earlier id committed late; ids already applied are skipped.
+        cutoff = datetime.utcnow() - timedelta(seconds=LOG_LOOKBACK)
+        rows = db.session.execute(
+            db.select(ChangeLog.id, ChangeLog.topic, ChangeLog.ref_id, ChangeLog.created_at)
+            .filter(or_(ChangeLog.id > self._seen, ChangeLog.created_at >= cutoff))
+        ).all()
+        self._checked = time.monotonic()
+        self._applied = {log_id: at for log_id, at in self._applied.items() if at >= cutoff}
+        for log_id, topic, ref_id, created_at in rows:
+            if log_id in self._applied:
+                continue
+            self._applied[log_id] = created_at
+            self._seen = max(self._seen, log_id)
+            (self._pending if topic == "swap" else self._pending_users).add(ref_id)
+
+    def _clear(self):
+        self.owners.clear()
+        self.owned.clear()
+        self.tiebreak.clear()
+        self.giving.clear()
+        self.wanting.clear()
+        self.givers.clear()
+        self.wanters.clear()
+
+    def _tiebreak(self, swap_id, user_id):
+        # Orders equal match scores by owner reputation, then oldest request first. Kept per
+        # swap so ranking by reputation costs the same as ranking by id.
+        return round(self.reputation.get(user_id, 0.0) * 1_000_000) * TIEBREAK_BASE - swap_id
+
+    def _add_rows(self, owners, gives, wants):
+        # Only live requests are indexed; module rows of anything else are skipped.
+        for swap_id, user_id in owners:
+            self.owners[swap_id] = user_id
+            self.owned[user_id].add(swap_id)
+            self.tiebreak[swap_id] = self._tiebreak(swap_id, user_id)
+        for swap_id, module_id in gives:
+            if swap_id in self.owners:
+                self.giving[swap_id].add(module_id)
+                self.givers[module_id].add(swap_id)
+        for swap_id, module_id in wants:
+            if swap_id in self.owners:
+                self.wanting[swap_id].add(module_id)
+                self.wanters[module_id].add(swap_id)
+
+    def _load(self):
+        self._clear()
+        self._seen = db.session.execute(db.select(func.max(ChangeLog.id))).scalar() or 0
+        self._applied = {}
+        self._checked = time.monotonic()
+        self.reputation = dict(db.session.execute(db.select(UserReputation.user_id, UserReputation.score)).all())
+        self._add_rows(
+            db.session.execute(
+                db.select(SwapRequest.id, SwapRequest.user_id).filter(SwapRequest.status.in_(SwapRequest.LIVE_STATUSES))
+            ).all(),
+            db.session.execute(db.select(swap_give_modules.c.swap_id, swap_give_modules.c.module_id)).all(),
+            db.session.execute(db.select(swap_want_modules.c.swap_id, swap_want_modules.c.module_id)).all(),
+        )
+        self._pending = set()
+        self._pending_users = set()
+        self._loaded = True
+
+    def _discard(self, swap_id):
+        user_id = self.owners.pop(swap_id, None)
+        if user_id is not None:
+            self.owned[user_id].discard(swap_id)
+        self.tiebreak.pop(swap_id, None)
+        for module_id in self.giving.pop(swap_id, ()):
+            self.givers[module_id].discard(swap_id)
+        for module_id in self.wanting.pop(swap_id, ()):
+            self.wanters[module_id].discard(swap_id)
+
+    def _refresh(self, ids):
+        ids = list(ids)
+        for swap_id in ids:
+            self._discard(swap_id)
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            self._add_rows(
+                db.session.execute(
+                    db.select(SwapRequest.id, SwapRequest.user_id)
+                    .filter(SwapRequest.id.in_(chunk), SwapRequest.status.in_(SwapRequest.LIVE_STATUSES))
+                ).all(),
+                db.session.execute(
+                    db.select(swap_give_modules.c.swap_id, swap_give_modules.c.module_id)
+                    .filter(swap_give_modules.c.swap_id.in_(chunk))
+                ).all(),
+                db.session.execute(
+                    db.select(swap_want_modules.c.swap_id, swap_want_modules.c.module_id)
+                    .filter(swap_want_modules.c.swap_id.in_(chunk))
+                ).all(),
+            )
+
+    def catch_up(self):
+        # Applies every change committed so far, wherever it was made.
+        with self._lock:
+            self._sync(fresh=True)
+
+    def tiebreaks(self, ids):
+        # Reputation tie-break values of the given requests, 0 for any that are not live.
+        with self._lock:
+            self._sync()
+            return {swap_id: self.tiebreak.get(swap_id, 0) for swap_id in ids}
+
+    def live_ids(self):
+        with self._lock:
+            self._sync()
+            return list(self.owners)
+
+    def matches_for(self, swap_id, limit=None, by_reputation=False):
+        # Ranked counterparts of an indexed request, all of them without a limit; None when the
+        # request is not live.
+        with self._lock:
+            self._sync()
+            if swap_id not in self.owners:
+                return None
+            give, want, owner = set(self.giving[swap_id]), set(self.wanting[swap_id]), self.owners[swap_id]
+            limit = limit or len(self.owners)
+        return self.top_matches(give, want, exclude_user_id=owner, limit=limit, by_reputation=by_reputation)
+
+    def top_matches(self, give_ids, want_ids, exclude_user_id=None, limit=20, by_reputation=False):
+        # With by_reputation, requests with the same match score are ordered by their owner's
+        # Wilson score instead of by id.
+        scores = defaultdict(int)
+        with self._lock:
+            self._sync()
+            for module_id in give_ids:
+                for swap_id in self.wanters.get(module_id, ()):
+                    scores[swap_id] += 1
+            for module_id in want_ids:
+                for swap_id in self.givers.get(module_id, ()):
+                    scores[swap_id] += 1
+            if exclude_user_id is not None:
+                scores = {sid: sc for sid, sc in scores.items() if self.owners.get(sid) != exclude_user_id}
+            # Everything above the limit-th best score places; only the requests tied at that
+            # score compete for the remaining slots, so the tie-break never touches the rest.
+            if len(scores) > limit:
+                cutoff = heapq.nlargest(limit, scores.values())[-1]
+                top = [kv for kv in scores.items() if kv[1] > cutoff]
+                tied = [sid for sid, sc in scores.items() if sc == cutoff]
+                if by_reputation:
+                    # Tie-break values are unique ints, so the heap needs no key function and the
+                    # swap id is recovered from the value.
+                    best = heapq.nlargest(limit - len(top), map(self.tiebreak.__getitem__, tied))
+                    tied = [-value % TIEBREAK_BASE for value in best]
+                else:
+                    tied = heapq.nsmallest(limit - len(top), tied)
+                top += [(sid, cutoff) for sid in tied]
+            else:
+                top = list(scores.items())
+            if by_reputation:
+                tiebreak = self.tiebreak
+                return sorted(top, key=lambda kv: (kv[1], tiebreak[kv[0]]), reverse=True)
+        return sorted(top, key=lambda kv: (-kv[1], kv[0]))
+
+
+def compatibility_scores(giving, wanting, give_counts=None, want_counts=None):
+    # Score of s = sum over every other swap o of |o.wanting & s.giving| + |o.giving & s.wanting|,
+    # computed from per-module counts in one pass instead of comparing every pair.
+    # The counts default to those of the swaps passed in; callers scoring one page of a larger
+    # set pass the counts of the whole set.
+    if give_counts is None:
+        give_counts = Counter()
+        for ids in giving.values():
+            give_counts.update(ids)
+    if want_counts is None:
+        want_counts = Counter()
+        for ids in wanting.values():
+            want_counts.update(ids)
+    scores = {}
+    for swap_id in giving.keys() | wanting.keys():
+        s_g = giving.get(swap_id, set())
+        s_w = wanting.get(swap_id, set())
+        score = sum(want_counts.get(m, 0) for m in s_g) + sum(give_counts.get(m, 0) for m in s_w)
+        scores[swap_id] = score - 2 * len(s_g & s_w)
+    return scores
+
+
+def notify_watchers(swap):
+    # Tell the owners of open requests that match a newly created swap.
+    top = get_match_index().top_matches(
+        {m.id for m in swap.giving}, {m.id for m in swap.wanting},
+        exclude_user_id=swap.user_id,
+        limit=current_app.config["MATCH_NOTIFY_LIMIT"],
+    )
+    if not top:
+        return []
+    scores = dict(top)
+    rows = db.session.execute(
+        db.select(SwapRequest.id, SwapRequest.user_id, SwapRequest.alerts_email)
+        .filter(SwapRequest.id.in_(scores), SwapRequest.status == "Open")
+    ).all()
+    recipients, email_ids = {}, set()
+    for swap_id, user_id, alerts_email in sorted(rows, key=lambda r: -scores[r.id]):
+        if user_id not in recipients:
+            recipients[user_id] = {"swap_id": swap_id, "match_id": swap.id, "score": scores[swap_id]}
+        if alerts_email:
+            email_ids.add(user_id)
+    return notify("match", recipients, email_user_ids=email_ids)
+
+
+def prune_change_log(max_age=None):
+    # Rows swap_matches has not caught up with are kept whatever their age.
+    max_age = current_app.config["CHANGE_LOG_RETENTION"] if max_age is None else max_age
+    cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+    synced = db.select(func.coalesce(func.max(MatchSync.log_id), 0)).scalar_subquery()
+    return db.session.execute(
+        db.delete(ChangeLog).where(ChangeLog.created_at < cutoff, ChangeLog.id <= synced)
+    ).rowcount
+
+
+def get_match_index():
+    return current_app.extensions.setdefault("match_index", MatchIndex())
+
+
+@swaps_changed.connect
+def on_swaps_changed(sender, ids=None):
+    if has_app_context() and "match_index" in current_app.extensions:
+        current_app.extensions["match_index"].invalidate(ids)
+
+
+@reputation_changed.connect
+def on_reputation_changed(sender, users):
+    if has_app_context() and "match_index" in current_app.extensions:
+        current_app.extensions["match_index"].invalidate_reputation(users)
@@ -1,7 +1,14 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app, make_response, abort
 from flask_login import login_required, current_user
+from ..catalogue import get_catalogue
 from ..extensions import db
 from ..models import Module, SwapRequest
+from ..notifications import unread_count
+from ..queries import select_swaps
+from ..querybudget import query_budget
+from ..search import ranked_swaps
+from .matchcache import cached_matches, settle_matches
+from .matching import get_match_index, notify_watchers
 
 
 swaps_bp = Blueprint("swaps", __name__, template_folder="templates")
@@ -9,23 +16,16 @@ swaps_bp = Blueprint("swaps", __name__, template_folder="templates")
 
 @swaps_bp.get("/")
 @login_required
+@query_budget(6)
 def browse():
     if session.get("role") == "teacher":
         return redirect(url_for("admin.swaps"))
-    swaps = db.session.execute(
-        db.select(SwapRequest)
-        .filter_by(user_id=current_user.id)
-        .order_by(SwapRequest.created_at.desc())
-    ).scalars().all()
-    query = request.args.get("q", "").strip().lower()
-    if query:
-        def match_swap(s):
-            items = list(s.giving) + list(s.wanting)
-            for m in items:
-                if query in (m.code or "").lower() or query in (m.name or "").lower() or query in (m.department or "").lower():
-                    return True
-            return False
-        swaps = [s for s in swaps if match_swap(s)]
+    query = select_swaps().filter_by(user_id=current_user.id)
+    # Browse searches the modules of a request, as it always has; only admins search notes.
+    ranked = ranked_swaps(request.args.get("q", ""), notes=False)
+    if ranked is not None:
+        query = query.join(ranked, ranked.c.swap_id == SwapRequest.id).order_by(ranked.c.rank)
+    swaps = db.session.execute(query.order_by(SwapRequest.created_at.desc())).scalars().all()
     return render_template("swaps/browse.html", swaps=swaps, q=request.args.get("q", ""))
 
 
@@ -34,12 +34,33 @@ def browse():
 def create():
     if session.get("role") == "teacher":
         return redirect(url_for("admin.swaps"))
-    modules = db.session.execute(db.select(Module).order_by(Module.department, Module.year, Module.code)).scalars().all()
-    return render_template("swaps/create.html", modules=modules)
+    catalogue = get_catalogue()
+    # The nav badge is rendered into the page, so the unread count is part of the validator.
+    etag = f"{catalogue['etag']}-{current_user.id}-{unread_count(current_user.id)}"
+    if "_flashes" not in session and request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = make_response(render_template("swaps/create.html", modules=catalogue["modules"]))
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+@swaps_bp.get("/modules.json")
+@login_required
+def modules_json():
+    catalogue = get_catalogue()
+    response = current_app.response_class(catalogue["json"], mimetype="application/json")
+    response.set_etag(catalogue["etag"])
+    response.cache_control.private = True
+    response.cache_control.max_age = current_app.config["CATALOGUE_MAX_AGE"]
+    return response.make_conditional(request)
 
 
 @swaps_bp.post("/create")
 @login_required
+@query_budget(18)
 def create_post():
     if session.get("role") == "teacher":
         return redirect(url_for("admin.swaps"))
@@ -64,17 +85,20 @@ def create_post():
     if set(give_ids) & set(want_ids):
         flash("You cannot give and want the same module")
         return redirect(url_for("swaps.create"))
-    existing_open = db.session.execute(
-        db.select(SwapRequest).filter_by(user_id=current_user.id, status="Open")
-    ).scalars().all()
     gi_set = {int(x) for x in give_ids}
     wi_set = {int(x) for x in want_ids}
-    for s in existing_open:
-        s_g = {m.id for m in s.giving}
-        s_w = {m.id for m in s.wanting}
-        if s_g == gi_set and s_w == wi_set:
-            flash("Duplicate request already exists")
-            return redirect(url_for("swaps.create"))
+    modules = {m.id: m for m in db.session.execute(
+        db.select(Module).filter(Module.id.in_(gi_set | wi_set))
+    ).scalars()}
+    giving = [modules[mid] for mid in dict.fromkeys(int(x) for x in give_ids) if mid in modules]
+    wanting = [modules[mid] for mid in dict.fromkeys(int(x) for x in want_ids) if mid in modules]
+    signature = SwapRequest.make_signature([m.id for m in giving], [m.id for m in wanting])
+    duplicate = db.session.execute(
+        db.select(SwapRequest.id).filter_by(user_id=current_user.id, status="Open", signature=signature).limit(1)
+    ).first()
+    if duplicate:
+        flash("Duplicate request already exists")
+        return redirect(url_for("swaps.create"))
 
     swap = SwapRequest(user_id=current_user.id,
                        notes=notes,
@@ -92,34 +116,61 @@ def create_post():
         except Exception:
             flash("Invalid expiry date format, use YYYY-MM-DD")
             return redirect(url_for("swaps.create"))
-    for mid in give_ids:
-        if m := db.session.get(Module, int(mid)):
-            swap.giving.append(m)
-    for mid in want_ids:
-        if m := db.session.get(Module, int(mid)):
-            swap.wanting.append(m)
+    swap.giving = giving
+    swap.wanting = wanting
     db.session.add(swap)
     db.session.commit()
+    notified = notify_watchers(swap)
+    if settle_matches() or notified:
+        db.session.commit()
     return redirect(url_for("swaps.browse"))
 
 @swaps_bp.post("/suggest")
 @login_required
+@query_budget(8)
 def suggest():
     give_ids = {int(x) for x in request.form.getlist("give")}
     want_ids = {int(x) for x in request.form.getlist("want")}
-    others = db.session.execute(
-        db.select(SwapRequest).filter(SwapRequest.user_id != current_user.id)
-    ).scalars().all()
-    suggestions = []
-    for s in others:
-        s_g = {m.id for m in s.giving}
-        s_w = {m.id for m in s.wanting}
-        score = 0
-        if s_w & give_ids:
-            score += len(s_w & give_ids)
-        if s_g & want_ids:
-            score += len(s_g & want_ids)
-        if score > 0:
-            suggestions.append({"swap": s, "score": score})
-    suggestions.sort(key=lambda x: x["score"], reverse=True)
+    # A draft identical to one of the user's live requests reads that request's stored matches.
+    own = db.session.execute(
+        db.select(SwapRequest.id).filter(
+            SwapRequest.user_id == current_user.id,
+            SwapRequest.status.in_(SwapRequest.LIVE_STATUSES),
+            SwapRequest.signature == SwapRequest.make_signature(give_ids, want_ids),
+        ).limit(1)
+    ).scalar() if give_ids and want_ids else None
+    if own is not None:
+        return stored_suggestions(own)
+    top = get_match_index().top_matches(
+        give_ids, want_ids,
+        exclude_user_id=current_user.id,
+        limit=current_app.config["SUGGESTION_LIMIT"],
+        by_reputation=current_app.config["REPUTATION_RANKING"],
+    )
+    rows = db.session.execute(
+        select_swaps().filter(SwapRequest.id.in_([sid for sid, _ in top]))
+    ).scalars().all() if top else []
+    by_id = {s.id: s for s in rows}
+    suggestions = [{"swap": by_id[sid], "score": score} for sid, score in top if sid in by_id]
+    return render_template("swaps/_suggestions.html", suggestions=suggestions)
+
+
+@swaps_bp.get("/<int:swap_id>/matches")
+@login_required
+@query_budget(5)
+def matches(swap_id: int):
+    owner = db.session.execute(db.select(SwapRequest.user_id).filter_by(id=swap_id)).scalar()
+    if owner != current_user.id:
+        abort(404)
+    return stored_suggestions(swap_id)
+
+
+def stored_suggestions(swap_id):
+    if settle_matches():
+        db.session.commit()
+    rows = cached_matches(swap_id, current_app.config["SUGGESTION_LIMIT"])
+    if current_app.config["REPUTATION_RANKING"]:
+        tiebreak = get_match_index().tiebreaks([swap.id for swap, _ in rows])
+        rows.sort(key=lambda row: (row[1], tiebreak[row[0].id]), reverse=True)
+    suggestions = [{"swap": swap, "score": score} for swap, score in rows]
     return render_template("swaps/_suggestions.html", suggestions=suggestions)
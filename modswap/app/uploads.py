@@ -0,0 +1,173 @@
+import hashlib
+import io
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, url_for
+from .storage import get_storage
+
+CHUNK_SIZE = 64 * 1024
+IMAGE_SIGNATURES = {
+    b"\x89PNG\r\n\x1a\n": "png",
+    b"\xff\xd8\xff": "jpg",
+    b"GIF87a": "gif",
+    b"GIF89a": "gif",
+}
+DOCUMENT_EXTENSIONS = {"pdf", "png", "jpg", "jpeg"}
+PDF_SIGNATURE = b"%PDF-"
+
+
+class UploadError(ValueError):
+    pass
+
+
+def format_size(size):
+    return f"{size // (1024 * 1024)} MB" if size >= 1024 * 1024 else f"{size // 1024} KB"
+
+
+def sniff_image(head):
+    for signature, ext in IMAGE_SIGNATURES.items():
+        if head.startswith(signature):
+            return ext
+    return None
+
+
+def sniff_document(head, ext):
+    # The extension from the client's filename only stands if the content starts like that type.
+    if ext == "pdf":
+        return ext if head.startswith(PDF_SIGNATURE) else None
+    return ext if sniff_image(head) == {"jpeg": "jpg"}.get(ext, ext) else None
+
+
+def verify_image(filename):
+    # Pillow is optional; without it images are only checked by their magic bytes.
+    try:
+        from PIL import Image
+    except ImportError:
+        return
+    try:
+        with Image.open(filename) as image:
+            image.verify()
+    except Exception as exc:
+        raise UploadError("The image file is damaged or not an image") from exc
+
+
+def store_upload(stream, folder, max_bytes, ext=None):
+    # Streams the upload to a staging file in CHUNK_SIZE pieces while hashing it, so memory use
+    # is flat and oversized files are cut off early. The stored name is the SHA-256 of the
+    # content, which dedupes identical files. Images get their extension from their magic
+    # bytes rather than the client's filename; a given ext must match the content, and images
+    # must also load in Pillow. Returns the storage path.
+    storage = get_storage()
+    if storage.staging_dir:
+        os.makedirs(storage.staging_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp = tempfile.mkstemp(dir=storage.staging_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := stream.read(CHUNK_SIZE):
+                if size == 0 and ext is None:
+                    ext = sniff_image(chunk)
+                    if ext is None:
+                        raise UploadError("Invalid image type")
+                elif size == 0 and sniff_document(chunk, ext) is None:
+                    raise UploadError(f"The file is not a valid {ext.upper()}")
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadError(f"File is larger than {format_size(max_bytes)}")
+                digest.update(chunk)
+                out.write(chunk)
+        if size == 0:
+            raise UploadError("The uploaded file is empty")
+        if ext != "pdf":
+            verify_image(tmp)
+        name = f"{digest.hexdigest()}.{ext}"
+        path = f"{folder}/{name[:2]}/{name}"
+        if storage.exists(path):
+            os.remove(tmp)
+        else:
+            storage.put_file(path, tmp)
+        return path
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def variant_path(path, size):
+    base, ext = path.rsplit(".", 1)
+    return f"{base}_{size}.{ext}"
+
+
+def original_path(path):
+    match = re.fullmatch(r"(.+)_\d+\.(\w+)", path)
+    return f"{match.group(1)}.{match.group(2)}" if match else None
+
+
+def make_avatar_variants(storage, path, sizes):
+    # Pillow is optional; without it avatars are served at their original size.
+    try:
+        from PIL import Image
+    except ImportError:
+        return []
+    made = []
+    with storage.open(path) as fh:
+        data = io.BytesIO(fh.read())
+    with Image.open(data) as image:
+        for size in sizes:
+            target = variant_path(path, size)
+            if storage.exists(target):
+                continue
+            copy = image.convert("RGBA") if image.mode == "P" else image.copy()
+            copy.thumbnail((size, size))
+            out = io.BytesIO()
+            copy.save(out, format=image.format)
+            out.seek(0)
+            storage.put(target, out)
+            made.append(target)
+    return made
+
+
+def schedule_avatar_variants(path):
+    if "upload_executor" not in current_app.extensions:
+        current_app.extensions["upload_executor"] = ThreadPoolExecutor(max_workers=2, thread_name_prefix="avatars")
+    logger = current_app.logger
+
+    def report(future):
+        if future.exception() is not None:
+            logger.warning("Avatar variants for %s failed: %s", path, future.exception())
+
+    future = current_app.extensions["upload_executor"].submit(
+        make_avatar_variants, get_storage(), path, current_app.config["AVATAR_SIZES"]
+    )
+    future.add_done_callback(report)
+    return future
+
+
+def remove_upload(path):
+    # Files saved under static/ before uploads moved to the storage backend are removed in place.
+    if path.startswith("avatars/"):
+        storage = get_storage()
+        for name in [path] + [variant_path(path, size) for size in current_app.config["AVATAR_SIZES"]]:
+            storage.delete(name)
+        return
+    if path.startswith("documents/"):
+        get_storage().delete(path)
+        return
+    try:
+        os.remove(os.path.join(current_app.root_path, "static", path))
+    except OSError:
+        pass
+
+
+def media_url(path, size=None):
+    # Hash-named avatars go through /media with a long cache lifetime; legacy avatars saved
+    # under static/ keep their old URL. A requested variant that has not been generated yet
+    # falls back to the original in the media view, so no storage lookup happens here.
+    if not path:
+        return None
+    if not path.startswith("avatars/"):
+        return url_for("static", filename=path)
+    return url_for("media.file", path=variant_path(path, size) if size else path)
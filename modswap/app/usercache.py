@@ -0,0 +1,77 @@
+import json
+from flask import current_app, has_app_context
+from flask_login import UserMixin
+from .cache import app_cache, get_redis
+from .events import users_changed
+from .extensions import db
+from .models import User
+
+# Enough for authorization and the navigation bar; everything else is loaded on first use.
+SESSION_FIELDS = ("id", "email", "username", "role", "profile_image", "student_id_status", "verified_ac_email")
+
+
+class SessionUser(UserMixin):
+    # Stands in for User as current_user. Attributes outside SESSION_FIELDS load the full row
+    # (still without the deferred text columns) once per request.
+    def __init__(self, fields):
+        self.__dict__.update(fields)
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        user = self.__dict__.get("_user")
+        if user is None:
+            user = self.__dict__["_user"] = db.session.get(User, self.__dict__["id"])
+            if user is None:
+                raise AttributeError(name)
+        return getattr(user, name)
+
+
+def user_key(user_id):
+    return f"modswap:user:{user_id}"
+
+
+def users_cache():
+    return app_cache("users", current_app.config["USER_CACHE_SIZE"], ttl=current_app.config["USER_CACHE_TTL"])
+
+
+def session_fields(user_id):
+    client = get_redis()
+    ttl = current_app.config["USER_CACHE_TTL"]
+    if client is not None:
+        raw = client.get(user_key(user_id))
+        if raw is not None:
+            return json.loads(raw)
+    else:
+        cached = users_cache().get(user_id)
+        if cached is not None:
+            return cached
+    row = db.session.execute(
+        db.select(*(getattr(User, name) for name in SESSION_FIELDS)).filter(User.id == user_id)
+    ).first()
+    if row is None:
+        return None
+    fields = row._asdict()
+    if client is not None:
+        client.set(user_key(user_id), json.dumps(fields), ex=ttl)
+    else:
+        users_cache().set(user_id, fields)
+    return fields
+
+
+def load_session_user(user_id):
+    fields = session_fields(user_id)
+    return SessionUser(fields) if fields is not None else None
+
+
+@users_changed.connect
+def on_users_changed(sender, users):
+    if not has_app_context():
+        return
+    client = get_redis()
+    if client is not None:
+        client.delete(*[user_key(user_id) for user_id in users])
+    else:
+        cache = users_cache()
+        for user_id in users:
+            cache.pop(user_id)
@@ -11,5 +11,72 @@ class Config:
     MAIL_USE_TLS = os.environ.get("MAIL_USE_TLS", "false").lower() == "true"
     MAIL_USERNAME = os.environ.get("MAIL_USERNAME")
     MAIL_PASSWORD = os.environ.get("MAIL_PASSWORD")
+    MAIL_DEFAULT_SENDER = os.environ.get("MAIL_DEFAULT_SENDER", "noreply@modswap.local")
     RESEND_API_KEY = os.environ.get("RESEND_API_KEY")
-    REDIS_URL = os.environ.get("REDIS_URL")
\ No newline at end of file
+    REDIS_URL = os.environ.get("REDIS_URL")
+    SUGGESTION_LIMIT = int(os.environ.get("SUGGESTION_LIMIT", "20"))
+    CYCLE_MAX_LENGTH = int(os.environ.get("CYCLE_MAX_LENGTH", "4"))
+    CYCLE_TIME_BUDGET = float(os.environ.get("CYCLE_TIME_BUDGET", "2.0"))
+    ADMIN_PAGE_SIZE = int(os.environ.get("ADMIN_PAGE_SIZE", "50"))
+    QUERY_BUDGET_ENFORCE = os.environ.get("QUERY_BUDGET_ENFORCE", "false").lower() == "true"
+    SEED_ON_STARTUP = os.environ.get("SEED_ON_STARTUP", "false").lower() == "true"
+    IMPORT_MAX_ROWS = int(os.environ.get("IMPORT_MAX_ROWS", "10000"))
+    CATALOGUE_TTL = int(os.environ.get("CATALOGUE_TTL", "86400"))
+    CATALOGUE_MAX_AGE = int(os.environ.get("CATALOGUE_MAX_AGE", "300"))
+    CHAT_BATCH_SIZE = int(os.environ.get("CHAT_BATCH_SIZE", "100"))
+    CHAT_FLUSH_INTERVAL = float(os.environ.get("CHAT_FLUSH_INTERVAL", "1.0"))
+    CHAT_PAGE_SIZE = int(os.environ.get("CHAT_PAGE_SIZE", "50"))
+    CHAT_BUFFER_LIMIT = int(os.environ.get("CHAT_BUFFER_LIMIT", "10000"))
+    NOTIFY_WORKER = os.environ.get("NOTIFY_WORKER", "false").lower() == "true"
+    NOTIFY_POLL_INTERVAL = float(os.environ.get("NOTIFY_POLL_INTERVAL", "30"))
+    NOTIFY_MAX_ATTEMPTS = int(os.environ.get("NOTIFY_MAX_ATTEMPTS", "5"))
+    NOTIFY_CLAIM_TIMEOUT = int(os.environ.get("NOTIFY_CLAIM_TIMEOUT", "600"))
+    MATCH_NOTIFY_LIMIT = int(os.environ.get("MATCH_NOTIFY_LIMIT", "200"))
+    UNREAD_TTL = int(os.environ.get("UNREAD_TTL", "3600"))
+    INBOX_PAGE_SIZE = int(os.environ.get("INBOX_PAGE_SIZE", "20"))
+    EXPIRY_SWEEP_INTERVAL = float(os.environ.get("EXPIRY_SWEEP_INTERVAL", "0"))
+    EXPIRY_BATCH_SIZE = int(os.environ.get("EXPIRY_BATCH_SIZE", "500"))
+    STATS_TTL = int(os.environ.get("STATS_TTL", "3600"))
+    PROFILE_PAGE_SIZE = int(os.environ.get("PROFILE_PAGE_SIZE", "20"))
+    REPUTATION_RANKING = os.environ.get("REPUTATION_RANKING", "true").lower() == "true"
+    UPLOAD_ROOT = os.environ.get("UPLOAD_ROOT") or ("/tmp/modswap-uploads" if os.environ.get("VERCEL") else None)
+    AVATAR_MAX_BYTES = int(os.environ.get("AVATAR_MAX_BYTES", str(5 * 1024 * 1024)))
+    DOCUMENT_MAX_BYTES = int(os.environ.get("DOCUMENT_MAX_BYTES", str(10 * 1024 * 1024)))
+    MAX_CONTENT_LENGTH = int(os.environ.get("MAX_CONTENT_LENGTH", str(12 * 1024 * 1024)))
+    AVATAR_SIZES = (64, 256)
+    MEDIA_MAX_AGE = int(os.environ.get("MEDIA_MAX_AGE", str(365 * 24 * 3600)))
+    STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "local")
+    STORAGE_ACCEL_PREFIX = os.environ.get("STORAGE_ACCEL_PREFIX")
+    STORAGE_S3_BUCKET = os.environ.get("STORAGE_S3_BUCKET")
+    STORAGE_S3_PREFIX = os.environ.get("STORAGE_S3_PREFIX", "")
+    STORAGE_S3_ENDPOINT = os.environ.get("STORAGE_S3_ENDPOINT")
+    STORAGE_S3_REGION = os.environ.get("STORAGE_S3_REGION")
+    STORAGE_S3_ACCESS_KEY = os.environ.get("STORAGE_S3_ACCESS_KEY")
+    STORAGE_S3_SECRET_KEY = os.environ.get("STORAGE_S3_SECRET_KEY")
+    STORAGE_URL_TTL = int(os.environ.get("STORAGE_URL_TTL", "3600"))
+    DOCUMENT_REVIEW_PAGE_SIZE = int(os.environ.get("DOCUMENT_REVIEW_PAGE_SIZE", "100"))
+    DB_PROFILE = os.environ.get("DB_PROFILE") or ("serverless" if os.environ.get("VERCEL") else "web")
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "false").lower() == "true"
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+    PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+    PROFILE_SLOW_MS = float(os.environ.get("PROFILE_SLOW_MS", "500"))
+    PROFILE_DIR = os.environ.get("PROFILE_DIR")
+    USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", "300"))
+    USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", "4096"))
+    BCRYPT_WORKERS = int(os.environ.get("BCRYPT_WORKERS", "4"))
+    BCRYPT_QUEUE = int(os.environ.get("BCRYPT_QUEUE", "16"))
+    BCRYPT_TIMEOUT = float(os.environ.get("BCRYPT_TIMEOUT", "10"))
+    LOGIN_RATE_LIMIT = os.environ.get("LOGIN_RATE_LIMIT", "true").lower() == "true"
+    LOGIN_IP_BURST = int(os.environ.get("LOGIN_IP_BURST", "20"))
+    LOGIN_IP_RATE = float(os.environ.get("LOGIN_IP_RATE", "0.5"))
+    LOGIN_EMAIL_BURST = int(os.environ.get("LOGIN_EMAIL_BURST", "5"))
+    LOGIN_EMAIL_RATE = float(os.environ.get("LOGIN_EMAIL_RATE", "0.05"))
+    RATE_LIMIT_KEYS = int(os.environ.get("RATE_LIMIT_KEYS", "65536"))
+    MATCH_CACHE_SIZE = int(os.environ.get("MATCH_CACHE_SIZE", "20"))
+    MATCH_CACHE_WORKER = os.environ.get("MATCH_CACHE_WORKER", "false").lower() == "true"
+    AUTO_CHAT_MIN_SCORE = int(os.environ.get("AUTO_CHAT_MIN_SCORE", "2"))
+    LOCAL_CACHE_TTL = int(os.environ.get("LOCAL_CACHE_TTL", "30"))
+    MATCH_SYNC_INTERVAL = float(os.environ.get("MATCH_SYNC_INTERVAL", "2"))
+    CHANGE_LOG_RETENTION = int(os.environ.get("CHANGE_LOG_RETENTION", "86400"))
+    PROXY_FIX_HOPS = int(os.environ.get("PROXY_FIX_HOPS") or ("1" if os.environ.get("VERCEL") else "0"))
+    MATCH_CACHE_POLL_INTERVAL = float(os.environ.get("MATCH_CACHE_POLL_INTERVAL", "30"))
\ No newline at end of file
@@ -0,0 +1,49 @@
+import pytest
+from modswap.config import Config
+
+
+TEST_CONFIG = {
+    "QUERY_BUDGET_ENFORCE": True,
+    "MATCH_CACHE_WORKER": False,
+    "NOTIFY_WORKER": False,
+    "EXPIRY_SWEEP_INTERVAL": 0,
+    "REDIS_URL": None,
+    "STORAGE_BACKEND": "local",
+    "METRICS_ENABLED": False,
+    "LOGIN_RATE_LIMIT": False,
+    "BCRYPT_WORKERS": 0,
+    "BCRYPT_LOG_ROUNDS": 4,
+}
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    # Config is read when create_app runs, so tests override it here before the app exists.
+    overrides = dict(
+        TEST_CONFIG,
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'modswap.db'}",
+        UPLOAD_ROOT=str(tmp_path / "uploads"),
+    )
+    for key, value in overrides.items():
+        monkeypatch.setattr(Config, key, value, raising=False)
+    return Config
+
+
+@pytest.fixture
+def app(config):
+    from modswap.app import create_app
+    app = create_app()
+    app.config["TESTING"] = True
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def login(client, user_id, role="student"):
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user_id)
+        sess["_fresh"] = True
+        sess["role"] = role
@@ -0,0 +1,50 @@
+import pytest
+
+
+@pytest.fixture
+def limited_app(config, monkeypatch):
+    def make(hops):
+        for key, value in {"LOGIN_RATE_LIMIT": True, "LOGIN_EMAIL_BURST": 3, "LOGIN_IP_BURST": 20, "PROXY_FIX_HOPS": hops}.items():
+            monkeypatch.setattr(config, key, value, raising=False)
+        from modswap.app import create_app
+        return create_app()
+    return make
+
+
+def attempt(client, email, forwarded_for):
+    return client.post(
+        "/auth/login",
+        data={"email": email, "password": "wrong", "role": "teacher"},
+        headers={"X-Forwarded-For": forwarded_for},
+    ).status_code
+
+
+def test_email_bucket_is_per_client_address_behind_the_proxy(limited_app):
+    client = limited_app(1).test_client()
+    assert [attempt(client, "ana@mail.bcu.ac.uk", "203.0.113.5") for _ in range(4)] == [302, 302, 302, 429]
+    # The owner signing in from their own address is not locked out by someone else's guesses.
+    assert attempt(client, "ana@mail.bcu.ac.uk", "198.51.100.7") == 302
+    assert attempt(client, "ben@mail.bcu.ac.uk", "203.0.113.5") == 302
+
+
+def test_forwarded_header_is_ignored_without_trusted_proxies(limited_app):
+    client = limited_app(0).test_client()
+    assert [attempt(client, "ana@mail.bcu.ac.uk", f"203.0.113.{i}") for i in range(4)] == [302, 302, 302, 429]
+
+
+def test_slow_password_check_reports_busy(monkeypatch):
+    import threading
+    from modswap.app.auth.passwords import PasswordVerifier, VerifierBusy
+    from modswap.app.extensions import bcrypt
+    release = threading.Event()
+    monkeypatch.setattr(bcrypt, "check_password_hash", lambda *args: release.wait(5))
+    verifier = PasswordVerifier(workers=1, queue=0, timeout=0.05)
+    try:
+        with pytest.raises(VerifierBusy, match="timed out"):
+            verifier.check("hash", "password")
+        # The timed-out check still holds the only slot until it finishes.
+        with pytest.raises(VerifierBusy, match="Too many"):
+            verifier.check("hash", "password")
+    finally:
+        release.set()
+        verifier.executor.shutdown(wait=True)
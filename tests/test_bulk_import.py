@@ -0,0 +1,38 @@
+from modswap.app.extensions import db
+from modswap.app.models import Module, SwapRequest, User
+from conftest import login
+
+
+def setup_import(app):
+    with app.app_context():
+        db.session.add_all([Module(code="CS101", name="Programming"), Module(code="MA101", name="Algebra")])
+        db.session.add(User(email="Mixed.Case@mail.bcu.ac.uk", role="student"))
+        teacher = User(email="teacher@mail.bcu.ac.uk", role="teacher")
+        db.session.add(teacher)
+        db.session.commit()
+        return teacher.id
+
+
+def test_rejects_payloads_that_are_not_lists_of_rows(app, client):
+    login(client, setup_import(app), "teacher")
+    assert client.post("/admin/swaps/import", json=5).status_code == 400
+    assert client.post("/admin/swaps/import", json={"swaps": "CS101"}).status_code == 400
+    assert client.post("/admin/swaps/import", json=[{"email": "a@b"}, "row"]).status_code == 400
+    assert client.post("/admin/swaps/import", data=b"\x00\x01binary", content_type="application/octet-stream").status_code == 400
+    assert client.post("/admin/swaps/import", data=b"\xff\xfe", content_type="text/csv").status_code == 400
+
+
+def test_matches_emails_case_insensitively(app, client):
+    login(client, setup_import(app), "teacher")
+    rows = [
+        {"email": "mixed.case@mail.bcu.ac.uk", "give": "CS101", "want": "MA101"},
+        {"email": "MIXED.CASE@mail.bcu.ac.uk", "give": "MA101", "want": "CS101", "priority": "High"},
+    ]
+    response = client.post("/admin/swaps/import", json=rows)
+    assert response.status_code == 200
+    assert response.get_json()["created"] == 2, response.get_json()["errors"]
+    csv = b"email,give,want\nMixed.Case@MAIL.bcu.ac.uk,CS101,MA101;CS101\n"
+    response = client.post("/admin/swaps/import", data=csv, content_type="text/csv")
+    assert response.get_json()["errors"] == [{"row": 1, "error": "You cannot give and want the same module"}]
+    with app.app_context():
+        assert db.session.execute(db.select(db.func.count(SwapRequest.id))).scalar() == 2
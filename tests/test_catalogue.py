@@ -0,0 +1,55 @@
+import types
+import pytest
+from modswap.app.extensions import db
+from modswap.app.models import Module, Notification, User
+from conftest import login
+
+
+@pytest.fixture
+def student(app, client):
+    with app.app_context():
+        user = User(email="ana@mail.bcu.ac.uk", role="student")
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+    login(client, user_id)
+    return user_id
+
+
+def add_module(app, code):
+    with app.app_context():
+        db.session.add(Module(code=code, name="New module", department="Computing", year=1))
+        db.session.commit()
+
+
+def test_modules_json_answers_304_until_a_module_changes(app, client, student):
+    first = client.get("/swaps/modules.json")
+    assert first.status_code == 200 and first.headers["ETag"]
+    assert client.get("/swaps/modules.json", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+    add_module(app, "ZZ999")
+    changed = client.get("/swaps/modules.json", headers={"If-None-Match": first.headers["ETag"]})
+    assert changed.status_code == 200 and changed.headers["ETag"] != first.headers["ETag"]
+    assert "ZZ999" in {m["code"] for m in changed.get_json()["modules"]}
+
+
+def test_create_page_validator_covers_the_unread_badge(app, client, student):
+    etag = client.get("/swaps/create").headers["ETag"]
+    assert client.get("/swaps/create", headers={"If-None-Match": etag}).status_code == 304
+    with app.app_context():
+        db.session.add(Notification(user_id=student, type="match", payload="{}"))
+        db.session.commit()
+    assert client.get("/swaps/create", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_other_processes_pick_up_changes_after_the_cache_ttl(app, client, student, monkeypatch):
+    # Without Redis another process cannot bump this one's version; its cached copy expires instead.
+    now = [1000.0]
+    monkeypatch.setattr("modswap.app.cache.time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    etag = client.get("/swaps/modules.json").headers["ETag"]
+    with app.app_context():
+        db.session.execute(db.insert(Module).values(code="ZZ998", name="Elsewhere", department="Computing", year=1))
+        db.session.commit()
+    assert client.get("/swaps/modules.json", headers={"If-None-Match": etag}).status_code == 304
+    now[0] += app.config["LOCAL_CACHE_TTL"] + 1
+    assert client.get("/swaps/modules.json", headers={"If-None-Match": etag}).status_code == 200
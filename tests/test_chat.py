@@ -0,0 +1,104 @@
+import pytest
+from modswap.app.chat.buffer import get_message_buffer
+from modswap.app.extensions import db, socketio
+from modswap.app.models import Message, Module, SwapMatch, SwapRequest, User
+from conftest import login
+
+
+@pytest.fixture
+def thread(app):
+    # owner's request 1 has bob's request 2 as a stored match; eve has nothing to do with it.
+    with app.app_context():
+        users = {name: User(email=f"{name}@mail.bcu.ac.uk", role="student") for name in ("owner", "bob", "eve")}
+        cs, ma = Module(code="CS101", name="Programming"), Module(code="MA101", name="Algebra")
+        db.session.add_all([*users.values(), cs, ma])
+        db.session.flush()
+        mine = SwapRequest(user_id=users["owner"].id, giving=[cs], wanting=[ma])
+        theirs = SwapRequest(user_id=users["bob"].id, giving=[ma], wanting=[cs])
+        db.session.add_all([mine, theirs])
+        db.session.flush()
+        db.session.add(SwapMatch(swap_id=mine.id, match_id=theirs.id, score=2))
+        db.session.commit()
+        return dict({name: u.id for name, u in users.items()}, swap=mine.id)
+
+
+def socket_for(app, client, user_id):
+    login(client, user_id)
+    return socketio.test_client(app, flask_test_client=client)
+
+
+def test_outsiders_cannot_read_or_join(app, client, thread):
+    login(client, thread["eve"])
+    assert client.get(f"/chat/{thread['swap']}").status_code == 404
+    assert client.get(f"/chat/{thread['swap']}/messages").status_code == 404
+    socket = socket_for(app, client, thread["eve"])
+    assert socket.emit("join", {"swap_id": thread["swap"]}, callback=True) == {"ok": False, "error": "Not allowed"}
+    assert not socket.emit("message", {"swap_id": thread["swap"], "content": "hi"}, callback=True)["ok"]
+
+
+def test_participants_only_see_their_own_conversation(app, client, thread):
+    bob = socket_for(app, client, thread["bob"])
+    assert bob.emit("join", {"swap_id": thread["swap"]}, callback=True)["ok"]
+    assert bob.emit("message", {"swap_id": thread["swap"], "content": "swap?"}, callback=True)["ok"]
+
+    owner_client = app.test_client()
+    owner = socket_for(app, owner_client, thread["owner"])
+    assert owner.emit("join", {"swap_id": thread["swap"]}, callback=True)["ok"]
+    refused = owner.emit("message", {"swap_id": thread["swap"], "content": "hi", "to": thread["eve"]}, callback=True)
+    assert refused == {"ok": False, "error": "Choose who to reply to"}
+    assert owner.emit("message", {"swap_id": thread["swap"], "content": "yes", "to": thread["bob"]}, callback=True)["ok"]
+    assert [m["args"]["content"] for m in bob.get_received() if m["name"] == "message"] == ["swap?", "yes"]
+
+    with app.app_context():
+        db.session.add(Message(swap_id=thread["swap"], sender_id=thread["owner"], receiver_id=thread["eve"], content="private"))
+        db.session.commit()
+    response = client.get(f"/chat/{thread['swap']}/messages", query_string={"limit": "abc"})
+    assert response.status_code == 200
+    assert [m["content"] for m in response.get_json()["messages"]] == ["yes", "swap?"]
+    owner_view = owner_client.get(f"/chat/{thread['swap']}/messages", query_string={"limit": 2}).get_json()
+    assert [m["content"] for m in owner_view["messages"]] == ["private", "yes"] and owner_view["next"]
+
+
+def test_failed_flush_keeps_the_batch(app, thread):
+    with app.app_context():
+        buffer = get_message_buffer()
+        buffer.add(thread["swap"], thread["bob"], thread["owner"], None)
+        with pytest.raises(Exception):
+            buffer.flush()
+        assert buffer.pending() == 1
+        buffer._rows[0]["content"] = "retried"
+        assert buffer.flush() == 1
+        assert db.session.execute(db.select(Message.content)).scalars().all() == ["retried"]
+
+
+def test_history_includes_unwritten_messages_without_flushing(app, client, thread):
+    with app.app_context():
+        db.session.add(Message(swap_id=thread["swap"], sender_id=thread["bob"], receiver_id=thread["owner"], content="first"))
+        db.session.commit()
+        buffer = get_message_buffer()
+        buffer.add(thread["swap"], thread["owner"], thread["bob"], "second")
+        buffer.add(thread["swap"], thread["bob"], thread["owner"], "third")
+        buffer.add(thread["swap"], thread["owner"], thread["eve"], "not for bob")
+    login(client, thread["bob"])
+    page = client.get(f"/chat/{thread['swap']}/messages", query_string={"limit": 2}).get_json()
+    assert [(m["content"], m["id"]) for m in page["messages"]] == [("third", None), ("second", None)]
+    older = client.get(f"/chat/{thread['swap']}/messages", query_string={"before": page["next"]}).get_json()
+    assert [m["content"] for m in older["messages"]] == ["first"] and older["next"] is None
+    with app.app_context():
+        assert get_message_buffer().pending() == 3
+        assert get_message_buffer().flush() == 3
+    assert [m["content"] for m in client.get(f"/chat/{thread['swap']}/messages").get_json()["messages"]] == [
+        "third", "second", "first",
+    ]
+
+
+def test_buffer_drops_the_oldest_messages_over_its_limit(app, thread):
+    with app.app_context():
+        buffer = get_message_buffer()
+        buffer.limit = 2
+        for content in (None, "kept", "also kept"):
+            buffer.add(thread["swap"], thread["bob"], thread["owner"], content)
+        with pytest.raises(Exception):
+            buffer.flush()
+        assert [row["content"] for row in buffer.buffered(thread["swap"])] == ["kept", "also kept"]
+        assert buffer.flush() == 2
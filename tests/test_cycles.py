@@ -0,0 +1,61 @@
+from modswap.app.swaps.cycles import CycleMatcher
+
+
+def triangle(matcher, owners=(1, 2, 3)):
+    # 1 gives module 10 to 2, 2 gives 20 to 3, 3 gives 30 back to 1.
+    matcher._insert(1, owners[0], [10], [30])
+    matcher._insert(2, owners[1], [20], [10])
+    matcher._insert(3, owners[2], [30], [20])
+
+
+def test_three_way_cycle_is_found():
+    matcher = CycleMatcher()
+    triangle(matcher)
+    assert matcher.match_all() == [(1, 2, 3)]
+    assert matcher.assigned == {1: (1, 2, 3), 2: (1, 2, 3), 3: (1, 2, 3)}
+
+
+def test_cycle_needs_distinct_owners():
+    matcher = CycleMatcher()
+    triangle(matcher, owners=(1, 2, 2))
+    assert matcher.match_all() == []
+    assert not matcher.unexplored
+
+
+def test_node_that_fails_on_one_path_can_close_another():
+    matcher = CycleMatcher()
+    matcher._insert(1, 100, [1], [9])
+    # 2 and 3 both take module 1 from 1 and pass on to 4, which passes on to 5.
+    matcher._insert(2, 200, [2], [1])
+    matcher._insert(3, 300, [3], [1])
+    matcher._insert(4, 400, [4], [2, 3])
+    # 5 belongs to the owner of 2, so 1 -> 2 -> 4 -> 5 is not a trade but 1 -> 3 -> 4 -> 5 is.
+    matcher._insert(5, 200, [9], [4])
+    assert matcher.match_all() == [(1, 3, 4, 5)]
+
+
+def test_search_stops_when_expansions_run_out():
+    matcher = CycleMatcher(max_expansions=1)
+    triangle(matcher)
+    assert matcher.match_all() == []
+    # Out of expansions is final for this run, unlike the deadline.
+    assert not matcher.unexplored
+
+
+def test_resume_explores_nodes_left_by_the_deadline():
+    matcher = CycleMatcher()
+    triangle(matcher)
+    assert matcher.match_all(budget=0) == []
+    assert matcher.unexplored == {1, 2, 3}
+    assert matcher.resume() == [(1, 2, 3)]
+    assert not matcher.unexplored
+    assert matcher.resume() == []
+
+
+def test_removing_a_node_frees_the_rest_of_its_cycle():
+    matcher = CycleMatcher()
+    triangle(matcher)
+    matcher.match_all()
+    assert matcher.remove(2) == []
+    assert matcher.assigned == {} and matcher.cycles == set()
+    assert matcher.add(2, 2, [20], [10]) == [(2, 3, 1)]
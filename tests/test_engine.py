@@ -0,0 +1,56 @@
+import pytest
+from sqlalchemy.pool import NullPool
+from modswap.app.engine import engine_options
+from modswap.app.extensions import db
+
+
+@pytest.fixture
+def profile_app(config, monkeypatch):
+    def make(name):
+        monkeypatch.setattr(config, "DB_PROFILE", name)
+        from modswap.app import create_app
+        return create_app()
+    return make
+
+
+def pragmas():
+    with db.engine.connect() as conn:
+        return tuple(conn.exec_driver_sql(f"PRAGMA {name}").scalar() for name in ("journal_mode", "busy_timeout", "synchronous"))
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("web", ("wal", 5000, 1)),
+    ("worker", ("wal", 30000, 1)),
+    ("serverless", ("wal", 5000, 1)),
+])
+def test_sqlite_connections_get_the_profile_pragmas(profile_app, name, expected):
+    app = profile_app(name)
+    with app.app_context():
+        assert pragmas() == expected
+
+
+def test_default_profile_leaves_sqlite_alone(profile_app):
+    app = profile_app("default")
+    with app.app_context():
+        journal_mode, _, synchronous = pragmas()
+        assert (journal_mode, synchronous) == ("delete", 2)
+        assert app.config["SQLALCHEMY_ENGINE_OPTIONS"] == {}
+
+
+def test_unknown_profile_is_refused(profile_app):
+    with pytest.raises(ValueError, match="Unknown DB_PROFILE 'fast'"):
+        profile_app("fast")
+
+
+def test_pool_options_per_backend():
+    postgres = engine_options("postgresql://db/modswap", "web")
+    assert postgres == {
+        "pool_size": 10, "max_overflow": 20, "pool_timeout": 10, "pool_recycle": 1800, "pool_pre_ping": True,
+        "connect_args": {"options": "-c statement_timeout=15000"},
+    }
+    assert engine_options("postgresql://db/modswap", "serverless")["poolclass"] is NullPool
+    assert "pool_size" not in engine_options("postgresql://db/modswap", "serverless")
+    assert engine_options("sqlite:////tmp/modswap.db", "worker") == {
+        "pool_size": 2, "max_overflow": 2, "pool_timeout": 30, "pool_recycle": 1800,
+    }
+    assert engine_options("sqlite://", "web") == {}
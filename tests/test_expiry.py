@@ -0,0 +1,52 @@
+import json
+from datetime import datetime, timedelta
+import sqlalchemy as sa
+from modswap.app.extensions import db
+from modswap.app.models import Notification, SwapRequest, User
+from modswap.app.swaps.expiry import expire_swaps
+
+
+def add_swaps(app):
+    with app.app_context():
+        user = User(email="ana@mail.bcu.ac.uk", role="student")
+        db.session.add(user)
+        db.session.flush()
+        past = datetime.utcnow() - timedelta(days=1)
+        swaps = [SwapRequest(user_id=user.id, expires_at=past) for _ in range(3)]
+        swaps.append(SwapRequest(user_id=user.id, expires_at=datetime.utcnow() + timedelta(days=1)))
+        db.session.add_all(swaps)
+        db.session.commit()
+        return [s.id for s in swaps]
+
+
+def expired_notifications():
+    return [json.loads(p)["swap_ids"] for p in db.session.execute(db.select(Notification.payload)).scalars()]
+
+
+def test_expired_requests_are_notified_once(app):
+    ids = add_swaps(app)
+    with app.app_context():
+        assert expire_swaps(batch_size=2) == 3
+        assert expire_swaps() == 0
+        assert sorted(sum(expired_notifications(), [])) == ids[:3]
+        assert db.session.get(SwapRequest, ids[3]).status == "Open"
+
+
+def test_rows_expired_by_another_sweeper_are_not_notified_again(app):
+    ids = add_swaps(app)
+    other = sa.create_engine(app.config["SQLALCHEMY_DATABASE_URI"])
+    raced = []
+
+    def race(conn, cursor, statement, *args):
+        # A second worker expires one of the selected rows between this sweeper's SELECT and UPDATE.
+        if statement.startswith("UPDATE swap_requests") and not raced:
+            raced.append(statement)
+            with other.begin() as conn:
+                conn.execute(sa.update(SwapRequest).where(SwapRequest.id == ids[0]).values(status="Expired"))
+
+    with app.app_context():
+        sa.event.listen(db.engine, "before_cursor_execute", race)
+        assert expire_swaps() == 2
+        assert expired_notifications() == [ids[1:3]]
+        sa.event.remove(db.engine, "before_cursor_execute", race)
+    other.dispose()
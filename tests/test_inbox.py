@@ -0,0 +1,50 @@
+from modswap.app.extensions import db
+from modswap.app.models import Notification, User
+from modswap.app.notifications import notify
+from conftest import login
+
+
+def add_student(app, notifications=0):
+    with app.app_context():
+        user = User(email="ana@mail.bcu.ac.uk", role="student")
+        db.session.add(user)
+        db.session.flush()
+        ids = notify("status", {user.id: {"swap_id": 1, "status": "Approved"}}) if notifications else []
+        db.session.commit()
+        return user.id, ids
+
+
+def unread(app, user_id):
+    with app.app_context():
+        return db.session.execute(
+            db.select(db.func.count()).select_from(Notification).filter_by(user_id=user_id, read=False)
+        ).scalar()
+
+
+def test_malformed_read_requests_are_rejected(app, client):
+    user_id, ids = add_student(app, notifications=1)
+    login(client, user_id)
+    for body in ([1, 2], {"ids": "1"}, {"ids": ["one"]}, {"ids": [None]}, "all"):
+        assert client.post("/notifications/read", json=body).status_code == 400
+    assert client.post("/notifications/read", data={"ids": ["x"]}).status_code == 400
+    assert unread(app, user_id) == 1
+
+    response = client.post("/notifications/read", json={"ids": [str(ids[0])]})
+    assert response.status_code == 200
+    assert response.get_json() == {"updated": 1, "unread": 0}
+
+
+def test_create_page_revalidates_when_the_badge_changes(app, client):
+    user_id, _ = add_student(app)
+    login(client, user_id)
+    first = client.get("/swaps/create")
+    assert first.status_code == 200
+    etag = first.headers["ETag"].strip('"')
+    assert client.get("/swaps/create", headers={"If-None-Match": f'"{etag}"'}).status_code == 304
+
+    with app.app_context():
+        notify("status", {user_id: {"swap_id": 1, "status": "Approved"}})
+        db.session.commit()
+    second = client.get("/swaps/create", headers={"If-None-Match": f'"{etag}"'})
+    assert second.status_code == 200
+    assert second.headers["ETag"] != first.headers["ETag"]
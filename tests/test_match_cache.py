@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta
+import pytest
+import sqlalchemy as sa
+from modswap.app.chat.buffer import get_message_buffer
+from modswap.app.extensions import db, socketio
+from modswap.app.models import ChangeLog, MatchSync, Module, Notification, Rating, SwapMatch, SwapRequest, User
+from modswap.app.swaps.matchcache import sync_matches
+from modswap.app.swaps.matching import get_match_index, prune_change_log
+from conftest import login
+
+
+@pytest.fixture
+def other_app(app):
+    # A second worker process: its own match index and caches over the same database.
+    from modswap.app import create_app
+    return create_app()
+
+
+def add_pair(app, auto_create_chat=False):
+    with app.app_context():
+        ana, ben = User(email="ana@mail.bcu.ac.uk", role="student"), User(email="ben@mail.bcu.ac.uk", role="student")
+        cs, ma = Module(code="CS101", name="Programming"), Module(code="MA101", name="Algebra")
+        db.session.add_all([ana, ben, cs, ma])
+        db.session.flush()
+        mine = SwapRequest(user_id=ana.id, giving=[cs], wanting=[ma], auto_create_chat=auto_create_chat)
+        theirs = SwapRequest(user_id=ben.id, giving=[ma], wanting=[cs])
+        db.session.add_all([mine, theirs])
+        db.session.commit()
+        return {"ana": ana.id, "ben": ben.id, "mine": mine.id, "theirs": theirs.id}
+
+
+def stored_matches():
+    return set(db.session.execute(db.select(SwapMatch.swap_id, SwapMatch.match_id, SwapMatch.score)).tuples())
+
+
+def test_changes_made_in_one_process_are_applied_by_another(app, other_app):
+    with other_app.app_context():
+        assert get_match_index().live_ids() == []
+    ids = add_pair(app)
+    with other_app.app_context():
+        assert sync_matches()
+        db.session.commit()
+        assert stored_matches() == {(ids["mine"], ids["theirs"], 2), (ids["theirs"], ids["mine"], 2)}
+        assert sorted(get_match_index().live_ids()) == [ids["mine"], ids["theirs"]]
+    with app.app_context():
+        assert not sync_matches()
+        assert db.session.execute(db.select(MatchSync.log_id)).scalar() == db.session.execute(
+            db.select(sa.func.max(ChangeLog.id))
+        ).scalar()
+
+
+def test_a_batch_is_applied_by_only_one_process(app, other_app):
+    ids = add_pair(app)
+    raced = []
+
+    def race(conn, cursor, statement, *args):
+        # The other process claims the same batch between this one's read and its claim.
+        if statement.startswith("UPDATE match_sync") and not raced:
+            raced.append(statement)
+            with other_app.app_context():
+                assert sync_matches()
+                db.session.commit()
+
+    with app.app_context():
+        sa.event.listen(db.engine, "before_cursor_execute", race)
+        try:
+            assert not sync_matches()
+        finally:
+            sa.event.remove(db.engine, "before_cursor_execute", race)
+        assert raced
+        db.session.commit()
+        assert len(stored_matches()) == 2
+        assert db.session.execute(db.select(MatchSync.version)).scalar() == 1
+
+
+def test_auto_chats_go_through_the_chat_path(app, client):
+    ids = add_pair(app, auto_create_chat=True)
+    login(client, ids["ben"])
+    socket = socketio.test_client(app, flask_test_client=client)
+    assert socket.emit("join", {"swap_id": ids["theirs"]}, callback=True)["ok"]
+    with app.app_context():
+        assert sync_matches()
+        assert get_message_buffer().pending() == 0
+        db.session.commit()
+        assert get_message_buffer().pending() == 1
+        notification = db.session.execute(db.select(Notification)).scalar_one()
+        assert (notification.user_id, notification.type) == (ids["ben"], "chat")
+    received = [m["args"] for m in socket.get_received() if m["name"] == "message"]
+    assert [(m["swap_id"], m["sender_id"], m["receiver_id"]) for m in received] == [(ids["theirs"], ids["ana"], ids["ben"])]
+
+    # A later change that keeps the pair matched does not open the conversation again.
+    with app.app_context():
+        db.session.get(SwapRequest, ids["mine"]).notes = "edited"
+        db.session.commit()
+        assert sync_matches()
+        db.session.commit()
+        assert get_message_buffer().flush() == 1
+        assert get_message_buffer().pending() == 0
+
+
+def test_pruning_keeps_rows_not_yet_applied(app):
+    add_pair(app)
+    with app.app_context():
+        db.session.execute(db.update(ChangeLog).values(created_at=datetime.utcnow() - timedelta(days=2)))
+        db.session.commit()
+        assert prune_change_log() == 0
+        assert sync_matches()
+        db.session.commit()
+        assert prune_change_log() == 2
+        db.session.commit()
+        assert not sync_matches()
+
+
+def test_equal_scores_enter_a_list_by_owner_reputation(app):
+    app.config["MATCH_CACHE_SIZE"] = 1
+    with app.app_context():
+        ana, ben, cat = (User(email=f"{name}@mail.bcu.ac.uk", role="student") for name in ("ana", "ben", "cat"))
+        cs, ma = Module(code="CS101", name="Programming"), Module(code="MA101", name="Algebra")
+        db.session.add_all([ana, ben, cat, cs, ma])
+        db.session.flush()
+        mine, done = SwapRequest(user_id=ana.id, giving=[cs], wanting=[ma]), SwapRequest(user_id=cat.id)
+        db.session.add_all([mine, done])
+        db.session.flush()
+        db.session.add(Rating(swap_id=done.id, rater_id=ana.id, receiver_id=cat.id, thumbs_up=True))
+        db.session.commit()
+        assert sync_matches()
+        db.session.commit()
+
+        # Both score 2 against mine; ben's is older but cat has the better reputation.
+        older = SwapRequest(user_id=ben.id, giving=[ma], wanting=[cs])
+        db.session.add(older)
+        db.session.flush()
+        newer = SwapRequest(user_id=cat.id, giving=[ma], wanting=[cs])
+        db.session.add(newer)
+        db.session.commit()
+        assert sync_matches()
+        db.session.commit()
+        assert (mine.id, newer.id, 2) in stored_matches()
+        assert (mine.id, older.id, 2) not in stored_matches()
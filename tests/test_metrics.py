@@ -0,0 +1,47 @@
+import re
+import pytest
+
+
+@pytest.fixture
+def metrics_app(config, monkeypatch):
+    def make(token=None):
+        monkeypatch.setattr(config, "METRICS_ENABLED", True)
+        monkeypatch.setattr(config, "METRICS_TOKEN", token)
+        from modswap.app import create_app
+        return create_app()
+    return make
+
+
+def scrape(client, address="127.0.0.1", token=None):
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    return client.get("/metrics", headers=headers, environ_base={"REMOTE_ADDR": address})
+
+
+def test_exposition_format(metrics_app):
+    client = metrics_app().test_client()
+    assert client.get("/auth/login").status_code == 200
+    response = scrape(client)
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    text = response.get_data(as_text=True)
+    assert "# TYPE modswap_request_duration_seconds histogram" in text
+    assert 'modswap_requests_total{endpoint="auth.login",status="200"} 1' in text
+    buckets = re.findall(r'modswap_request_duration_seconds_bucket\{endpoint="auth.login",le="([^"]+)"\} (\d+)', text)
+    assert buckets[-1] == ("+Inf", "1")
+    # Buckets are cumulative.
+    counts = [int(count) for _, count in buckets]
+    assert counts == sorted(counts)
+    assert 'modswap_request_duration_seconds_count{endpoint="auth.login"} 1' in text
+
+
+def test_without_a_token_only_loopback_may_scrape(metrics_app):
+    client = metrics_app().test_client()
+    assert scrape(client, "::1").status_code == 200
+    assert scrape(client, "203.0.113.5").status_code == 403
+
+
+def test_token_is_required_when_set(metrics_app):
+    client = metrics_app("s3cret").test_client()
+    assert scrape(client).status_code == 403
+    assert scrape(client, token="wrong").status_code == 403
+    assert scrape(client, "203.0.113.5", token="s3cret").status_code == 200
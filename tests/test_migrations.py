@@ -0,0 +1,65 @@
+import os
+import shutil
+import pytest
+import sqlalchemy as sa
+from modswap.app.extensions import db
+from modswap.app.migrations import LATEST, current_schema
+from modswap.app.models import MatchSync, SwapMatch, SwapRequest
+from modswap.app.search import ranked_swaps
+from modswap.app.swaps.matching import get_match_index
+
+BASELINE_DB = os.path.join(os.path.dirname(__file__), os.pardir, "instance", "modswap.db")
+
+
+@pytest.fixture
+def baseline_app(config, tmp_path, monkeypatch):
+    # A copy of the database as it was before any migration existed.
+    path = tmp_path / "baseline.db"
+    shutil.copy(BASELINE_DB, path)
+    monkeypatch.setattr(config, "SQLALCHEMY_DATABASE_URI", f"sqlite:///{path}")
+    from modswap.app import create_app
+    return create_app
+
+
+def table_names():
+    return set(sa.inspect(db.engine).get_table_names())
+
+
+def test_baseline_database_is_upgraded_through_every_step(baseline_app):
+    app = baseline_app()
+    with app.app_context():
+        assert tuple(current_schema(db.engine)) == (LATEST, "fts5")
+        assert {"swap_search", "change_log", "match_sync", "swap_matches", "user_reputation"} <= table_names()
+        assert "signature" in {c["name"] for c in sa.inspect(db.engine).get_columns("swap_requests")}
+        indexes = {row[0] for row in db.session.execute(sa.text("SELECT name FROM sqlite_master WHERE type = 'index'"))}
+        assert {"ix_modules_department_lower", "ix_messages_swap_created", "ix_swap_requests_owner_signature"} <= indexes
+
+        # Existing requests are backfilled: signatures, search documents and stored matches.
+        swaps = db.session.execute(db.select(SwapRequest)).scalars().all()
+        assert swaps and all(s.signature for s in swaps)
+        codes = {m.code for s in swaps for m in s.giving}
+        assert codes
+        found = ranked_swaps(sorted(codes)[0])
+        assert db.session.execute(db.select(found.c.swap_id)).first() is not None
+        stored = set(db.session.execute(db.select(SwapMatch.swap_id, SwapMatch.match_id)).tuples())
+        live = get_match_index().live_ids()
+        assert stored == {(sid, mid) for sid in live for mid, _ in get_match_index().matches_for(sid, app.config["MATCH_CACHE_SIZE"])}
+        assert db.session.execute(db.select(MatchSync.id)).scalars().all() == [1]
+
+
+def test_starting_on_a_migrated_database_changes_nothing(baseline_app):
+    baseline_app()
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        if statement.lstrip().split(None, 1)[0].upper() in ("CREATE", "ALTER", "DROP", "INSERT", "UPDATE", "DELETE"):
+            statements.append(statement)
+
+    sa.event.listen(sa.engine.Engine, "before_cursor_execute", record)
+    try:
+        app = baseline_app()
+    finally:
+        sa.event.remove(sa.engine.Engine, "before_cursor_execute", record)
+    assert statements == []
+    with app.app_context():
+        assert current_schema(db.engine).version == LATEST
@@ -0,0 +1,146 @@
+import socketserver
+import threading
+from datetime import datetime, timedelta
+import pytest
+from modswap.app.extensions import db
+from modswap.app.models import NotificationOutbox, User
+from modswap.app.notifications import claim_batch, deliver_pending, notify
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    # Just enough SMTP for smtplib: records each accepted message and refuses rejected recipients.
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        self.reply("220 localhost ready")
+        recipients = []
+        while line := self.rfile.readline():
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 localhost")
+            elif verb == "MAIL":
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                address = command.split(":", 1)[1].strip("<> ")
+                if address in server.reject:
+                    self.reply("550 No such user")
+                else:
+                    recipients.append(address)
+                    self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                body = []
+                while (data := self.rfile.readline()) not in (b".\r\n", b""):
+                    body.append(data.decode())
+                server.messages.append((recipients, "".join(body)))
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+@pytest.fixture
+def smtp(app):
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SMTPHandler)
+    server.daemon_threads = True
+    server.messages, server.reject = [], set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    mail = app.extensions["mail"]
+    mail.server, mail.port = server.server_address
+    mail.suppress = False
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def users(app, smtp):
+    with app.app_context():
+        ana = User(email="ana@mail.bcu.ac.uk", role="student", email_notifications=True)
+        ben = User(email="ben@mail.bcu.ac.uk", role="student", email_notifications=True)
+        quiet = User(email="quiet@mail.bcu.ac.uk", role="student", email_notifications=False)
+        db.session.add_all([ana, ben, quiet])
+        db.session.commit()
+        return ana.id, ben.id, quiet.id
+
+
+def outbox():
+    return db.session.execute(
+        db.select(NotificationOutbox.user_id, NotificationOutbox.status, NotificationOutbox.attempts)
+        .order_by(NotificationOutbox.id)
+    ).all()
+
+
+def test_pending_notifications_go_out_as_one_digest_per_user(app, smtp, users):
+    ana, ben, quiet = users
+    with app.app_context():
+        notify("status", {ana: {"swap_id": 1, "status": "Approved"}, ben: {"swap_id": 2, "status": "Rejected"}, quiet: {}})
+        notify("match", {ana: {"swap_id": 1, "score": 3}})
+        db.session.commit()
+        assert deliver_pending() == 2
+        assert sorted(recipients for recipients, _ in smtp.messages) == [["ana@mail.bcu.ac.uk"], ["ben@mail.bcu.ac.uk"]]
+        digest = next(body for recipients, body in smtp.messages if recipients == ["ana@mail.bcu.ac.uk"])
+        assert "ModSwap: 2 new notifications" in digest
+        assert "#1 now Approved" in digest and "New match for your swap request #1 (score 3)" in digest
+        assert outbox() == [(ana, "sent", 0), (ben, "sent", 0), (ana, "sent", 0)]
+        assert deliver_pending() == 0
+        assert len(smtp.messages) == 2
+
+
+def test_rejected_digest_is_retried_until_it_fails(app, smtp, users):
+    ana, ben, _ = users
+    smtp.reject.add("ben@mail.bcu.ac.uk")
+    with app.app_context():
+        app.config["NOTIFY_MAX_ATTEMPTS"] = 2
+        notify("status", {ana: {"swap_id": 1, "status": "Approved"}, ben: {"swap_id": 2, "status": "Approved"}})
+        db.session.commit()
+        assert deliver_pending() == 1
+        assert outbox() == [(ana, "sent", 0), (ben, "pending", 1)]
+        retry = db.session.execute(db.select(NotificationOutbox).filter_by(user_id=ben)).scalar_one()
+        assert retry.claimed_by is None and retry.next_attempt_at > datetime.utcnow()
+        assert "No such user" in retry.last_error
+        assert deliver_pending() == 0
+
+        retry.next_attempt_at = datetime.utcnow()
+        db.session.commit()
+        assert deliver_pending() == 0
+        assert outbox() == [(ana, "sent", 0), (ben, "failed", 2)]
+
+
+def test_unreachable_server_puts_the_whole_batch_back(app, smtp, users):
+    ana, ben, _ = users
+    with app.app_context():
+        notify("status", {ana: {"swap_id": 1, "status": "Approved"}, ben: {"swap_id": 2, "status": "Approved"}})
+        db.session.commit()
+        app.extensions["mail"].port = 1
+        assert deliver_pending() == 0
+        assert outbox() == [(ana, "pending", 1), (ben, "pending", 1)]
+        assert not smtp.messages
+
+
+def test_claimed_rows_are_leased_until_the_claim_times_out(app, smtp, users):
+    ana, ben, _ = users
+    with app.app_context():
+        notify("status", {ana: {"swap_id": 1, "status": "Approved"}, ben: {"swap_id": 2, "status": "Approved"}})
+        db.session.commit()
+        first = claim_batch(10)
+        assert len(first) == 2
+        assert claim_batch(10) == []
+        assert deliver_pending() == 0
+
+        # A worker that died mid-send leaves its rows in "sending"; once the lease lapses they are due again.
+        db.session.execute(db.update(NotificationOutbox).values(next_attempt_at=datetime.utcnow() - timedelta(seconds=1)))
+        db.session.commit()
+        tokens = {entry.claimed_by for entry, _, _ in first}
+        second = claim_batch(10)
+        assert len(second) == 2
+        assert {entry.claimed_by for entry, _, _ in second}.isdisjoint(tokens)
+        db.session.rollback()
+        assert deliver_pending() == 0
+        assert smtp.messages == []
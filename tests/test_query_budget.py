@@ -0,0 +1,59 @@
+import pytest
+from benchmarks.datagen import generate
+from modswap.app.extensions import db
+from modswap.app.models import Document, SwapRequest, swap_give_modules, swap_want_modules
+from modswap.app.notifications import notify
+from conftest import login
+
+# Every view with a @query_budget runs here with QUERY_BUDGET_ENFORCE on, over enough rows that
+# a per-row query would push it past its budget; exceeding one raises QueryBudgetExceeded.
+
+
+@pytest.fixture
+def data(app):
+    with app.app_context():
+        ids = generate(users=40, modules=24, swaps=300, ratings=150, seed=3)
+        student = ids["users"][0]
+        notify("match", {student: {"swap_id": ids["swaps"][0], "match_id": ids["swaps"][1], "score": 2}})
+        db.session.add_all(Document(user_id=user_id, type="student_id", path=f"docs/{user_id}.pdf") for user_id in ids["users"][:12])
+        db.session.commit()
+        own = db.session.execute(db.select(SwapRequest.id).filter_by(user_id=student).limit(1)).scalar()
+        give = db.session.execute(db.select(swap_give_modules.c.module_id).filter_by(swap_id=own)).scalars().all()
+        want = db.session.execute(db.select(swap_want_modules.c.module_id).filter_by(swap_id=own)).scalars().all()
+    return dict(ids, student=student, own=own, own_give=give, own_want=want)
+
+
+def ok(response):
+    assert response.status_code in (200, 302), response.status_code
+    return response
+
+
+def test_student_views_stay_within_budget(client, data):
+    login(client, data["student"])
+    modules = [str(m) for m in data["modules"]]
+    ok(client.get("/swaps/"))
+    ok(client.get("/swaps/", query_string={"q": "comp"}))
+    ok(client.post("/swaps/create", data={"give": modules[:2], "want": modules[2:4], "auto_create_chat": "on"}))
+    ok(client.post("/swaps/suggest", data={"give": modules[4:6], "want": modules[6:8]}))
+    ok(client.post("/swaps/suggest", data={"give": data["own_give"], "want": data["own_want"]}))
+    ok(client.get(f"/swaps/{data['own']}/matches"))
+    ok(client.get("/profile/"))
+    ok(client.get("/notifications/"))
+    ok(client.get("/notifications/feed"))
+    ok(client.get("/notifications/unread"))
+    ok(client.post("/notifications/read", json={}))
+
+
+def test_teacher_views_stay_within_budget(client, data):
+    login(client, data["teacher"], "teacher")
+    ok(client.get("/admin/swaps"))
+    ok(client.get("/admin/swaps", query_string={"department": "computing", "year": "2", "q": "comp", "status": "Open"}))
+    ok(client.get("/admin/swaps", query_string={"sort": "reputation"}))
+    ok(client.get("/admin/cycles"))
+    ok(client.post(f"/admin/swaps/{data['swaps'][0]}/status", data={"status": "Approved"}))
+    ok(client.post("/admin/swaps/bulk", data={"action": "needs_info", "ids": [str(i) for i in data["swaps"][1:30]]}))
+    ok(client.post("/admin/swaps/bulk", data={"action": "reject", "ids": [str(i) for i in data["swaps"][30:60]]}))
+    ok(client.get("/admin/documents"))
+    with client.application.app_context():
+        doc_ids = db.session.execute(db.select(Document.id)).scalars().all()
+    ok(client.post("/admin/documents/review", data={"action": "approve", "ids": [str(i) for i in doc_ids]}))
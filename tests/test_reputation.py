@@ -0,0 +1,35 @@
+import sqlalchemy as sa
+from modswap.app.extensions import db
+from modswap.app.models import Rating, SwapRequest, User, UserReputation
+from modswap.app.reputation import wilson_lower_bound
+
+
+def test_first_rating_that_loses_the_insert_race_is_still_counted(app):
+    with app.app_context():
+        rater, receiver = User(email="ana@mail.bcu.ac.uk", role="student"), User(email="ben@mail.bcu.ac.uk", role="student")
+        db.session.add_all([rater, receiver])
+        db.session.flush()
+        swap = SwapRequest(user_id=receiver.id)
+        db.session.add(swap)
+        db.session.commit()
+        receiver_id, raced = receiver.id, []
+
+        def race(conn, cursor, statement, *args):
+            # Another request's first rating for the same user lands after our UPDATE found no row.
+            if statement.startswith("SAVEPOINT") and not raced:
+                raced.append(statement)
+                cursor.connection.execute(
+                    "INSERT INTO user_reputation (user_id, positive, negative, score, updated_at)"
+                    " VALUES (?, 1, 0, 0, CURRENT_TIMESTAMP)", (receiver_id,)
+                )
+
+        sa.event.listen(db.engine, "before_cursor_execute", race)
+        try:
+            db.session.add(Rating(swap_id=swap.id, rater_id=rater.id, receiver_id=receiver_id, thumbs_up=False))
+            db.session.commit()
+        finally:
+            sa.event.remove(db.engine, "before_cursor_execute", race)
+        assert raced
+        reputation = db.session.get(UserReputation, receiver_id)
+        assert (reputation.positive, reputation.negative) == (1, 1)
+        assert reputation.score == wilson_lower_bound(1, 1)
@@ -0,0 +1,69 @@
+import pytest
+from modswap.app.extensions import db
+from modswap.app.models import Module, SwapRequest, User
+from modswap.app.search import ranked_swaps
+from conftest import login
+
+
+@pytest.fixture
+def swaps(app):
+    with app.app_context():
+        assert app.extensions["search_backend"] == "fts5"
+        ana = User(email="ana@mail.bcu.ac.uk", role="student")
+        cs = Module(code="CS101", name="Programming", department="Computing")
+        ma = Module(code="MA101", name="Linear Algebra", department="Mathematics")
+        ph = Module(code="PH200", name="Mechanics of programming languages", department="Physics")
+        db.session.add_all([ana, cs, ma, ph])
+        db.session.flush()
+        by_code = SwapRequest(user_id=ana.id, giving=[cs], wanting=[])
+        by_name = SwapRequest(user_id=ana.id, giving=[ph], wanting=[])
+        by_notes = SwapRequest(user_id=ana.id, giving=[ma], wanting=[], notes="happy to swap for programming")
+        db.session.add_all([by_code, by_name, by_notes])
+        db.session.commit()
+        return {"ana": ana.id, "code": by_code.id, "name": by_name.id, "notes": by_notes.id, "algebra": ma.id}
+
+
+def search(query, notes=True):
+    ranked = ranked_swaps(query, notes=notes)
+    return [swap_id for swap_id, _ in db.session.execute(db.select(ranked).order_by(ranked.c.rank, ranked.c.swap_id))]
+
+
+def test_word_prefixes_rank_codes_over_names_over_notes(app, swaps):
+    with app.app_context():
+        assert search("cs1") == [swaps["code"]]
+        assert search("program") == [swaps["code"], swaps["name"], swaps["notes"]]
+        assert search("program", notes=False) == [swaps["code"], swaps["name"]]
+        assert ranked_swaps("  ?! ") is None
+
+
+def test_mid_word_module_matches_follow_indexed_ones(app, swaps):
+    with app.app_context():
+        # "gebra" starts no word, so only the substring scan over modules finds it.
+        assert search("gebra") == [swaps["notes"]]
+        assert search("101") == [swaps["code"], swaps["notes"]]
+        # Notes are matched by word prefix only.
+        assert search("appy") == []
+
+
+def test_index_follows_module_and_notes_changes(app, swaps):
+    with app.app_context():
+        db.session.get(Module, swaps["algebra"]).name = "Calculus"
+        db.session.get(SwapRequest, swaps["code"]).notes = "calculus please"
+        db.session.commit()
+        assert search("calc") == [swaps["notes"], swaps["code"]]
+        assert search("calc", notes=False) == [swaps["notes"]]
+
+
+def test_like_backend_matches_substrings(app, swaps):
+    app.extensions["search_backend"] = "like"
+    with app.app_context():
+        assert search("gebra") == [swaps["notes"]]
+        assert sorted(search("program")) == [swaps["code"], swaps["name"], swaps["notes"]]
+        assert sorted(search("program", notes=False)) == [swaps["code"], swaps["name"]]
+
+
+def test_browse_orders_by_rank(app, client, swaps):
+    login(client, swaps["ana"])
+    page = client.get("/swaps/", query_string={"q": "program"}).get_data(as_text=True)
+    assert page.index(f"matches-{swaps['code']}") < page.index(f"matches-{swaps['name']}")
+    assert f"matches-{swaps['notes']}" not in page
@@ -0,0 +1,61 @@
+import sqlalchemy as sa
+from modswap.app.admin.moderation import moderate
+from modswap.app.extensions import db
+from modswap.app.models import Rating, SwapRequest, User
+from modswap.app.stats import user_stats
+
+
+def statements_during(fn):
+    seen = []
+
+    def record(conn, cursor, statement, *args):
+        seen.append(statement)
+
+    sa.event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        return fn(), len(seen)
+    finally:
+        sa.event.remove(db.engine, "before_cursor_execute", record)
+
+
+def test_stats_are_cached_until_the_owner_changes(app):
+    with app.app_context():
+        ana, ben = User(email="ana@mail.bcu.ac.uk", role="student"), User(email="ben@mail.bcu.ac.uk", role="student")
+        db.session.add_all([ana, ben])
+        db.session.flush()
+        kept = SwapRequest(user_id=ana.id)
+        db.session.add_all([kept, SwapRequest(user_id=ana.id, status="Expired")])
+        db.session.commit()
+        ana_id, ben_id, kept_id = ana.id, ben.id, kept.id
+
+        stats, queries = statements_during(lambda: user_stats(ana_id))
+        assert (stats["requests"], stats["open"], stats["expired"], queries) == (2, 1, 1, 3)
+        assert statements_during(lambda: user_stats(ana_id)) == (stats, 0)
+        ben_stats = user_stats(ben_id)
+
+        # An ORM write drops the owner's entry on commit.
+        swap = SwapRequest(user_id=ana_id)
+        db.session.add(swap)
+        db.session.commit()
+        assert user_stats(ana_id)["requests"] == 3
+        assert statements_during(lambda: user_stats(ben_id)) == (ben_stats, 0)
+
+        # So does a Core write that marks the owners it touched, and a rating for the receiver.
+        moderate([swap.id], "Approved", decided_by=ben_id)
+        db.session.add(Rating(swap_id=kept_id, rater_id=ben_id, receiver_id=ana_id, thumbs_up=True))
+        db.session.commit()
+        stats = user_stats(ana_id)
+        assert (stats["requests"], stats["open"], stats["approved"], stats["ratings"], stats["thumbs_up"]) == (3, 1, 1, 1, 1)
+
+
+def test_rolled_back_changes_keep_the_cached_entry(app):
+    with app.app_context():
+        ana = User(email="ana@mail.bcu.ac.uk", role="student")
+        db.session.add(ana)
+        db.session.commit()
+        ana_id = ana.id
+        stats = user_stats(ana_id)
+        db.session.add(SwapRequest(user_id=ana_id))
+        db.session.flush()
+        db.session.rollback()
+        assert statements_during(lambda: user_stats(ana_id)) == (stats, 0)
@@ -0,0 +1,113 @@
+import io
+import socket
+import urllib.request
+import pytest
+from modswap.app.extensions import db
+from modswap.app.models import Document, User
+from modswap.app.storage import S3Storage, get_storage
+from conftest import login
+
+ThreadedMotoServer = pytest.importorskip("moto.server").ThreadedMotoServer
+Image = pytest.importorskip("PIL.Image")
+PDF = b"%PDF-1.4\n%%EOF\n"
+
+
+@pytest.fixture(scope="module")
+def s3_endpoint():
+    # A local S3-compatible endpoint, reached over HTTP the way a MinIO deployment would be.
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+    yield f"http://127.0.0.1:{port}"
+    server.stop()
+
+
+@pytest.fixture
+def bucket(s3_endpoint, app, request):
+    name = request.node.name.replace("_", "-")[:40]
+    settings = {
+        "STORAGE_BACKEND": "s3",
+        "STORAGE_S3_BUCKET": name,
+        "STORAGE_S3_PREFIX": "modswap/",
+        "STORAGE_S3_ENDPOINT": s3_endpoint,
+        "STORAGE_S3_REGION": "us-east-1",
+        "STORAGE_S3_ACCESS_KEY": "minio",
+        "STORAGE_S3_SECRET_KEY": "minio-secret",
+        "STORAGE_URL_TTL": 600,
+    }
+    app.config.update(settings)
+    storage = S3Storage(name, "modswap/", s3_endpoint, "us-east-1", "minio", "minio-secret")
+    storage.client.create_bucket(Bucket=name)
+    return storage
+
+
+def keys(storage):
+    return sorted(o["Key"] for o in storage.client.list_objects_v2(Bucket=storage.bucket).get("Contents", []))
+
+
+def png_bytes():
+    out = io.BytesIO()
+    Image.new("RGB", (300, 300), "blue").save(out, format="PNG")
+    return out.getvalue()
+
+
+@pytest.fixture
+def student(app, client):
+    with app.app_context():
+        user = User(email="ana@mail.bcu.ac.uk", role="student")
+        db.session.add(user)
+        db.session.commit()
+        login(client, user.id)
+        return user.id
+
+
+def test_objects_round_trip_under_the_prefix(bucket):
+    bucket.put("documents/ab/file.pdf", io.BytesIO(PDF))
+    assert keys(bucket) == ["modswap/documents/ab/file.pdf"]
+    assert bucket.exists("documents/ab/file.pdf") and not bucket.exists("documents/ab/other.pdf")
+    assert bucket.open("documents/ab/file.pdf").read() == PDF
+    head = bucket.client.head_object(Bucket=bucket.bucket, Key="modswap/documents/ab/file.pdf")
+    assert head["ContentType"] == "application/pdf"
+    bucket.delete("documents/ab/file.pdf")
+    bucket.delete("documents/ab/file.pdf")
+    assert keys(bucket) == []
+
+
+def test_documents_upload_to_the_bucket_and_download_through_a_presigned_url(app, client, bucket, student):
+    client.post("/profile/documents/upload", data={"type": "student_id", "document": (io.BytesIO(PDF), "id.pdf")})
+    with app.app_context():
+        doc = db.session.execute(db.select(Document)).scalar_one()
+        path, doc_id = doc.path, doc.id
+    assert keys(bucket) == [f"modswap/{path}"]
+
+    response = client.get(f"/profile/documents/{doc_id}")
+    assert response.status_code == 302
+    assert response.cache_control.private and response.cache_control.max_age == 0
+    url = response.headers["Location"]
+    assert url.startswith(f"{bucket.client.meta.endpoint_url}/{bucket.bucket}/modswap/documents/")
+    assert "Signature=" in url and "Expires=" in url
+    with urllib.request.urlopen(url) as fetched:
+        assert fetched.read() == PDF
+        assert fetched.headers["Content-Disposition"] == 'attachment; filename="student_id.pdf"'
+
+
+def test_avatar_variants_are_stored_and_deleted_with_the_original(app, client, bucket, student):
+    with app.app_context():
+        storage = get_storage()
+    client.post("/profile/", data={"avatar": (io.BytesIO(png_bytes()), "me.png")})
+    with app.app_context():
+        path = db.session.get(User, student).profile_image
+        app.extensions["upload_executor"].shutdown(wait=True)
+    base = f"modswap/{path[:-4]}"
+    assert keys(bucket) == [f"{base}.png", f"{base}_256.png", f"{base}_64.png"]
+    assert storage.exists(path.replace(".png", "_64.png"))
+
+    response = client.get(f"/media/{path}")
+    assert response.status_code == 302
+    with urllib.request.urlopen(response.headers["Location"]) as fetched:
+        assert fetched.read() == png_bytes()
+
+    client.post("/profile/avatar/delete")
+    assert keys(bucket) == []
@@ -0,0 +1,54 @@
+import io
+import pytest
+from modswap.app.extensions import db
+from modswap.app.models import Document, User
+from conftest import login
+
+Image = pytest.importorskip("PIL.Image")
+
+PDF = b"%PDF-1.4\n1 0 obj << >> endobj\ntrailer << >>\n%%EOF\n"
+
+
+def png_bytes():
+    out = io.BytesIO()
+    Image.new("RGB", (4, 4), "red").save(out, format="PNG")
+    return out.getvalue()
+
+
+@pytest.fixture
+def student(app, client):
+    with app.app_context():
+        user = User(email="ana@mail.bcu.ac.uk", role="student")
+        db.session.add(user)
+        db.session.commit()
+        login(client, user.id)
+        return user.id
+
+
+def upload(client, content, filename):
+    client.post("/profile/documents/upload", data={"type": "student_id", "document": (io.BytesIO(content), filename)})
+    with client.session_transaction() as sess:
+        return [message for _, message in sess.pop("_flashes", [])]
+
+
+def documents(app):
+    with app.app_context():
+        return db.session.execute(db.select(Document.path)).scalars().all()
+
+
+@pytest.mark.parametrize("content, filename, error", [
+    (png_bytes(), "id.pdf", "The file is not a valid PDF"),
+    (PDF, "id.png", "The file is not a valid PNG"),
+    (png_bytes(), "id.jpg", "The file is not a valid JPG"),
+    (b"MZ\x90\x00 not a document", "id.jpeg", "The file is not a valid JPEG"),
+    (png_bytes()[:40], "id.png", "The image file is damaged or not an image"),
+])
+def test_documents_must_match_their_extension(app, client, student, content, filename, error):
+    assert upload(client, content, filename) == [error]
+    assert documents(app) == []
+
+
+def test_real_documents_are_stored(app, client, student):
+    assert upload(client, PDF, "id.PDF") == ["Document uploaded"]
+    assert upload(client, png_bytes(), "id.png") == ["Document uploaded"]
+    assert sorted(path.rsplit(".", 1)[1] for path in documents(app)) == ["pdf", "png"]
@@ -0,0 +1,67 @@
+import sqlalchemy as sa
+from modswap.app.admin.moderation import review_documents
+from modswap.app.extensions import db
+from modswap.app.models import Document, User
+from modswap.app.usercache import session_fields
+from conftest import login
+
+
+def cached_without_queries(user_id):
+    # The fields served for user_id, asserting they came from the cache.
+    seen = []
+
+    def record(conn, cursor, statement, *args):
+        seen.append(statement)
+
+    sa.event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        fields = session_fields(user_id)
+    finally:
+        sa.event.remove(db.engine, "before_cursor_execute", record)
+    assert seen == []
+    return fields
+
+
+def add_user(app, **fields):
+    with app.app_context():
+        user = User(email="ana@mail.bcu.ac.uk", role="student", **fields)
+        db.session.add(user)
+        db.session.commit()
+        session_fields(user.id)
+        return user.id
+
+
+def test_profile_and_role_changes_drop_the_cached_user(app):
+    user_id = add_user(app, username="ana")
+    with app.app_context():
+        assert cached_without_queries(user_id)["username"] == "ana"
+        user = db.session.get(User, user_id)
+        user.username, user.role = "ana2", "teacher"
+        db.session.commit()
+        assert (session_fields(user_id)["username"], session_fields(user_id)["role"]) == ("ana2", "teacher")
+        assert cached_without_queries(user_id)["role"] == "teacher"
+
+        # A change that is rolled back leaves the entry alone.
+        db.session.get(User, user_id).bio = "hello"
+        db.session.rollback()
+        assert cached_without_queries(user_id)["username"] == "ana2"
+
+
+def test_document_review_drops_the_owner(app):
+    user_id = add_user(app)
+    with app.app_context():
+        document = Document(user_id=user_id, type="student_id", path="documents/id.pdf")
+        db.session.add(document)
+        db.session.commit()
+        assert cached_without_queries(user_id)["student_id_status"] == "None"
+        review_documents([document.id], "Approved")
+        db.session.commit()
+        assert session_fields(user_id)["student_id_status"] == "Verified"
+
+
+def test_avatar_removal_is_seen_by_the_next_request(app, client):
+    user_id = add_user(app, profile_image="avatars/ana.png")
+    login(client, user_id)
+    assert client.post("/profile/avatar/delete", follow_redirects=True).status_code == 200
+    with app.app_context():
+        assert cached_without_queries(user_id)["profile_image"] is None